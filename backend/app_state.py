@@ -0,0 +1,213 @@
+# Process-wide application state and the startup lifecycle.
+#
+# Nothing expensive happens at import time. The chatbot (and through it the
+# LLM clients) is built on first use, and the startup document is indexed by
+# warm_up_rag(), which main.py's lifespan handler runs in the background.
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import config
+from shared_state import get_state_backend
+
+logger = logging.getLogger(__name__)
+
+chatbot = None
+_chatbot_lock = threading.Lock()
+
+# Registry entry {"name", "version"} of the collection this worker's retriever
+# currently points at. The shared registry is the source of truth.
+_local_active = None
+_active_lock = threading.Lock()
+
+COLLECTIONS_NAMESPACE = "collections"
+LOCKS_NAMESPACE = "locks"
+INGEST_LEASE_SECONDS = 900
+
+# Wall-clock seconds per startup step, reported in the startup log and on /ready
+startup_timings = {}
+
+class Readiness:
+    # rag is one of: "pending", "loading", "ready", "unavailable" (no document or
+    # indexing failed; chat still works without retrieval) or "disabled".
+    def __init__(self):
+        self.database = False
+        self.rag = "pending"
+        self.rag_error = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.database and self.rag not in ("pending", "loading")
+
+readiness = Readiness()
+
+class timed:
+    """Context manager that records how long a startup step took in startup_timings."""
+
+    def __init__(self, step: str):
+        self.step = step
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        startup_timings[self.step] = round(time.perf_counter() - self.start, 3)
+        return False
+
+def get_chatbot():
+    """Return the process-wide Chatbot, building it on first use."""
+    global chatbot
+    if chatbot is None:
+        with _chatbot_lock:
+            if chatbot is None:
+                with timed("chatbot_init"):
+                    from chatbot import Chatbot
+                    chatbot = Chatbot()
+    return chatbot
+
+def file_digest(path: str) -> str:
+    """Short SHA-256 content digest, used as a collection version."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+def _load_faq_index(collection_name: str):
+    if not config.FAQ_INDEX_ENABLED:
+        return None
+    from rag.faq import load_faq_index
+    return load_faq_index(collection_name)
+
+def get_active_collection():
+    """The collection all workers should answer from, or None if none is registered yet."""
+    return get_state_backend().get(COLLECTIONS_NAMESPACE, "active")
+
+def activate_collection(collection_name: str, version: str, vectorstore=None):
+    """Make a collection the active one for every worker and point this worker's retriever at it."""
+    global _local_active
+    active = {"name": collection_name, "version": version}
+    get_state_backend().set(COLLECTIONS_NAMESPACE, "active", active)
+    if vectorstore is not None:
+        from rag.rag import get_retriever
+        with _active_lock:
+            get_chatbot().set_retriever(get_retriever(vectorstore, k=10))
+            get_chatbot().set_faq_index(_load_faq_index(collection_name))
+            _local_active = active
+
+def sync_active_collection():
+    """
+    Re-point this worker's retriever if another worker activated a different collection.
+
+    Called at the start of each chat turn; a no-op apart from one registry read
+    when nothing changed.
+    """
+    global _local_active
+    active = get_active_collection()
+    if active is None or active == _local_active:
+        return active
+    with _active_lock:
+        if active != _local_active:
+            from rag.rag import load_vector_store, get_retriever
+            vectorstore = load_vector_store(active["name"])
+            if vectorstore is not None:
+                get_chatbot().set_retriever(get_retriever(vectorstore, k=10))
+                get_chatbot().set_faq_index(_load_faq_index(active["name"]))
+                _local_active = active
+    return active
+
+def warm_up_rag():
+    """
+    Index the startup document and attach a retriever to the chatbot.
+
+    An existing non-empty collection is reopened instead of re-embedding the
+    document. With several workers, one takes an ingestion lease and the others
+    wait for it to register the collection. Updates readiness.rag when done;
+    errors are recorded, not raised.
+    """
+    document_path = config.RAG_DOCUMENT_PATH
+    collection_name = config.RAG_COLLECTION_NAME
+    backend = get_state_backend()
+    readiness.rag = "loading"
+    try:
+        if not os.path.exists(document_path):
+            readiness.rag = "unavailable"
+            readiness.rag_error = f"Document '{document_path}' not found"
+            logger.warning("Startup document not found; RAG functionality might be limited", extra={"document_path": document_path})
+            return
+
+        with timed("rag_import"):
+            from rag.rag import load_documents, split_documents, create_vector_store, load_vector_store
+            from rag.faq import build_faq_index, load_faq_index
+        with timed("rag_embedding_model"):
+            from rag.rag import get_embeddings
+            get_embeddings()
+
+        active = get_active_collection()
+        if active is None or active["name"] == collection_name:
+            version = file_digest(document_path)
+            with timed("rag_open_existing"):
+                vectorstore = load_vector_store(collection_name)
+                # Also (re)built when only the FAQ index is missing, e.g. for a collection from an older version,
+                # unless this version of the document was already found to have no FAQ structure
+                faq_missing = (
+                    config.FAQ_INDEX_ENABLED
+                    and backend.get(COLLECTIONS_NAMESPACE, f"no_faq:{collection_name}") != version
+                    and load_faq_index(collection_name) is None
+                )
+            if vectorstore is None or faq_missing:
+                lease = f"ingest:{collection_name}"
+                if backend.set_if_absent(LOCKS_NAMESPACE, lease, os.getpid(), ttl=INGEST_LEASE_SECONDS):
+                    try:
+                        with timed("rag_load"):
+                            documents = load_documents(document_path)
+                        if vectorstore is None:
+                            with timed("rag_split"):
+                                splits = split_documents(documents)
+                            with timed("rag_embed"):
+                                vectorstore = create_vector_store(splits, collection_name=collection_name)
+                        if faq_missing:
+                            with timed("rag_faq_index"):
+                                if build_faq_index(documents, collection_name) is None:
+                                    backend.set(COLLECTIONS_NAMESPACE, f"no_faq:{collection_name}", version)
+                    finally:
+                        backend.delete(LOCKS_NAMESPACE, lease)
+                else:
+                    # Another worker is ingesting; wait for it to register the collection
+                    with timed("rag_wait_for_ingest"):
+                        deadline = time.monotonic() + INGEST_LEASE_SECONDS
+                        while (get_active_collection() is None and backend.get(LOCKS_NAMESPACE, lease) is not None
+                               and time.monotonic() < deadline):
+                            time.sleep(0.5)
+            # Don't clobber a collection uploaded while we were starting up
+            if vectorstore is not None and get_active_collection() in (None, active):
+                activate_collection(collection_name, version)
+
+        sync_active_collection()
+        readiness.rag = "ready" if _local_active is not None else "unavailable"
+        logger.info("Startup document processed and retriever set for chatbot", extra={"document_path": document_path, "rag": readiness.rag})
+    except Exception as e:
+        readiness.rag = "unavailable"
+        readiness.rag_error = str(e)
+        logger.exception("Error processing startup document", extra={"document_path": document_path})
+    finally:
+        logger.info("RAG warm-up finished", extra={"startup_timings": dict(startup_timings)})
+
+def preload_shared_models():
+    """
+    Load read-only model weights in the parent process before workers fork.
+
+    Used by gunicorn.conf.py: workers then share the weights' memory pages
+    copy-on-write instead of each loading its own copy. Only the weights are
+    loaded here; database connections and Chroma clients must be opened after
+    the fork.
+    """
+    with timed("preload_embedding_model"):
+        from rag.rag import get_embeddings
+        get_embeddings()
+
+def format_timings() -> str:
+    return " ".join(f"{step}={seconds:.3f}s" for step, seconds in startup_timings.items())
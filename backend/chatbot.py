@@ -1,4 +1,9 @@
+import contextvars
+import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
 from typing import Literal
 
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
@@ -6,18 +11,47 @@ from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, MessagesState, END, START
 
 
-from llm import get_llm
+import config
+from config import CHAT_DEADLINE_SECONDS, RAG_CONTEXT_MAX_CHARS, RAG_DEDUPE_THRESHOLD
+from llm import get_step_llm, guard_search_tool, invoke_step
+from resilience import DeadlineExceededError, UpstreamError, hedged, request_deadline
 from schema import UserProfile, get_across_thread_memory, get_within_thread_memory
-from tools import get_tavily_tool
-from rag.rag import load_documents, split_documents, create_vector_store, get_retriever
+from tools import get_search_tool
+from metrics import FAQ_LOOKUPS, SEARCHES_DROPPED
+from observability import stage
+import turn_metrics
+from rag.context import assemble_context
+from rag.faq import format_faq_answer, match_faq
+
+logger = logging.getLogger(__name__)
+
+# A turn's web searches run concurrently on this pool
+_search_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="search")
 
 # Set up Google Generative AI
 # Ensure GOOGLE_API_KEY is set in your environment variables
 # os.environ["GOOGLE_API_KEY"] = "YOUR_API_KEY"
 
-tools = [get_tavily_tool()]
-model = get_llm(tools=tools)
-model_with_structure = get_llm().with_structured_output(UserProfile)
+# Models and tools are built on first use (and then reused) rather than at
+# import time, so importing this module stays cheap.
+@lru_cache(maxsize=None)
+def get_tools():
+    return [get_search_tool()]
+
+@lru_cache(maxsize=None)
+def get_search():
+    # Search calls get their own deadline, retries and circuit breaker
+    return guard_search_tool(get_tools()[0])
+
+# Each graph step has its own model settings (config.MODEL_STEPS)
+@lru_cache(maxsize=None)
+def get_model(step: str = "answer"):
+    return get_step_llm(step, tools=get_tools())
+
+@lru_cache(maxsize=None)
+def get_model_with_structure():
+    # include_raw keeps the raw message so token usage can be recorded
+    return get_step_llm("write_memory").with_structured_output(UserProfile, include_raw=True)
 
 CREATE_MEMORY_INSTRUCTION = """Create or update a user profile memory based on the user's chat history. \
 This will be saved for long-term memory. If there is an existing memory, simply update it. \
@@ -43,22 +77,91 @@ class Chatbot:
             checkpointer=self.within_thread_memory,
             store=self.across_thread_memory
         )
+        # Answer-only graph for one-off turns: no memory update and no checkpoints
+        answer_builder = StateGraph(MessagesState)
+        answer_builder.add_node("chatbot", self.call_model)
+        answer_builder.set_entry_point("chatbot")
+        answer_builder.add_edge("chatbot", END)
+        self.answer_graph = answer_builder.compile()
 
         self.retriever = None # Initialize retriever as None
+        self.faq_index = None
 
     def set_retriever(self, retriever):
         self.retriever = retriever
 
-    def _generate_similar_queries(self, original_query: str) -> list[str]:
+    def set_faq_index(self, faq_index):
+        self.faq_index = faq_index
+
+    def _faq_answer(self, message: str):
+        """Stored answer (with citation) if the message matches an FAQ question closely enough."""
+        if self.faq_index is None:
+            return None
+        with stage("faq.match"):
+            match = match_faq(self.faq_index, message, config.FAQ_MATCH_THRESHOLD)
+        FAQ_LOOKUPS.labels("hit" if match else "miss").inc()
+        if match is None:
+            return None
+        doc, score = match
+        logger.info("Answered from FAQ index", extra={"faq_question": doc.page_content, "score": round(score, 4)})
+        return format_faq_answer(doc)
+
+    def _generate_similar_queries(self, original_query: str, runnable_config=None) -> list[str]:
         prompt = f"""Generate 3 similar search queries based on the following query. 
         The queries should be designed to catch potential spelling errors or alternative phrasings.
         Return them as a comma-separated list.
 
         Original query: {original_query}
         Similar queries:"""
-        response = model.invoke([HumanMessage(content=prompt)])
+        try:
+            response = invoke_step("query_expansion", get_model("query_expansion"), [HumanMessage(content=prompt)], runnable_config)
+        except UpstreamError as e:
+            # Expansion only widens the search; go ahead with the original query
+            logger.warning("Query expansion failed", extra={"error": str(e)})
+            return []
         return [q.strip() for q in response.content.split(',') if q.strip()]
 
+    def _search(self, query: str, runnable_config):
+        with stage("tavily.search"):
+            if config.SEARCH_HEDGING:
+                return hedged(get_search(), {"query": query}, runnable_config,
+                              config.SEARCH_HEDGE_PERCENTILE, config.SEARCH_HEDGE_MIN_SAMPLES)
+            return get_search().invoke({"query": query}, runnable_config)
+
+    def _run_searches(self, queries: list, runnable_config) -> list:
+        """
+        Run the web searches concurrently. In partial-results mode, searches
+        still running when only ANSWER_RESERVE_SECONDS of the turn's deadline
+        are left are dropped and listed, so the answer is still generated in time.
+        """
+        turn_metrics.add("web_searches", len(queries))
+        futures = {
+            query: _search_pool.submit(contextvars.copy_context().run, self._search, query, runnable_config)
+            for query in queries
+        }
+        timeout = None
+        deadline = request_deadline(runnable_config)
+        if config.SEARCH_PARTIAL_RESULTS and deadline is not None:
+            timeout = max(0.0, deadline - config.ANSWER_RESERVE_SECONDS - time.time())
+        _, not_done = wait(futures.values(), timeout=timeout)
+
+        search_results, dropped = [], []
+        for query, future in futures.items():
+            if future in not_done:
+                dropped.append(query)
+                continue
+            try:
+                search_results.append(f"Query: {query}\nResult: {future.result()}")
+            except Exception as e:
+                logger.warning("Tavily search failed", extra={"query": query, "error": str(e)})
+                search_results.append(f"Query: {query}\nError: {e}")
+        if dropped:
+            SEARCHES_DROPPED.inc(len(dropped))
+            logger.warning("Dropped searches that missed the deadline", extra={"queries": dropped})
+            search_results.append("Searches dropped because they did not finish in time: " + "; ".join(dropped))
+        return search_results
+
+    @stage("node.chatbot")
     def call_model(self, state: MessagesState, config: RunnableConfig):
         user_id = config["configurable"]["user_id"]
         namespace = ("memory", user_id)
@@ -85,35 +188,38 @@ class Chatbot:
         search_message_content = []
 
         if user_message_content:
-            # Use RAG to retrieve relevant documents if retriever is available
-            if self.retriever:
-                retrieved_docs = self.retriever.invoke(user_message_content)
-                retrieved_content = "\n\nRelevant Documents:\n" + "\n".join([doc.page_content for doc in retrieved_docs])
+            # Use RAG to retrieve relevant documents if retriever is available,
+            # unless they were retrieved ahead of the run (batch requests)
+            retrieved_docs = config["configurable"].get("retrieved_docs")
+            if retrieved_docs is None and self.retriever:
+                started = time.perf_counter()
+                with stage("retrieval"):
+                    retrieved_docs = self.retriever.invoke(user_message_content)
+                turn_metrics.set_field("retrieval_ms", round((time.perf_counter() - started) * 1000, 1))
+            if retrieved_docs is not None:
+                # `config` here is the RunnableConfig, so settings come from the module-level imports
+                with stage("context.assemble"):
+                    context = assemble_context(retrieved_docs, RAG_CONTEXT_MAX_CHARS, RAG_DEDUPE_THRESHOLD)
+                retrieved_content = "\n\nRelevant Documents:\n" + "\n".join(context)
                 search_message_content.append(retrieved_content)
 
             # Generate similar queries
-            similar_queries = self._generate_similar_queries(user_message_content)
+            similar_queries = self._generate_similar_queries(user_message_content, config)
             all_queries = [user_message_content] + similar_queries
 
-            # Use Tavily tool with all queries
-            tavily_tool = tools[0] # Assuming Tavily is the first tool
-            search_results = []
-            for query in all_queries:
-                try:
-                    result = tavily_tool.invoke({"query": query})
-                    search_results.append(f"Query: {query}\nResult: {result}")
-                except Exception as e:
-                    search_results.append(f"Query: {query}\nError: {e}")
+            # Use Tavily tool with all queries, concurrently and within the turn's deadline
+            search_results = self._run_searches(all_queries, config)
             search_message_content.append("\n".join(search_results))
 
             # Add search results and retrieved documents to the messages for the LLM to consider
             search_message = SystemMessage(content="\n".join(search_message_content))
-            response = model.invoke([SystemMessage(content=system_msg), search_message] + state["messages"])
+            response = invoke_step("answer", get_model(), [SystemMessage(content=system_msg), search_message] + state["messages"], config)
         else:
-            response = model.invoke([SystemMessage(content=system_msg)] + state["messages"])
+            response = invoke_step("answer", get_model(), [SystemMessage(content=system_msg)] + state["messages"], config)
 
         return {"messages": [response]}
 
+    @stage("node.write_memory")
     def write_memory(self, state: MessagesState, config: RunnableConfig):
         user_id = config["configurable"]["user_id"]
         namespace = ("memory", user_id)
@@ -129,19 +235,63 @@ class Chatbot:
             )
 
         system_msg = CREATE_MEMORY_INSTRUCTION.format(memory=formatted_memory)
-        new_memory = model_with_structure.invoke([SystemMessage(content=system_msg)] + state["messages"])
+        try:
+            result = invoke_step("write_memory", get_model_with_structure(), [SystemMessage(content=system_msg)] + state["messages"], config)
+        except DeadlineExceededError:
+            # The answer is ready; leave the profile as it was rather than fail the turn
+            logger.warning("Skipped memory update at the request deadline", extra={"user_id": user_id})
+            return state
+        if result["parsing_error"] is not None:
+            raise result["parsing_error"]
+        new_memory = result["parsed"]
 
         key = "user_memory"
         self.across_thread_memory.put(namespace, key, new_memory.model_dump())
         return state
 
-    def invoke(self, message: str, thread_id: str, user_id: str):
+    def is_context_free(self, thread_id: str, user_id: str) -> bool:
+        """True if an answer can't depend on this user or thread: no stored profile and no earlier turns."""
+        if self.across_thread_memory.get(("memory", str(user_id)), "user_memory") is not None:
+            return False
+        return self.within_thread_memory.get_tuple({"configurable": {"thread_id": thread_id}}) is None
+
+    def record_turn(self, message: str, answer: str, thread_id: str, user_id: str):
+        """Add a turn answered elsewhere (FAQ index, a coalesced run) to the thread's history without running the graph."""
+        config = {"configurable": {"thread_id": thread_id, "user_id": str(user_id)}}
+        self.graph.update_state(
+            config,
+            {"messages": [HumanMessage(content=message), AIMessage(content=answer)]},
+            as_node="write_memory",
+        )
+
+    def invoke(self, message: str, thread_id: str, user_id: str, retrieved_docs=None, deadline: float = None,
+               persist: bool = True):
+        """
+        Answer one turn. retrieved_docs, if given, replaces the retriever call
+        (used when a batch of questions was searched together). deadline is a
+        time.time() timestamp; it defaults to CHAT_DEADLINE_SECONDS from now.
+        With persist=False the turn is answered without updating the user's
+        profile or saving the thread.
+        """
         # Ensure user_id is treated as a string (UUID from database will be converted to string)
         user_id = str(user_id)
-        config = {"configurable": {"thread_id": thread_id, "user_id": user_id}}
-        response = self.graph.invoke({"messages": [HumanMessage(content=message)]}, config)
+        if deadline is None and CHAT_DEADLINE_SECONDS > 0:
+            deadline = time.time() + CHAT_DEADLINE_SECONDS
+        # Every LLM and search call in the graph reads the deadline from this config
+        config = {"configurable": {"thread_id": thread_id, "user_id": user_id, "deadline": deadline}}
+        if retrieved_docs is not None:
+            config["configurable"]["retrieved_docs"] = retrieved_docs
+        faq_answer = self._faq_answer(message)
+        if faq_answer is not None:
+            turn_metrics.set_field("cache", "faq")
+            if persist:
+                self.record_turn(message, faq_answer, thread_id, user_id)
+            return faq_answer
+        graph = self.graph if persist else self.answer_graph
+        response = graph.invoke({"messages": [HumanMessage(content=message)]}, config)
         llm_response = response["messages"][-1].content
-        print(f"LLM Response: {llm_response}") # Add this line to print the LLM response
+        logger.info("LLM response", extra={"thread_id": thread_id, "user_id": user_id, "response_chars": len(llm_response)})
+        logger.debug("LLM response text", extra={"thread_id": thread_id, "response": llm_response})
         return llm_response
 
 if __name__ == "__main__":
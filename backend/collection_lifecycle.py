@@ -0,0 +1,248 @@
+"""
+Collection lifecycle: who uses which collection, expiry of unused ones and
+cleanup of the disk space they leave behind.
+
+References live in the shared state backend, one entry per collection:
+{"created_at", "last_used", "owner", "users": {id: ts}, "sessions": {id: ts}}.
+Chat turns refresh them at most once per COLLECTION_TOUCH_SECONDS per
+(collection, user, session) in each worker, so most turns only pay a dict
+lookup.
+
+A collection expires once it has not been used for COLLECTION_TTL_DAYS,
+unless it is the active or the startup collection. Deleting a collection
+removes its vector store, its FAQ index, its upload records and files and
+its references. Upload files no record points to are orphans and are
+removed too, after a grace period that covers an ingestion in progress.
+
+Run from the backend directory:
+
+    python collection_lifecycle.py list
+    python collection_lifecycle.py gc --dry-run
+    python collection_lifecycle.py delete old_manual
+    python collection_lifecycle.py compact
+
+`compact` VACUUMs chroma.sqlite3 and needs the server stopped.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+import app_state
+import config
+from shared_state import get_state_backend
+from uploads import UPLOADS_NAMESPACE
+
+logger = logging.getLogger(__name__)
+
+REFS_NAMESPACE = "collection_refs"
+# Sessions remembered per collection; the least recently used are dropped
+MAX_TRACKED_SESSIONS = 1000
+# Collections that belong to another collection and share its lifecycle
+INTERNAL_SUFFIXES = ("__faq",)
+
+_touched = {}
+_touched_lock = threading.Lock()
+
+def _record(collection_name: str, user_id: str = None, session_id: str = None, owner: str = None):
+    now = time.time()
+
+    def fn(entry):
+        entry = entry or {"created_at": now, "owner": None, "users": {}, "sessions": {}}
+        entry["last_used"] = now
+        if owner and not entry["owner"]:
+            entry["owner"] = owner
+        if user_id:
+            entry["users"][user_id] = now
+        if session_id:
+            entry["sessions"][session_id] = now
+            if len(entry["sessions"]) > MAX_TRACKED_SESSIONS:
+                oldest = sorted(entry["sessions"], key=entry["sessions"].get)
+                for key in oldest[:len(entry["sessions"]) - MAX_TRACKED_SESSIONS]:
+                    del entry["sessions"][key]
+        return entry, None
+
+    get_state_backend().update(REFS_NAMESPACE, collection_name, fn)
+
+def touch(collection_name: str, user_id: str, session_id: str = None):
+    """Record that a user (and session) used a collection. Throttled per worker."""
+    key = (collection_name, str(user_id), session_id)
+    now = time.monotonic()
+    with _touched_lock:
+        last = _touched.get(key)
+        if last is not None and now - last < config.COLLECTION_TOUCH_SECONDS:
+            return
+        if len(_touched) > 10000:
+            _touched.clear()
+        _touched[key] = now
+    _record(collection_name, str(user_id), session_id)
+
+def record_upload(collection_name: str, user_id: str):
+    """Record an upload into a collection; the first uploader owns it."""
+    _record(collection_name, str(user_id), owner=str(user_id))
+
+def get_refs(collection_name: str):
+    return get_state_backend().get(REFS_NAMESPACE, collection_name)
+
+def _uploads_by_collection() -> dict:
+    by_collection = {}
+    for digest, entry in get_state_backend().items(UPLOADS_NAMESPACE).items():
+        by_collection.setdefault(entry["collection"], []).append({"digest": digest, **entry})
+    return by_collection
+
+def _upload_files(upload_dir: str) -> dict:
+    """Stored upload files by digest (their name without extension)."""
+    if not os.path.isdir(upload_dir):
+        return {}
+    return {
+        os.path.splitext(name)[0]: os.path.join(upload_dir, name)
+        for name in os.listdir(upload_dir)
+        if os.path.isfile(os.path.join(upload_dir, name))
+    }
+
+def _protected() -> set:
+    active = app_state.get_active_collection()
+    return {config.RAG_COLLECTION_NAME} | ({active["name"]} if active else set())
+
+def list_collections() -> list:
+    """Every user-visible collection with its size, chunk count, uploads and references."""
+    from rag.faq import faq_collection_name
+    from rag.rag import list_vector_stores, vector_store_usage
+
+    names = list_vector_stores()
+    active = app_state.get_active_collection()
+    uploads_by_collection = _uploads_by_collection()
+    upload_files = _upload_files(config.UPLOAD_DIR)
+    refs = get_state_backend().items(REFS_NAMESPACE)
+    collections = []
+    for name in names:
+        if name.endswith(INTERNAL_SUFFIXES):
+            continue
+        usage = vector_store_usage(name)
+        faq_usage = vector_store_usage(faq_collection_name(name)) if faq_collection_name(name) in names else None
+        entry = refs.get(name) or {}
+        uploads = uploads_by_collection.get(name, [])
+        collections.append({
+            "name": name,
+            "active": bool(active and active["name"] == name),
+            "startup": name == config.RAG_COLLECTION_NAME,
+            "chunks": usage["chunks"],
+            "faq_questions": faq_usage["chunks"] if faq_usage else 0,
+            "bytes_on_disk": usage["bytes_on_disk"] + (faq_usage["bytes_on_disk"] if faq_usage else 0),
+            "upload_bytes": sum(
+                os.path.getsize(upload_files[u["digest"]]) for u in uploads if u["digest"] in upload_files
+            ),
+            "uploads": [u["filename"] for u in uploads],
+            "owner": entry.get("owner"),
+            "users": len(entry.get("users", {})),
+            "sessions": len(entry.get("sessions", {})),
+            "created_at": entry.get("created_at"),
+            "last_used": entry.get("last_used"),
+        })
+    return collections
+
+def delete_collection(collection_name: str) -> dict:
+    """
+    Delete a collection with its FAQ index, upload files and records. Raises
+    ValueError for the active or the startup collection.
+    """
+    from rag.faq import faq_collection_name
+    from rag.rag import delete_vector_store
+
+    if collection_name in _protected():
+        raise ValueError(f"Collection '{collection_name}' is in use (active or startup collection)")
+    backend = get_state_backend()
+    upload_files = _upload_files(config.UPLOAD_DIR)
+    freed = 0
+    for upload in _uploads_by_collection().get(collection_name, []):
+        path = upload_files.get(upload["digest"])
+        if path and os.path.exists(path):
+            freed += os.path.getsize(path)
+            os.remove(path)
+        backend.delete(UPLOADS_NAMESPACE, upload["digest"])
+    delete_vector_store(faq_collection_name(collection_name))
+    delete_vector_store(collection_name)
+    backend.delete(REFS_NAMESPACE, collection_name)
+    logger.info("Deleted collection", extra={"collection": collection_name, "upload_bytes_freed": freed})
+    return {"collection": collection_name, "upload_bytes_freed": freed}
+
+def expired_collections(now: float = None) -> list:
+    """Collections unused for COLLECTION_TTL_DAYS (never, if it is 0)."""
+    if config.COLLECTION_TTL_DAYS <= 0:
+        return []
+    from rag.rag import list_vector_stores
+
+    now = now or time.time()
+    cutoff = now - config.COLLECTION_TTL_DAYS * 86400
+    refs = get_state_backend().items(REFS_NAMESPACE)
+    protected = _protected()
+    expired = []
+    for name in list_vector_stores():
+        if name.endswith(INTERNAL_SUFFIXES) or name in protected:
+            continue
+        entry = refs.get(name)
+        if entry is None:
+            # Created before tracking started: start its clock now rather than deleting it
+            _record(name)
+            continue
+        if entry["last_used"] < cutoff:
+            expired.append(name)
+    return expired
+
+def orphan_upload_files(now: float = None) -> list:
+    """Upload files (and abandoned temp files) that no upload record points to."""
+    now = now or time.time()
+    recorded = set(get_state_backend().items(UPLOADS_NAMESPACE))
+    startup_document = os.path.abspath(config.RAG_DOCUMENT_PATH)
+    orphans = []
+    for digest, path in _upload_files(config.UPLOAD_DIR).items():
+        if digest in recorded or os.path.abspath(path) == startup_document:
+            continue
+        # Leave files an ingestion in progress has not recorded yet
+        if now - os.path.getmtime(path) < config.UPLOAD_ORPHAN_GRACE_SECONDS:
+            continue
+        orphans.append(path)
+    return orphans
+
+def collect_garbage(dry_run: bool = False) -> dict:
+    """Delete expired collections and orphaned upload files."""
+    expired = expired_collections()
+    orphans = orphan_upload_files()
+    freed = sum(os.path.getsize(path) for path in orphans)
+    if not dry_run:
+        for name in expired:
+            freed += delete_collection(name)["upload_bytes_freed"]
+        for path in orphans:
+            os.remove(path)
+        logger.info("Collection GC finished", extra={"expired": expired, "orphan_uploads": len(orphans)})
+    return {"dry_run": dry_run, "expired_collections": expired, "orphan_uploads": orphans, "upload_bytes_freed": freed}
+
+def main():
+    parser = argparse.ArgumentParser(description="List, expire, delete and compact RAG collections.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Per-collection size, chunk count and references")
+    gc = subparsers.add_parser("gc", help="Delete expired collections and orphaned upload files")
+    gc.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+    delete = subparsers.add_parser("delete", help="Delete one collection")
+    delete.add_argument("collection")
+    subparsers.add_parser("compact", help="Reclaim space left by deleted collections (server stopped)")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        result = list_collections()
+    elif args.command == "gc":
+        result = collect_garbage(dry_run=args.dry_run)
+    elif args.command == "delete":
+        try:
+            result = delete_collection(args.collection)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        from rag.rag import compact_vector_stores
+        result = compact_vector_stores()
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# Central place for settings read from the environment (or the .env file).
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Response compression: "gzip", "br" (Brotli, needs the brotli-asgi package) or "off".
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "gzip").lower()
+# Responses smaller than this many bytes are sent uncompressed.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1000"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Document indexed at startup and the collection it is stored in.
+RAG_DOCUMENT_PATH = os.getenv("RAG_DOCUMENT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rag", "Document.pdf"))
+RAG_COLLECTION_NAME = os.getenv("RAG_COLLECTION_NAME", "hp_victus_faq")
+# How the startup document is indexed: "background" (default; the app serves
+# requests while indexing and /ready reports 503 until done), "blocking"
+# (startup waits for indexing) or "off".
+RAG_WARMUP = os.getenv("RAG_WARMUP", "background").lower()
+
+# Shared state for multi-worker deployments: "memory" (single process only)
+# or "sqlite" (files under STATE_DIR, shared by all workers on the host).
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+STATE_DIR = os.getenv("STATE_DIR", "./state")
+
+# Cross-session answer cache keyed by collection version and normalized query.
+# Off by default because answers may be personalized from user memory.
+RESPONSE_CACHE_ENABLED = env_bool("RESPONSE_CACHE_ENABLED", False)
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+
+# Logging: LOG_FORMAT is "json" (one object per line, with request_id) or "text".
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+# Model and search providers: "google" / "tavily" for the real services, or
+# "fake" for the deterministic local stand-ins in fakes.py (load testing).
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "google").lower()
+SEARCH_PROVIDER = os.getenv("SEARCH_PROVIDER", "tavily").lower()
+FAKE_SEED = int(os.getenv("FAKE_SEED", "0"))
+FAKE_LLM_LATENCY_MEDIAN_MS = float(os.getenv("FAKE_LLM_LATENCY_MEDIAN_MS", "800"))
+FAKE_LLM_LATENCY_P95_MS = float(os.getenv("FAKE_LLM_LATENCY_P95_MS", "2500"))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "80"))
+FAKE_LLM_OUTPUT_TOKENS = int(os.getenv("FAKE_LLM_OUTPUT_TOKENS", "120"))
+FAKE_SEARCH_LATENCY_MEDIAN_MS = float(os.getenv("FAKE_SEARCH_LATENCY_MEDIAN_MS", "600"))
+FAKE_SEARCH_LATENCY_P95_MS = float(os.getenv("FAKE_SEARCH_LATENCY_P95_MS", "2000"))
+FAKE_SEARCH_ERROR_RATE = float(os.getenv("FAKE_SEARCH_ERROR_RATE", "0"))
+
+# Upstream resilience (see resilience.py). Timeouts are overall per-call
+# deadlines including retries; concurrency caps are per model / per search tool.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "15"))
+SEARCH_MAX_RETRIES = int(os.getenv("SEARCH_MAX_RETRIES", "2"))
+SEARCH_MAX_CONCURRENCY = int(os.getenv("SEARCH_MAX_CONCURRENCY", "32"))
+BACKOFF_BASE_SECONDS = float(os.getenv("BACKOFF_BASE_SECONDS", "0.5"))
+BACKOFF_MAX_SECONDS = float(os.getenv("BACKOFF_MAX_SECONDS", "8"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+# Per-step model settings for the chat graph (see llm.get_step_llm). Each step
+# can be overridden with LLM_<STEP>_PROVIDER / _MODEL / _TEMPERATURE /
+# _MAX_TOKENS / _TOOLS, e.g. LLM_QUERY_EXPANSION_MODEL=gemini-2.5-flash.
+# Auxiliary steps default to a smaller, faster model with tight output caps;
+# a max_tokens of 0 means no cap.
+def _model_step(step: str, model: str, temperature: float, max_tokens: int, tools: bool) -> dict:
+    prefix = f"LLM_{step.upper()}_"
+    max_tokens = int(os.getenv(prefix + "MAX_TOKENS", str(max_tokens)))
+    return {
+        "provider": os.getenv(prefix + "PROVIDER", LLM_PROVIDER).lower(),
+        "model": os.getenv(prefix + "MODEL", model),
+        "temperature": float(os.getenv(prefix + "TEMPERATURE", str(temperature))),
+        "max_tokens": max_tokens or None,
+        "tools": env_bool(prefix + "TOOLS", tools),
+    }
+
+MODEL_STEPS = {
+    "query_expansion": _model_step("query_expansion", "gemini-2.5-flash-lite", 0.3, 128, False),
+    "answer": _model_step("answer", "gemini-2.5-flash", 0.7, 0, True),
+    "write_memory": _model_step("write_memory", "gemini-2.5-flash-lite", 0.0, 256, False),
+}
+
+# Retrieved chunks are merged, deduplicated and cut to this many characters
+# before going into the prompt (see rag/context.py). Segments whose estimated
+# similarity to a more relevant one is at least the threshold are dropped.
+RAG_CONTEXT_MAX_CHARS = int(os.getenv("RAG_CONTEXT_MAX_CHARS", "6000"))
+RAG_DEDUPE_THRESHOLD = float(os.getenv("RAG_DEDUPE_THRESHOLD", "0.8"))
+
+# Default HNSW index settings for new Chroma collections; unset values use
+# Chroma's defaults. They are stored in each collection's metadata and can be
+# changed per collection with `python -m rag.reindex` (see rag/reindex.py).
+HNSW_SETTINGS = {
+    key: int(os.environ[env])
+    for key, env in (
+        ("hnsw:M", "HNSW_M"),
+        ("hnsw:construction_ef", "HNSW_CONSTRUCTION_EF"),
+        ("hnsw:search_ef", "HNSW_SEARCH_EF"),
+        ("hnsw:batch_size", "HNSW_BATCH_SIZE"),
+        ("hnsw:sync_threshold", "HNSW_SYNC_THRESHOLD"),
+    )
+    if os.getenv(env)
+}
+
+# Embedding backend: "huggingface" (sentence-transformers on PyTorch) or "onnx"
+# (an int8-quantized ONNX export of the same model run by onnxruntime, see
+# rag/onnx_embeddings.py). EMBEDDING_THREADS caps onnxruntime's threads per
+# process (0 = one per core); with several workers, keep workers x threads at
+# or below the core count.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface").lower()
+EMBEDDING_ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH", "./onnx_models/all-MiniLM-L6-v2")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "model_int8.onnx")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+
+# Vector store for RAG collections: "chroma" (persistent HNSW index) or
+# "numpy" (exact in-process search over a memory-mapped matrix under
+# NUMPY_INDEX_PATH, for FAQ-sized collections; see rag/numpy_store.py).
+# VECTOR_QUANTIZATION ("float32" or "int8") applies to the numpy backend.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "float32").lower()
+NUMPY_INDEX_PATH = os.getenv("NUMPY_INDEX_PATH", "./numpy_index")
+
+# FAQ-style documents also get a question index (see rag/faq.py); a chat
+# message matching an FAQ question with at least this cosine similarity is
+# answered directly from the document, without the LLM.
+FAQ_INDEX_ENABLED = env_bool("FAQ_INDEX_ENABLED", True)
+FAQ_MATCH_THRESHOLD = float(os.getenv("FAQ_MATCH_THRESHOLD", "0.9"))
+
+# Uploaded documents are streamed into UPLOAD_DIR, named by content digest
+# (see uploads.py). Larger uploads are rejected with 413.
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./backend/rag/uploaded_documents")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+
+# Per-user rate limits and quotas (see rate_limit.py). Buckets are kept in the
+# state backend, so they are shared between workers when STATE_BACKEND=sqlite.
+RATE_LIMIT_ENABLED = env_bool("RATE_LIMIT_ENABLED", True)
+RATE_LIMIT_REQUESTS_PER_MINUTE = float(os.getenv("RATE_LIMIT_REQUESTS_PER_MINUTE", "30"))
+RATE_LIMIT_LLM_TOKENS_PER_DAY = float(os.getenv("RATE_LIMIT_LLM_TOKENS_PER_DAY", "500000"))
+RATE_LIMIT_UPLOADS_PER_HOUR = float(os.getenv("RATE_LIMIT_UPLOADS_PER_HOUR", "20"))
+
+# Coalesce identical /chat turns that are in flight at the same time (see
+# singleflight.py). SINGLEFLIGHT_SHARED also coalesces across users when the
+# answer cannot depend on the user (no profile memory, first turn of a thread).
+# A user whose turn was answered by another user's run gets the turn added to
+# their thread but skips the write_memory step, so that first message does not
+# update their profile (the same as an FAQ-index answer). Disable
+# SINGLEFLIGHT_SHARED if every turn must reach the profile.
+SINGLEFLIGHT_ENABLED = env_bool("SINGLEFLIGHT_ENABLED", True)
+SINGLEFLIGHT_SHARED = env_bool("SINGLEFLIGHT_SHARED", True)
+
+# /chat/batch: questions per request, and how many of them run the LLM at once.
+CHAT_BATCH_MAX_QUESTIONS = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "500"))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+
+# Collection lifecycle (see collection_lifecycle.py). Collections unused for
+# COLLECTION_TTL_DAYS are deleted by `python collection_lifecycle.py gc`
+# (0 keeps them forever); chat turns refresh a collection's references at most
+# every COLLECTION_TOUCH_SECONDS per session and worker.
+COLLECTION_TTL_DAYS = float(os.getenv("COLLECTION_TTL_DAYS", "30"))
+COLLECTION_TOUCH_SECONDS = float(os.getenv("COLLECTION_TOUCH_SECONDS", "300"))
+UPLOAD_ORPHAN_GRACE_SECONDS = float(os.getenv("UPLOAD_ORPHAN_GRACE_SECONDS", "3600"))
+
+# Overall deadline for one chat turn, carried in the graph's RunnableConfig to
+# every LLM and search call (0 disables). With SEARCH_PARTIAL_RESULTS the
+# answer goes ahead with the searches that have finished once only
+# ANSWER_RESERVE_SECONDS of the deadline are left, noting the dropped ones.
+# SEARCH_HEDGING sends a duplicate search when one runs past the search
+# upstream's recent SEARCH_HEDGE_PERCENTILE latency.
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "60"))
+ANSWER_RESERVE_SECONDS = float(os.getenv("ANSWER_RESERVE_SECONDS", "20"))
+SEARCH_PARTIAL_RESULTS = env_bool("SEARCH_PARTIAL_RESULTS", True)
+SEARCH_HEDGING = env_bool("SEARCH_HEDGING", False)
+SEARCH_HEDGE_PERCENTILE = float(os.getenv("SEARCH_HEDGE_PERCENTILE", "95"))
+SEARCH_HEDGE_MIN_SAMPLES = int(os.getenv("SEARCH_HEDGE_MIN_SAMPLES", "20"))
+
+# Per-turn token / latency records in the turn_metrics table (see
+# turn_metrics.py), written by a background thread in batches. Usage
+# aggregates across all users are only served to USAGE_ADMIN_USERNAMES.
+TURN_METRICS_ENABLED = env_bool("TURN_METRICS_ENABLED", True)
+TURN_METRICS_BATCH_SIZE = int(os.getenv("TURN_METRICS_BATCH_SIZE", "100"))
+TURN_METRICS_FLUSH_SECONDS = float(os.getenv("TURN_METRICS_FLUSH_SECONDS", "2"))
+TURN_METRICS_MAX_QUEUE = int(os.getenv("TURN_METRICS_MAX_QUEUE", "10000"))
+USAGE_ADMIN_USERNAMES = {name.strip() for name in os.getenv("USAGE_ADMIN_USERNAMES", "").split(",") if name.strip()}
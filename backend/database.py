@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import create_engine, Column, String, Boolean, ForeignKey, DateTime, Index, Integer, Float, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, Session
 from sqlalchemy.dialects.postgresql import UUID
@@ -21,6 +21,10 @@ class ChatDB:
         if not database_exists(self.engine.url):
             create_database(self.engine.url)
         Base.metadata.create_all(bind=self.engine)
+        # create_all skips indexes on tables that already exist, so add any new ones explicitly
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=self.engine, checkfirst=True)
 
     def get_db(self):
         db = self.SessionLocal()
@@ -62,6 +66,11 @@ class ChatSession(Base):
     user = relationship("User", back_populates="chat_sessions")
     messages = relationship("ChatMessage", back_populates="chat_session")
 
+    # Keyset pagination index for the session list (newest first per user)
+    __table_args__ = (
+        Index("ix_chat_sessions_user_updated_id", "user_id", "last_updated", "id"),
+    )
+
 # Define ChatMessage model
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
@@ -73,4 +82,40 @@ class ChatMessage(Base):
     timestamp = Column(DateTime, default=datetime.now)
     
     # Relationships
-    chat_session = relationship("ChatSession", back_populates="messages")
\ No newline at end of file
+    chat_session = relationship("ChatSession", back_populates="messages")
+
+    # Keyset pagination index for message history (newest first per session)
+    __table_args__ = (
+        Index("ix_chat_messages_session_ts_id", "chat_session_id", "timestamp", "id"),
+    )
+
+# Define TurnMetrics model: cost and latency of one chat turn (see turn_metrics.py)
+class TurnMetrics(Base):
+    __tablename__ = "turn_metrics"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    # Batch questions run in threads that are not chat sessions, so this is free-form
+    chat_session_id = Column(String, nullable=True)
+    collection = Column(String, nullable=True)
+    collection_version = Column(String, nullable=True)
+    endpoint = Column(String)
+    # session, response, faq, coalesced or miss (the graph ran)
+    cache = Column(String)
+    status = Column(String, default="ok")
+    model = Column(String, nullable=True)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    # One {"step", "model", "prompt_tokens", "completion_tokens", "ms"} per LLM call
+    llm_calls = Column(JSON, default=list)
+    web_searches = Column(Integer, default=0)
+    retrieval_ms = Column(Float, nullable=True)
+    total_ms = Column(Float)
+    created_at = Column(DateTime, default=datetime.now)
+
+    # Aggregates per user / per collection over a time range, and per day
+    __table_args__ = (
+        Index("ix_turn_metrics_user_created", "user_id", "created_at"),
+        Index("ix_turn_metrics_collection_created", "collection", "created_at"),
+        Index("ix_turn_metrics_created", "created_at"),
+    )
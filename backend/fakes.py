@@ -0,0 +1,177 @@
+# Deterministic local stand-ins for Gemini and Tavily.
+#
+# Selected with LLM_PROVIDER=fake / SEARCH_PROVIDER=fake so the whole stack
+# can be load-tested and regression-tested without network access or API
+# keys. Outputs depend only on the input text; latency is drawn from a
+# seeded log-normal distribution described by its median and p95, plus a
+# per-token generation delay for the LLM.
+import asyncio
+import hashlib
+import math
+import random
+import threading
+import time
+from typing import Any, List, Optional, Type
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel, Field, PrivateAttr
+
+# z-score of the 95th percentile of a standard normal distribution
+_Z95 = 1.6449
+
+class LatencyDistribution:
+    """Log-normal latency with the given median and p95 (milliseconds)."""
+
+    def __init__(self, median_ms: float, p95_ms: float, seed: int = 0):
+        self.median_ms = max(median_ms, 0.0)
+        p95_ms = max(p95_ms, self.median_ms)
+        self.mu = math.log(self.median_ms) if self.median_ms > 0 else 0.0
+        self.sigma = math.log(p95_ms / self.median_ms) / _Z95 if self.median_ms > 0 else 0.0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_seconds(self) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        with self._lock:
+            return self._rng.lognormvariate(self.mu, self.sigma) / 1000.0
+
+def estimate_tokens(text: str) -> int:
+    # Rough rule of thumb for English text, good enough for load modelling
+    return max(1, len(text) // 4)
+
+def _stable_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _message_text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else str(message.content)
+
+class FakeChatModel(BaseChatModel):
+    """Chat model returning deterministic text after a simulated delay. Never calls tools."""
+
+    model_name: str = "fake-chat"
+    latency_median_ms: float = 800.0
+    latency_p95_ms: float = 2500.0
+    tokens_per_second: float = 80.0
+    output_tokens: int = 120
+    seed: int = 0
+
+    _latency: LatencyDistribution = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        self._latency = LatencyDistribution(self.latency_median_ms, self.latency_p95_ms, self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        prompt = "\n".join(_message_text(m) for m in messages)
+        last_human = next((_message_text(m) for m in reversed(messages) if isinstance(m, HumanMessage)), prompt)
+        digest = _stable_hash(last_human)
+        if "comma-separated" in last_human:
+            # Query expansion prompt: answer in the requested shape
+            original = last_human.split("Original query:", 1)[-1].split("\n", 1)[0].strip()[:120]
+            content = ", ".join(f"{original} variant {digest[i]}" for i in range(3))
+        else:
+            words = [f"w{digest[i % len(digest)]}{i}" for i in range(self.output_tokens)]
+            content = f"[{self.model_name}] Answer to: {last_human[:200]}\n" + " ".join(words)
+        input_tokens = estimate_tokens(prompt)
+        output_tokens = estimate_tokens(content)
+        return AIMessage(
+            content=content,
+            usage_metadata={"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens},
+            response_metadata={"model_name": self.model_name},
+        )
+
+    def _delay(self, message: AIMessage) -> float:
+        generation = message.usage_metadata["output_tokens"] / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        return self._latency.sample_seconds() + generation
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        message = self._respond(messages)
+        time.sleep(self._delay(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        message = self._respond(messages)
+        await asyncio.sleep(self._delay(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def with_structured_output(self, schema: Type[BaseModel], include_raw: bool = False, **kwargs):
+        def structured(messages):
+            raw = self.invoke(messages)
+            parsed = _placeholder_instance(schema)
+            return {"raw": raw, "parsed": parsed, "parsing_error": None} if include_raw else parsed
+        return RunnableLambda(structured)
+
+def _placeholder_instance(schema: Type[BaseModel]) -> BaseModel:
+    """Build a schema instance with neutral values for every required field."""
+    values = {}
+    for name, field in schema.model_fields.items():
+        if not field.is_required():
+            continue
+        annotation = getattr(field.annotation, "__origin__", field.annotation)
+        if annotation in (list, List):
+            values[name] = []
+        elif annotation is dict:
+            values[name] = {}
+        elif annotation in (int, float):
+            values[name] = annotation(0)
+        elif annotation is bool:
+            values[name] = False
+        else:
+            values[name] = "Unknown"
+    return schema(**values)
+
+class FakeSearchInput(BaseModel):
+    query: str = Field(description="Search query")
+
+class FakeSearchTool(BaseTool):
+    """Web search stand-in returning Tavily-shaped results after a simulated delay."""
+
+    name: str = "tavily_search"
+    description: str = "Searches the web for the given query and returns the top results."
+    args_schema: Type[BaseModel] = FakeSearchInput
+    max_results: int = 5
+    latency_median_ms: float = 600.0
+    latency_p95_ms: float = 2000.0
+    error_rate: float = 0.0
+    seed: int = 0
+
+    _latency: LatencyDistribution = PrivateAttr()
+    _rng: random.Random = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        self._latency = LatencyDistribution(self.latency_median_ms, self.latency_p95_ms, self.seed)
+        self._rng = random.Random(self.seed + 1)
+
+    def _results(self, query: str) -> dict:
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise RuntimeError("Simulated search provider error")
+        digest = _stable_hash(query)
+        results = [
+            {
+                "title": f"Result {i + 1} for {query[:60]}",
+                "url": f"https://example.invalid/{digest[:12]}/{i}",
+                "content": f"Simulated snippet {digest[i * 4:i * 4 + 8]} about {query[:120]}.",
+                "score": round(1.0 - i * 0.1, 2),
+            }
+            for i in range(self.max_results)
+        ]
+        return {"query": query, "results": results}
+
+    def _run(self, query: str, run_manager=None) -> dict:
+        time.sleep(self._latency.sample_seconds())
+        return self._results(query)
+
+    async def _arun(self, query: str, run_manager=None) -> dict:
+        await asyncio.sleep(self._latency.sample_seconds())
+        return self._results(query)
@@ -0,0 +1,47 @@
+# Multi-worker deployment: run from the backend directory with
+#
+#     gunicorn -c gunicorn.conf.py main:app
+#
+# The app is imported once in the master (preload_app) and the embedding model
+# is loaded there before forking, so workers share its memory pages
+# copy-on-write instead of each loading a copy. State that must agree across
+# workers goes through the SQLite shared state backend.
+import gc
+import multiprocessing
+import os
+import shutil
+
+# These must be set before the app (and prometheus_client) is imported
+os.environ.setdefault("STATE_BACKEND", "sqlite")
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.abspath("./state/prometheus"))
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# A chat turn makes several LLM and web search calls
+timeout = int(os.getenv("WORKER_TIMEOUT", "180"))
+graceful_timeout = 30
+keepalive = 5
+
+def when_ready(server):
+    import app_state
+    app_state.preload_shared_models()
+    server.log.info(f"Preloaded shared models: {app_state.format_timings()}")
+    # Move everything allocated so far into the permanent generation so the
+    # garbage collector does not write to (and un-share) those pages in workers.
+    gc.freeze()
+
+def post_fork(server, worker):
+    # Split CPU threads between workers instead of every worker using all cores
+    try:
+        import torch
+        torch.set_num_threads(max(1, multiprocessing.cpu_count() // workers))
+    except ImportError:
+        pass
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
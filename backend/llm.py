@@ -1,20 +1,159 @@
+import logging
 import os
-from typing import List
-from langchain_core.tools import BaseTool
-from langchain_google_genai import ChatGoogleGenerativeAI
+import threading
+import time
+from contextvars import ContextVar
+from typing import List, TYPE_CHECKING
 from dotenv import load_dotenv
-from tools import get_tavily_tool
-
-def get_llm(model_name: str = "gemini-2.5-flash", temperature: float = 0.7, tools: List[BaseTool] = None):
-    load_dotenv() # Load environment variables from .env file
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    if not google_api_key:
-        raise ValueError("GOOGLE_API_KEY environment variable not set.")
-    llm = ChatGoogleGenerativeAI(model=model_name, temperature=temperature, google_api_key=google_api_key)
-    # print(llm)
-    # print(llm.invoke("what is the largest animal and tell me 5 facts about it"))
-    tools=[get_tavily_tool()]
+
+import config
+from metrics import LLM_STEP_SECONDS, LLM_STEP_TOKENS
+from observability import stage
+from resilience import GuardedRunnable, UpstreamPolicy
+import turn_metrics
+
+if TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
+
+logger = logging.getLogger(__name__)
+
+# Client registry: one underlying client per (provider, model, temperature, max tokens),
+# shared by every caller so HTTP connections are reused, and one resilience
+# policy (breaker + concurrency cap) per model, shared by all its variants.
+_clients = {}
+_policies = {}
+_registry_lock = threading.Lock()
+
+# Token usage of the current request, {"input": n, "output": n}. Mutated in
+# place so calls made in threadpool / graph executor context copies count too.
+_request_usage: ContextVar[dict] = ContextVar("request_usage", default=None)
+
+def track_token_usage() -> dict:
+    """Start counting LLM tokens for the current request; returns the live totals."""
+    usage = {"input": 0, "output": 0}
+    _request_usage.set(usage)
+    return usage
+
+def _build_client(provider: str, model_name: str, temperature: float, max_tokens: int = None):
+    if provider == "fake":
+        from fakes import FakeChatModel
+        output_tokens = config.FAKE_LLM_OUTPUT_TOKENS
+        return FakeChatModel(
+            model_name=f"fake-{model_name}",
+            latency_median_ms=config.FAKE_LLM_LATENCY_MEDIAN_MS,
+            latency_p95_ms=config.FAKE_LLM_LATENCY_P95_MS,
+            tokens_per_second=config.FAKE_LLM_TOKENS_PER_SECOND,
+            output_tokens=min(output_tokens, max_tokens) if max_tokens else output_tokens,
+            seed=config.FAKE_SEED,
+        )
+    if provider == "google":
+        load_dotenv() # Load environment variables from .env file
+        google_api_key = os.getenv("GOOGLE_API_KEY")
+        if not google_api_key:
+            raise ValueError("GOOGLE_API_KEY environment variable not set.")
+        # Imported here so the provider SDK is only loaded when a model is first built
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        # Retries and deadlines are handled by the registry's policy, not the SDK
+        return ChatGoogleGenerativeAI(
+            model=model_name,
+            temperature=temperature,
+            google_api_key=google_api_key,
+            max_output_tokens=max_tokens,
+            timeout=config.LLM_TIMEOUT_SECONDS,
+            max_retries=0,
+        )
+    raise ValueError(f"Unknown LLM provider: {provider}")
+
+def get_policy(name: str, timeout: float, max_retries: int, max_concurrency: int) -> UpstreamPolicy:
+    """Return the shared resilience policy for an upstream, creating it on first use."""
+    with _registry_lock:
+        policy = _policies.get(name)
+        if policy is None:
+            policy = UpstreamPolicy(
+                name,
+                timeout=timeout,
+                max_retries=max_retries,
+                backoff_base=config.BACKOFF_BASE_SECONDS,
+                backoff_max=config.BACKOFF_MAX_SECONDS,
+                max_concurrency=max_concurrency,
+                failure_threshold=config.BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=config.BREAKER_RESET_SECONDS,
+            )
+            _policies[name] = policy
+        return policy
+
+def get_client(model_name: str = "gemini-2.5-flash", temperature: float = 0.7, max_tokens: int = None, provider: str = None):
+    """Return the shared, unwrapped chat model client for these settings."""
+    provider = provider or config.LLM_PROVIDER
+    key = (provider, model_name, temperature, max_tokens)
+    with _registry_lock:
+        client = _clients.get(key)
+    if client is None:
+        client = _build_client(provider, model_name, temperature, max_tokens)
+        with _registry_lock:
+            client = _clients.setdefault(key, client)
+    return client
+
+def get_llm(model_name: str = "gemini-2.5-flash", temperature: float = 0.7, tools: List["BaseTool"] = None,
+            max_tokens: int = None, provider: str = None):
+    """
+    Chat model for the given (default: configured) provider, with tools bound if
+    given, guarded by the model's deadline / retry / circuit breaker / concurrency policy.
+    """
+    llm = get_client(model_name, temperature, max_tokens, provider)
     if tools:
-        return llm.bind_tools(tools)
-    return llm
+        llm = llm.bind_tools(tools)
+    policy = get_policy(f"llm:{model_name}", config.LLM_TIMEOUT_SECONDS, config.LLM_MAX_RETRIES, config.LLM_MAX_CONCURRENCY)
+    return GuardedRunnable(llm, policy)
+
+def guard_search_tool(tool):
+    """Wrap a web search tool with the search deadline / retry / circuit breaker / concurrency policy."""
+    policy = get_policy(f"search:{tool.name}", config.SEARCH_TIMEOUT_SECONDS, config.SEARCH_MAX_RETRIES, config.SEARCH_MAX_CONCURRENCY)
+    return GuardedRunnable(tool, policy)
+
+def get_step_llm(step: str, tools: List["BaseTool"] = None):
+    """
+    Chat model configured for one graph step (config.MODEL_STEPS). Tools are
+    only bound if the step's settings enable them.
+    """
+    settings = config.MODEL_STEPS[step]
+    return get_llm(
+        model_name=settings["model"],
+        temperature=settings["temperature"],
+        tools=tools if settings["tools"] else None,
+        max_tokens=settings["max_tokens"],
+        provider=settings["provider"],
+    )
+
+def _usage_of(result):
+    # Structured output with include_raw=True returns {"raw": AIMessage, "parsed": ...}
+    message = result.get("raw") if isinstance(result, dict) else result
+    return getattr(message, "usage_metadata", None) or {}
 
+def invoke_step(step: str, model, messages, runnable_config=None):
+    """
+    Invoke a step's model, timing it as the llm.<step> stage and recording
+    its latency and token usage per step and model. runnable_config carries
+    the request deadline, if any, to the guarded model.
+    """
+    model_name = config.MODEL_STEPS[step]["model"]
+    start = time.perf_counter()
+    with stage(f"llm.{step}"):
+        result = model.invoke(messages, runnable_config)
+    elapsed = time.perf_counter() - start
+    LLM_STEP_SECONDS.labels(step, model_name).observe(elapsed)
+    usage = _usage_of(result)
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    LLM_STEP_TOKENS.labels(step, model_name, "input").inc(input_tokens)
+    LLM_STEP_TOKENS.labels(step, model_name, "output").inc(output_tokens)
+    turn_metrics.add_llm_call(step, model_name, input_tokens, output_tokens, elapsed)
+    request_usage = _request_usage.get()
+    if request_usage is not None:
+        request_usage["input"] += input_tokens
+        request_usage["output"] += output_tokens
+    logger.debug(
+        "LLM step usage",
+        extra={"step": step, "model": model_name, "seconds": round(elapsed, 3), "input_tokens": input_tokens, "output_tokens": output_tokens},
+    )
+    return result
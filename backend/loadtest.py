@@ -0,0 +1,185 @@
+"""
+Load generator for the chat API.
+
+Simulates many concurrent users. Each one registers (or reuses) an account,
+logs in through /auth/token, then asks questions through /chat and stores
+each turn through /save_chat_message, like the Streamlit client does. At the
+end it reports throughput, latency percentiles and error rates per endpoint.
+
+For a fully offline run on a laptop, start the backend (from backend/) with
+the local stand-ins and the bundled FAQ document as the knowledge base:
+
+    LLM_PROVIDER=fake SEARCH_PROVIDER=fake HF_HUB_OFFLINE=1 \\
+    DATABASE_URL=sqlite:///./loadtest.db uvicorn main:app
+
+(HF_HUB_OFFLINE needs the all-MiniLM-L6-v2 embedding model cached locally.)
+Then:
+
+    python loadtest.py --users 50 --turns 5 --json results.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+# Questions about the bundled knowledge base (rag/Document.pdf), with a few
+# rephrasings and off-document questions mixed in.
+DEFAULT_QUESTIONS = [
+    "What is the HP Victus laptop series?",
+    "What sizes are available in HP Victus laptops?",
+    "Is HP Victus good for gaming?",
+    "Can I upgrade RAM and storage in HP Victus?",
+    "Does HP Victus have good cooling?",
+    "What is the battery life of HP Victus laptops?",
+    "Does HP Victus support fast charging?",
+    "What type of display options are available?",
+    "Does HP Victus have RGB keyboard lighting?",
+    "Is HP Victus heavy to carry?",
+    "What ports are available on HP Victus?",
+    "Can HP Victus connect to external monitors?",
+    "Does HP Victus support Wi-Fi 6?",
+    "What operating system does HP Victus come with?",
+    "Is HP Victus good for video editing and content creation?",
+    "Does HP Victus overheat easily?",
+    "What's the difference between HP Victus and HP Omen?",
+    "Can I use HP Victus for coding and office work?",
+    "What colors are available for HP Victus?",
+    "Is HP Victus worth buying in 2025?",
+    "how long does the victus battery last when gaming",
+    "victus vs omen which one should i buy",
+    "What is the latest NVIDIA driver for laptops?",
+]
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, seconds: float, error: str = None):
+        self.latencies[endpoint].append(seconds)
+        if error:
+            self.errors[endpoint][error] += 1
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+async def timed_request(client: httpx.AsyncClient, recorder: Recorder, endpoint: str, method: str, url: str, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+    except httpx.HTTPError as e:
+        recorder.record(endpoint, time.perf_counter() - start, type(e).__name__)
+        return None
+    error = None if response.status_code < 400 else f"HTTP {response.status_code}"
+    recorder.record(endpoint, time.perf_counter() - start, error)
+    return response
+
+async def simulated_user(index: int, args, client: httpx.AsyncClient, recorder: Recorder, questions, rng: random.Random):
+    username = f"{args.user_prefix}{index}"
+    password = "loadtest-password"
+    # Registration fails with 400 if the user exists from a previous run; that's fine
+    await client.post("/auth/register", json={"username": username, "email": f"{username}@example.com", "password": password})
+
+    response = await timed_request(client, recorder, "/auth/token", "POST", "/auth/token", data={"username": username, "password": password})
+    if response is None or response.status_code != 200:
+        return
+    token = response.json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    user_id = str(token["user_id"])
+    chat_session_id = str(uuid.uuid4())
+
+    for _ in range(args.turns):
+        question = rng.choice(questions)
+        response = await timed_request(
+            client, recorder, "/chat", "POST", "/chat",
+            json={"user_id": user_id, "chat_session_id": chat_session_id, "content": question},
+            headers=headers, timeout=args.chat_timeout,
+        )
+        if response is not None and response.status_code == 200:
+            await timed_request(
+                client, recorder, "/save_chat_message", "POST", "/save_chat_message",
+                json={"chat_session_id": chat_session_id, "user_id": user_id, "user_query": question, "llm_resp": response.json()["response"]},
+                headers=headers,
+            )
+        if args.think_time:
+            await asyncio.sleep(rng.expovariate(1 / args.think_time))
+
+async def run(args, questions):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        tasks = []
+        for i in range(args.users):
+            rng = random.Random(args.seed + i)
+            tasks.append(asyncio.create_task(simulated_user(i, args, client, recorder, questions, rng)))
+            if args.ramp_up:
+                await asyncio.sleep(args.ramp_up / args.users)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    return recorder, elapsed
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    summary = {"elapsed_seconds": round(elapsed, 3), "endpoints": {}}
+    for endpoint, latencies in recorder.latencies.items():
+        values = sorted(latencies)
+        errors = sum(recorder.errors[endpoint].values())
+        summary["endpoints"][endpoint] = {
+            "requests": len(values),
+            "throughput_rps": round(len(values) / elapsed, 3) if elapsed else 0.0,
+            "error_rate": round(errors / len(values), 4) if values else 0.0,
+            "errors": dict(recorder.errors[endpoint]),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+        }
+    return summary
+
+def print_summary(summary: dict):
+    print(f"Elapsed: {summary['elapsed_seconds']:.1f}s")
+    print(f"{'endpoint':<22}{'reqs':>7}{'rps':>9}{'err%':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in summary["endpoints"].items():
+        print(
+            f"{endpoint:<22}{stats['requests']:>7}{stats['throughput_rps']:>9.2f}{stats['error_rate'] * 100:>8.2f}"
+            f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+        )
+        for error, count in stats["errors"].items():
+            print(f"    {error}: {count}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive /auth/token, /chat and /save_chat_message with concurrent simulated users.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent simulated users")
+    parser.add_argument("--turns", type=int, default=5, help="Chat turns per user")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds over which users are started")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds between a user's turns (exponential)")
+    parser.add_argument("--chat-timeout", type=float, default=180.0)
+    parser.add_argument("--questions", help="Text file with one question per line (default: built-in FAQ questions)")
+    parser.add_argument("--user-prefix", default="loadtest_user_")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the summary to this JSON file")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    recorder, elapsed = asyncio.run(run(args, questions))
+    summary = summarize(recorder, elapsed)
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+if __name__ == "__main__":
+    main()
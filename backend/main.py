@@ -1,22 +1,74 @@
 # Import necessary modules from FastAPI, Pydantic, and other custom files.
 from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, status
 from pydantic import BaseModel
-import re
-# Import the Chatbot class from chatbot.py for handling conversational logic.
-from chatbot import Chatbot
+from typing import List, Optional
+import asyncio
+import logging
+import time
+import uuid
+import orjson
+from contextlib import asynccontextmanager
+from datetime import datetime
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+# The Chatbot (conversational logic) is created lazily through app_state.get_chatbot().
+import app_state
 # Import the os module for interacting with the operating system, like path manipulation.
 import os
-# Import RAG (Retrieval-Augmented Generation) related functions for document processing.
-from rag.rag import process_document_for_rag, create_vector_store, get_retriever
+# Streamed, content-addressed uploads and their RAG ingestion.
+import uploads
 
 from database import get_db, chat_db_instance, ChatSession, ChatMessage
 from auth import get_current_active_user
-from routes import auth_routes
+from routes import auth_routes, collection_routes, history_routes, usage_routes
 from schema import ChatMessageCreate # Import new schemas
 from sqlalchemy.orm import Session
+import collection_lifecycle
+import config
+import rate_limit
+import response_cache
+import turn_metrics
+from singleflight import SingleFlight
+from llm import track_token_usage
+from resilience import DeadlineExceededError
+from metrics import MeasuredORJSONResponse, ResponseMetricsMiddleware, add_compression_middleware, metrics_app
+from observability import RequestContextMiddleware, instrument_engine, setup_logging
 
-# Initialize the FastAPI application.
-app = FastAPI()
+# Structured (JSON) logs carrying the request ID
+setup_logging()
+logger = logging.getLogger(__name__)
+# Time every SQL query as a db.* stage
+instrument_engine(chat_db_instance.engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: only cheap work runs before the app starts serving. Indexing the
+    # startup document (embedding model load + ingestion) runs per RAG_WARMUP.
+    started = time.perf_counter()
+    with app_state.timed("create_tables"):
+        await run_in_threadpool(chat_db_instance.create_tables)
+    app_state.readiness.database = True
+
+    warmup_task = None
+    if config.RAG_WARMUP == "blocking":
+        await run_in_threadpool(app_state.warm_up_rag)
+    elif config.RAG_WARMUP == "background":
+        warmup_task = asyncio.create_task(asyncio.to_thread(app_state.warm_up_rag))
+    else:
+        app_state.readiness.rag = "disabled"
+    app_state.startup_timings["startup_total"] = round(time.perf_counter() - started, 3)
+    logger.info("Startup complete", extra={"rag_warmup": config.RAG_WARMUP, "startup_timings": dict(app_state.startup_timings)})
+
+    yield
+
+    # Shutdown: the warm-up thread cannot be interrupted; just stop waiting for it.
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    # Write the per-turn records still queued
+    await run_in_threadpool(turn_metrics.flush)
+
+# Initialize the FastAPI application. orjson is used for all JSON responses.
+app = FastAPI(default_response_class=MeasuredORJSONResponse, lifespan=lifespan)
 
 # Import CORS middleware to handle Cross-Origin Resource Sharing.
 from fastapi.middleware.cors import CORSMiddleware
@@ -35,37 +87,56 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compress large responses (long answers, upload stats) above a size threshold.
+add_compression_middleware(
+    app,
+    method=config.RESPONSE_COMPRESSION,
+    minimum_size=config.COMPRESSION_MIN_SIZE,
+    gzip_level=config.GZIP_LEVEL,
+    brotli_quality=config.BROTLI_QUALITY,
+)
+# Refuse oversized uploads before Starlette parses and spools the multipart body.
+app.add_middleware(uploads.UploadSizeLimitMiddleware, paths=["/upload_document"])
+# Record payload sizes and serialization time. Added last so it wraps compression.
+app.add_middleware(ResponseMetricsMiddleware)
+# Request IDs, request latency / in-flight metrics and Server-Timing headers. Outermost.
+app.add_middleware(RequestContextMiddleware)
+# Expose Prometheus metrics
+app.mount("/metrics", metrics_app)
 # Include authentication routes
 app.include_router(auth_routes.router, prefix="/auth")
+# Include chat history routes
+app.include_router(history_routes.router, prefix="/history")
+# Include collection listing / deletion routes
+app.include_router(collection_routes.router, prefix="/collections")
+# Include per-turn token / latency usage routes
+app.include_router(usage_routes.router, prefix="/usage")
+
 
+# A chat turn that ran out of time before its answer was generated
+@app.exception_handler(DeadlineExceededError)
+async def deadline_exceeded_handler(request, exc: DeadlineExceededError):
+    logger.warning("Request deadline exceeded", extra={"path": request.url.path, "error": str(exc)})
+    return ORJSONResponse({"detail": "The answer took too long to generate; please try again."},
+                          status_code=status.HTTP_504_GATEWAY_TIMEOUT)
 
-# Instantiate the Chatbot class, which handles the conversational logic and agent interactions.
-chatbot = Chatbot()
-
-# Process the predefined document on startup
-document_path = "C:\\ValueHealth\\Training\\LangGraph\\Simple_langgraph\\langchain-academy\\chatbot\\backend\\rag\\Document.pdf"    
-collection_name = "hp_victus_faq"
-
-@app.on_event("startup")
-async def startup_event():
-    chat_db_instance.create_tables()
-# Check if the document exists before processing
-if os.path.exists(document_path):
-    # Only process if the collection does not exist to avoid re-embedding on every startup
-    # In a real-world scenario, you might have more robust versioning/checking
-    try:
-        # Attempt to create vector store, if it already exists, this will return the existing one
-        from rag.rag import load_documents, split_documents, create_vector_store, get_retriever
-        documents = load_documents(document_path)
-        splits = split_documents(documents)
-        vectorstore = create_vector_store(splits, collection_name=collection_name)
-        retriever = get_retriever(vectorstore, k=10)
-        chatbot.set_retriever(retriever)
-        print(f"Document '{document_path}' processed and retriever set for chatbot.")
-    except Exception as e:
-        print(f"Error processing document {document_path} on startup: {e}")
-else:
-    print(f"Document '{document_path}' not found. RAG functionality might be limited.")
+# Liveness: the process is up and serving requests.
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+# Readiness: 503 until the database is set up and RAG warm-up has finished.
+@app.get("/ready")
+async def ready():
+    readiness = app_state.readiness
+    body = {
+        "status": "ready" if readiness.is_ready else "starting",
+        "database": readiness.database,
+        "rag": readiness.rag,
+        "rag_error": readiness.rag_error,
+        "startup_timings": app_state.startup_timings,
+    }
+    return ORJSONResponse(body, status_code=status.HTTP_200_OK if readiness.is_ready else status.HTTP_503_SERVICE_UNAVAILABLE)
 
 # Define the Pydantic model for incoming chat messages.
 class Message(BaseModel):
@@ -73,9 +144,28 @@ class Message(BaseModel):
     chat_session_id: str # Renamed from thread_id
     content: str
 
+# Identical chat turns in flight at the same time share one graph run
+chat_flights = SingleFlight("chat")
+
+def chat_flight_key(content: str, chat_session_id: str, user_id: str, active):
+    """
+    Single-flight key for a chat turn, and its scope. Repeats within a thread
+    (double-clicks, reruns) always coalesce; across users only when the
+    answer cannot depend on who asks (no stored profile, no earlier turns).
+    """
+    query = response_cache.normalize_query(content)
+    if config.SINGLEFLIGHT_SHARED and active and app_state.get_chatbot().is_context_free(chat_session_id, user_id):
+        return "shared:" + response_cache.cache_key(active["name"], active["version"], content), "shared"
+    return f"thread:{chat_session_id}:{query}", "thread"
+
 # Define a POST endpoint for chat interactions.
-@app.post("/chat")
+@app.post("/chat", dependencies=[Depends(rate_limit.limit_chat)])
 async def chat(message: Message, current_user = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    # Tokens, searches and latency of the turn are persisted to turn_metrics when it ends
+    with turn_metrics.record_turn(current_user.id, message.chat_session_id) as turn:
+        return await answer_chat(message, current_user, db, turn)
+
+async def answer_chat(message: Message, current_user, db: Session, turn: dict):
     # Check if the query has been asked before and a non-null LLM response exists
     cached_message = db.query(ChatMessage).filter(
         ChatMessage.chat_session_id == message.chat_session_id,
@@ -84,13 +174,163 @@ async def chat(message: Message, current_user = Depends(get_current_active_user)
     ).first()
 
     if cached_message:
-        print(f"Fetching response from cache for query: {message.content}")
+        turn["cache"] = "session"
+        logger.info("Returning cached session response", extra={"chat_session_id": message.chat_session_id})
         return {"response": cached_message.llm_resp, "user_id": str(current_user.id), "chat_session_id": message.chat_session_id}
 
+    # Pick up a collection activated by another worker since the last turn
+    active = app_state.sync_active_collection()
+    if active:
+        collection_lifecycle.touch(active["name"], current_user.id, message.chat_session_id)
+        turn["collection"], turn["collection_version"] = active["name"], active["version"]
+
+    # Cross-session answer cache shared by all workers (opt-in)
+    if config.RESPONSE_CACHE_ENABLED and active:
+        cached_response = response_cache.get_cached_response(active["name"], active["version"], message.content)
+        if cached_response is not None:
+            turn["cache"] = "response"
+            return {"response": cached_response, "user_id": str(current_user.id), "chat_session_id": message.chat_session_id}
+
     # If not cached or llm_resp is null, invoke the chatbot
-    response = chatbot.invoke(message.content, message.chat_session_id, str(current_user.id))
+    chatbot = app_state.get_chatbot()
+    user_id = str(current_user.id)
+
+    async def run_graph():
+        # The graph makes blocking upstream calls; run it off the event loop
+        usage = track_token_usage()
+        try:
+            result = await run_in_threadpool(chatbot.invoke, message.content, message.chat_session_id, user_id)
+        finally:
+            # Charged even if the turn failed part-way: the tokens were spent
+            rate_limit.charge_llm_tokens(user_id, usage["input"] + usage["output"])
+        return result, message.chat_session_id
+
+    if config.SINGLEFLIGHT_ENABLED:
+        key, scope = await run_in_threadpool(chat_flight_key, message.content, message.chat_session_id, user_id, active)
+        (response, leader_thread), shared = await chat_flights.do(key, run_graph, scope)
+        if shared:
+            turn["cache"] = "coalesced"
+            logger.info("Coalesced chat request", extra={"scope": scope, "chat_session_id": message.chat_session_id})
+            if leader_thread != message.chat_session_id:
+                # The leader ran in another user's thread; record the turn in this one too
+                await run_in_threadpool(chatbot.record_turn, message.content, response, message.chat_session_id, user_id)
+    else:
+        response, _ = await run_graph()
+    if config.RESPONSE_CACHE_ENABLED and active:
+        response_cache.store_response(active["name"], active["version"], message.content, response)
     return {"response": response, "user_id": str(current_user.id), "chat_session_id": message.chat_session_id}
 
+# Define the Pydantic model for batch question answering.
+class BatchQuestions(BaseModel):
+    user_id: str
+    questions: List[str]
+    # Label for logs and the summary line; generated when omitted
+    batch_id: Optional[str] = None
+
+# Answer many questions in one request, streaming each result as it completes.
+@app.post("/chat/batch", dependencies=[Depends(rate_limit.limit_chat)])
+async def chat_batch(batch: BatchQuestions, current_user = Depends(get_current_active_user)):
+    """
+    Results stream back as NDJSON lines in completion order, each
+    {"index", "question", "response"} or {"index", "question", "error"},
+    followed by one {"done": true, ...} summary line. Questions are
+    independent: none sees another's turn.
+    """
+    questions = [q.strip() for q in batch.questions]
+    if not questions or len(questions) > config.CHAT_BATCH_MAX_QUESTIONS or not all(questions):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Send between 1 and {config.CHAT_BATCH_MAX_QUESTIONS} non-empty questions",
+        )
+    user_id = str(current_user.id)
+    batch_id = batch.batch_id or uuid.uuid4().hex
+    # Questions are answered with persist=False: no memory update and no saved
+    # thread, so the thread id only labels the turn
+    thread_prefix = f"batch:{user_id}:{batch_id}"
+    active = app_state.sync_active_collection()
+    if active:
+        collection_lifecycle.touch(active["name"], user_id)
+    chatbot = app_state.get_chatbot()
+
+    cached = {}
+    if config.RESPONSE_CACHE_ENABLED and active:
+        for index, question in enumerate(questions):
+            cached_response = response_cache.get_cached_response(active["name"], active["version"], question)
+            if cached_response is not None:
+                cached[index] = cached_response
+    todo = [index for index in range(len(questions)) if index not in cached]
+
+    # Embed every remaining question in one batch and search them together
+    retrieved = {}
+    retrieval_ms = None
+    retriever = chatbot.retriever
+    if todo and retriever is not None:
+        from rag.rag import batch_retrieve
+        started = time.perf_counter()
+        docs = await run_in_threadpool(
+            batch_retrieve, retriever.vectorstore, [questions[i] for i in todo], retriever.search_kwargs.get("k", 4)
+        )
+        # Each question is charged an equal share of the batched search
+        retrieval_ms = round((time.perf_counter() - started) * 1000 / len(todo), 1)
+        retrieved = dict(zip(todo, docs))
+
+    semaphore = asyncio.Semaphore(max(1, config.CHAT_BATCH_CONCURRENCY))
+
+    async def answer(index: int) -> dict:
+        line = {"index": index, "question": questions[index]}
+        async with semaphore:
+            if not rate_limit.has_llm_tokens(user_id):
+                line["error"] = "Daily LLM token quota exhausted"
+                return line
+            usage = track_token_usage()
+            thread_id = f"{thread_prefix}:{index}"
+            with turn_metrics.record_turn(user_id, thread_id, endpoint="chat_batch", collection=active) as turn:
+                turn["retrieval_ms"] = retrieval_ms if index in retrieved else None
+                try:
+                    line["response"] = await run_in_threadpool(
+                        chatbot.invoke, questions[index], thread_id, user_id, retrieved.get(index), persist=False
+                    )
+                except Exception as e:
+                    turn["status"] = "error"
+                    logger.warning("Batch question failed", extra={"batch_id": batch_id, "index": index, "error": str(e)})
+                    line["error"] = f"{type(e).__name__}: {e}"
+                finally:
+                    rate_limit.charge_llm_tokens(user_id, usage["input"] + usage["output"])
+        if "response" in line and config.RESPONSE_CACHE_ENABLED and active:
+            response_cache.store_response(active["name"], active["version"], questions[index], line["response"])
+        return line
+
+    async def stream():
+        started = time.perf_counter()
+        failed = 0
+        for index, response in cached.items():
+            with turn_metrics.record_turn(user_id, f"{thread_prefix}:{index}", endpoint="chat_batch", collection=active) as turn:
+                turn["cache"] = "response"
+            yield orjson.dumps({"index": index, "question": questions[index], "response": response, "cached": True}) + b"\n"
+        # Each task gets its own context, so token usage is tracked per question
+        tasks = [asyncio.create_task(answer(index)) for index in todo]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                failed += "error" in line
+                yield orjson.dumps(line) + b"\n"
+        finally:
+            # Client went away: don't start the questions still waiting for a slot
+            for task in tasks:
+                task.cancel()
+        summary = {
+            "done": True,
+            "batch_id": batch_id,
+            "questions": len(questions),
+            "cached": len(cached),
+            "failed": failed,
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+        }
+        logger.info("Batch finished", extra=summary)
+        yield orjson.dumps(summary) + b"\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @app.post("/save_chat_message", status_code=status.HTTP_201_CREATED)
 async def save_chat_message(chat_message: ChatMessageCreate, db: Session = Depends(get_db), current_user = Depends(get_current_active_user)):
     # Ensure the user_id in the chat_message matches the authenticated user's ID
@@ -113,7 +353,7 @@ async def save_chat_message(chat_message: ChatMessageCreate, db: Session = Depen
         db.commit()
         db.refresh(new_session)
         chat_session = new_session
-        print(f"Created new chat session: {chat_session.id} for user: {chat_session.user_id}")
+        logger.info("Created new chat session", extra={"chat_session_id": str(chat_session.id), "user_id": str(chat_session.user_id)})
 
     # Create a single ChatMessage entry for both user query and LLM response
     new_message = ChatMessage(
@@ -121,42 +361,36 @@ async def save_chat_message(chat_message: ChatMessageCreate, db: Session = Depen
         user_query=chat_message.user_query,
         llm_resp=chat_message.llm_resp
     )
-    print(f"Saving message - User Query: {chat_message.user_query}, /nLLM Response: {chat_message.llm_resp} /nfor session: {chat_message.chat_session_id}")
+    # Bump the session so it sorts first in the history session list
+    chat_session.last_updated = datetime.now()
 
     db.add(new_message)
     db.commit()
     db.refresh(new_message)
-    print(f"Successfully saved message with ID: {new_message.id}")
+    logger.info("Saved chat message", extra={"message_id": str(new_message.id), "chat_session_id": str(chat_message.chat_session_id)})
     return {"message": "Chat message saved successfully"}
 
 # Define a POST endpoint for uploading documents for RAG processing.
-@app.post("/upload_document")
+@app.post("/upload_document", dependencies=[Depends(rate_limit.limit_upload)])
 async def upload_document(file: UploadFile = File(...), current_user = Depends(get_current_active_user)):
-    upload_dir = "./backend/rag/uploaded_documents"
-    os.makedirs(upload_dir, exist_ok=True)
-
-    file_path = os.path.join(upload_dir, file.filename)
-    with open(file_path, "wb") as buffer:
-        buffer.write(await file.read())
-    
-    # Use filename (without extension) as collection name and sanitize it
-    base_name = file.filename.split('.')[0]
-    collection_name = re.sub(r'[^a-zA-Z0-9._-]', '_', base_name)
-    # Ensure the name starts and ends with an alphanumeric character
-    collection_name = re.sub(r'^[^a-zA-Z0-9]+', '', collection_name)
-    collection_name = re.sub(r'[^a-zA-Z0-9]+$', '', collection_name)
-    # Ensure it's not empty after sanitization
-    if not collection_name:
-        collection_name = "uploaded_document"
-    process_document_for_rag(file_path, collection_name=collection_name)
-    
-    # Import RAG utility functions here to avoid circular dependencies
-    from rag.rag import load_documents, split_documents
-    documents = load_documents(file_path)
-    splits = split_documents(documents)
-    vectorstore = create_vector_store(splits, collection_name=collection_name)
-    retriever = get_retriever(vectorstore, k=10)
-    chatbot.set_retriever(retriever)
+    # Streamed to disk in chunks and hashed on the way; the filename is never used as a path
+    upload = await uploads.store_upload(file)
+
+    # The same content was ingested before: switch to that collection without re-embedding
+    existing = await run_in_threadpool(uploads.find_ingested, upload)
+    if existing is not None:
+        collection_name, vectorstore = existing
+        app_state.activate_collection(collection_name, upload.version, vectorstore)
+        collection_lifecycle.record_upload(collection_name, current_user.id)
+        logger.info("Duplicate upload; reusing collection", extra={"collection": collection_name, "digest": upload.digest})
+        return {"message": f"File '{file.filename}' was already processed; using collection '{collection_name}'."}
+
+    collection_name = uploads.collection_name_for(file.filename)
+    # Parsing and embedding are blocking; keep them off the event loop
+    vectorstore = await run_in_threadpool(uploads.ingest_upload, upload, collection_name)
+    # Register the new collection so every worker switches to it
+    app_state.activate_collection(collection_name, upload.version, vectorstore)
+    collection_lifecycle.record_upload(collection_name, current_user.id)
 
     return {"message": f"File '{file.filename}' uploaded successfully and processed for RAG."}
 
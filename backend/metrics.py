@@ -0,0 +1,219 @@
+# Prometheus metrics and the HTTP middleware that records them.
+import logging
+import os
+import time
+from contextvars import ContextVar
+
+from fastapi.responses import ORJSONResponse
+from prometheus_client import Counter, Gauge, Histogram, make_asgi_app
+
+logger = logging.getLogger(__name__)
+
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+SERIALIZATION_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+RESPONSE_BODY_BYTES = Histogram(
+    "http_response_body_bytes",
+    "Serialized JSON response size before compression.",
+    ["route"],
+    buckets=SIZE_BUCKETS,
+)
+RESPONSE_WIRE_BYTES = Histogram(
+    "http_response_wire_bytes",
+    "Response body bytes actually sent, after compression.",
+    ["route", "encoding"],
+    buckets=SIZE_BUCKETS,
+)
+RESPONSE_SERIALIZATION_SECONDS = Histogram(
+    "http_response_serialization_seconds",
+    "Time spent serializing JSON response bodies.",
+    ["route"],
+    buckets=SERIALIZATION_BUCKETS,
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "End-to-end HTTP request latency.",
+    ["route", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled.",
+    multiprocess_mode="livesum",
+)
+# Chat pipeline stages: graph nodes (node.*), retrieval, query expansion, each
+# web search call, each LLM call, and database queries (db.*).
+STAGE_SECONDS = Histogram(
+    "chat_stage_duration_seconds",
+    "Latency of one chat pipeline stage.",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_ERRORS = Counter(
+    "chat_stage_errors_total",
+    "Chat pipeline stage executions that raised.",
+    ["stage"],
+)
+STAGE_IN_FLIGHT = Gauge(
+    "chat_stage_in_flight",
+    "Chat pipeline stage executions currently running.",
+    ["stage"],
+    multiprocess_mode="livesum",
+)
+
+# Upstream (LLM / web search) client health, see resilience.py
+UPSTREAM_CALLS = Counter(
+    "upstream_calls_total",
+    "Upstream call attempts by outcome (ok, error, rejected, circuit_open, deadline).",
+    ["upstream", "outcome"],
+)
+UPSTREAM_RETRIES = Counter(
+    "upstream_retries_total",
+    "Upstream calls retried after a retryable error.",
+    ["upstream"],
+)
+UPSTREAM_CIRCUIT_OPEN = Gauge(
+    "upstream_circuit_open",
+    "1 while the upstream's circuit breaker is open.",
+    ["upstream"],
+    multiprocess_mode="max",
+)
+UPSTREAM_HEDGES = Counter(
+    "upstream_hedged_calls_total",
+    "Duplicate calls sent because the first ran past the upstream's recent p95, by outcome (sent, won).",
+    ["upstream", "outcome"],
+)
+SEARCHES_DROPPED = Counter(
+    "chat_searches_dropped_total",
+    "Web searches left out of an answer because they had not finished before the turn's deadline.",
+)
+
+# Per graph step LLM usage, see llm.invoke_step
+LLM_STEP_SECONDS = Histogram(
+    "llm_step_duration_seconds",
+    "Latency of one LLM call by graph step and model.",
+    ["step", "model"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_STEP_TOKENS = Counter(
+    "llm_step_tokens_total",
+    "Tokens consumed by graph step, model and direction (input, output).",
+    ["step", "model", "direction"],
+)
+
+FAQ_LOOKUPS = Counter(
+    "faq_lookups_total",
+    "Chat turns checked against the FAQ question index, by outcome (hit, miss).",
+    ["outcome"],
+)
+
+RATE_LIMITED = Counter(
+    "rate_limited_requests_total",
+    "Requests rejected with 429, by exhausted budget (requests, llm_tokens, uploads).",
+    ["budget"],
+)
+
+CHAT_COALESCED = Counter(
+    "chat_coalesced_requests_total",
+    "Chat requests that awaited an identical in-flight run instead of starting one, by scope (thread, shared).",
+    ["scope"],
+)
+
+TURN_METRICS_DROPPED = Counter(
+    "turn_metrics_dropped_total",
+    "Per-turn accounting records not persisted (writer queue full or database error).",
+)
+
+# Per-request scratch space. The middleware installs a fresh dict before calling
+# the app and the response class fills it in; mutating the dict (rather than
+# setting the var) keeps it visible across threadpool context copies.
+_response_stats: ContextVar[dict] = ContextVar("response_stats", default=None)
+
+class MeasuredORJSONResponse(ORJSONResponse):
+    """ORJSONResponse that records how long serialization took and how big the body is."""
+
+    def render(self, content) -> bytes:
+        start = time.perf_counter()
+        body = super().render(content)
+        stats = _response_stats.get()
+        if stats is not None:
+            stats["serialization_seconds"] = stats.get("serialization_seconds", 0.0) + time.perf_counter() - start
+            stats["body_bytes"] = stats.get("body_bytes", 0) + len(body)
+        return body
+
+def _route_label(scope) -> str:
+    # Use the route template (/history/sessions/{chat_session_id}/messages) to keep label cardinality bounded
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class ResponseMetricsMiddleware:
+    """
+    Pure ASGI middleware recording payload sizes per route.
+
+    Add it after the compression middleware so it wraps it and sees the bytes
+    that actually go over the wire.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = {}
+        token = _response_stats.set(stats)
+        wire = {"bytes": 0, "encoding": "identity"}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-encoding":
+                        wire["encoding"] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                wire["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _response_stats.reset(token)
+            route = _route_label(scope)
+            # /metrics is a mount, not a route, so it is recognised by path; scrapes are not counted
+            if not scope["path"].startswith("/metrics"):
+                RESPONSE_WIRE_BYTES.labels(route, wire["encoding"]).observe(wire["bytes"])
+                if "body_bytes" in stats:
+                    RESPONSE_BODY_BYTES.labels(route).observe(stats["body_bytes"])
+                    RESPONSE_SERIALIZATION_SECONDS.labels(route).observe(stats["serialization_seconds"])
+
+def add_compression_middleware(app, method: str, minimum_size: int, gzip_level: int, brotli_quality: int):
+    """Install the configured response compression middleware (gzip, br or off)."""
+    if method == "off":
+        return
+    if method == "br":
+        try:
+            from brotli_asgi import BrotliMiddleware
+        except ImportError:
+            logger.warning("RESPONSE_COMPRESSION=br but brotli-asgi is not installed; falling back to gzip.")
+        else:
+            # gzip_fallback serves gzip to clients that do not accept br
+            app.add_middleware(BrotliMiddleware, quality=brotli_quality, minimum_size=minimum_size, gzip_fallback=True)
+            return
+    from fastapi.middleware.gzip import GZipMiddleware
+    app.add_middleware(GZipMiddleware, minimum_size=minimum_size, compresslevel=gzip_level)
+
+def _build_metrics_app():
+    # Under gunicorn each worker has its own registry; when PROMETHEUS_MULTIPROC_DIR
+    # is set (gunicorn.conf.py does this) /metrics aggregates all workers' files.
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import CollectorRegistry, multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return make_asgi_app(registry=registry)
+    return make_asgi_app()
+
+metrics_app = _build_metrics_app()
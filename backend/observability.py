@@ -0,0 +1,164 @@
+# Request IDs, structured logging and per-stage latency tracing.
+#
+# Wrap any step of the chat pipeline in stage("name") (as a context manager or
+# a decorator). Each stage is exported as a Prometheus histogram / error
+# counter / in-flight gauge, and the stages of the current request are
+# returned to the client in a Server-Timing header.
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import config
+from metrics import (
+    HTTP_REQUEST_SECONDS,
+    HTTP_REQUESTS_IN_FLIGHT,
+    STAGE_ERRORS,
+    STAGE_IN_FLIGHT,
+    STAGE_SECONDS,
+)
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+# Stage timings of the current request: {stage: [total_seconds, count]}. Like
+# the response stats in metrics.py, the dict is mutated in place so stages run
+# in threadpool / LangGraph executor context copies still land in it.
+_request_trace: ContextVar[dict] = ContextVar("request_trace", default=None)
+
+# Standard LogRecord attributes; anything else passed via extra= is emitted as a field
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, request_id and any extra fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def setup_logging():
+    """Configure root logging once: JSON lines by default, LOG_FORMAT=text for local debugging."""
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    if config.LOG_FORMAT == "text":
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    else:
+        handler.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(config.LOG_LEVEL)
+
+@contextmanager
+def stage(name: str):
+    """Time one pipeline stage. Also usable as a decorator: @stage("node.chatbot")."""
+    trace = _request_trace.get()
+    in_flight = STAGE_IN_FLIGHT.labels(name)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        in_flight.dec()
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        if trace is not None:
+            totals = trace.setdefault(name, [0.0, 0])
+            totals[0] += elapsed
+            totals[1] += 1
+
+def server_timing_header(trace: dict) -> str:
+    # Stage names may contain dots, which are not valid in a Server-Timing token
+    parts = []
+    for name, (seconds, count) in trace.items():
+        part = f"{name.replace('.', '-')};dur={seconds * 1000:.1f}"
+        if count > 1:
+            part += f';desc="x{count}"'
+        parts.append(part)
+    return ", ".join(parts)
+
+def instrument_engine(engine):
+    """Time every SQL statement on an engine as a db.<verb> stage."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        name = f"db.{statement.lstrip().split(' ', 1)[0].lower()}"
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        trace = _request_trace.get()
+        if trace is not None:
+            totals = trace.setdefault(name, [0.0, 0])
+            totals[0] += elapsed
+            totals[1] += 1
+
+class RequestContextMiddleware:
+    """
+    Pure ASGI middleware that assigns a request ID (honouring an incoming
+    X-Request-ID), tracks in-flight requests and latency, and adds
+    X-Request-ID and Server-Timing headers to the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        trace = {}
+        id_token = request_id_var.set(request_id)
+        trace_token = _request_trace.set(trace)
+        status_code = {"value": 500}
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code["value"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                total = f"total;dur={(time.perf_counter() - start) * 1000:.1f}"
+                timing = server_timing_header(trace)
+                headers.append((b"server-timing", f"{timing}, {total}".lstrip(", ").encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            # /metrics is a mount, not a route, so it is recognised by path; scrapes are not counted
+            if not scope["path"].startswith("/metrics"):
+                HTTP_REQUEST_SECONDS.labels(route, scope["method"], str(status_code["value"])).observe(time.perf_counter() - start)
+            request_id_var.reset(id_token)
+            _request_trace.reset(trace_token)
@@ -0,0 +1,129 @@
+"""
+Pre-warm the response cache for the active collection.
+
+Runs a list of questions through the Chatbot pipeline with bounded
+concurrency and stores each answer in the response cache under the active
+collection's version, so the first users to ask them get cached answers.
+Questions come from a text file (one per line) or are extracted from an
+FAQ-style document. Questions already cached for the current version are
+skipped, so an interrupted run resumes where it stopped; --force recomputes
+them. Answers are produced without the memory-update step and without
+saving a conversation thread, so a run leaves nothing in the chat state
+apart from the cache entries.
+
+The server only sees the cache if it shares the state backend and has the
+cache enabled, so run it (from backend/) with the server's settings, e.g.
+
+    STATE_BACKEND=sqlite RESPONSE_CACHE_ENABLED=true python prewarm.py --from-faq --concurrency 4
+"""
+import argparse
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import app_state
+import config
+import response_cache
+from loadtest import percentile
+from observability import setup_logging
+
+def load_questions(args) -> list:
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        from rag.faq import extract_faq_pairs
+        from rag.rag import load_documents
+        questions = [pair["question"] for pair in extract_faq_pairs(load_documents(args.document))]
+    # Questions that normalize to the same cache key only need one run
+    unique = {}
+    for question in questions:
+        unique.setdefault(response_cache.normalize_query(question), question)
+    return list(unique.values())
+
+def answer(chatbot, question: str):
+    # A fresh thread and user per question, so answers carry no conversation or profile context;
+    # persist=False skips write_memory and the checkpoint, so neither is left behind
+    run_id = uuid.uuid4().hex
+    start = time.perf_counter()
+    response = chatbot.invoke(question, thread_id=f"prewarm-{run_id}", user_id=f"prewarm-{run_id}", persist=False)
+    return response, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-compute answers for common questions into the response cache.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--questions", help="Text file with one question per line")
+    source.add_argument("--from-faq", action="store_true", help="Use the questions of an FAQ-style document")
+    parser.add_argument("--document", default=config.RAG_DOCUMENT_PATH, help="Document for --from-faq")
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions answered at the same time")
+    parser.add_argument("--force", action="store_true", help="Recompute questions that are already cached")
+    parser.add_argument("--ttl", type=float, help="Cache TTL in seconds (default RESPONSE_CACHE_TTL)")
+    parser.add_argument("--json", help="Also write the run summary to this JSON file")
+    args = parser.parse_args()
+
+    setup_logging()
+    if config.STATE_BACKEND == "memory":
+        print("Warning: STATE_BACKEND=memory; answers are cached in this process only and the server will not see them.")
+    if not config.RESPONSE_CACHE_ENABLED:
+        print("Warning: RESPONSE_CACHE_ENABLED is off; the server will not read the pre-warmed answers until it is enabled.")
+
+    # Make sure the collection is indexed and the retriever attached, as at server startup
+    app_state.warm_up_rag()
+    active = app_state.get_active_collection()
+    if active is None:
+        parser.error(f"No active collection ({app_state.readiness.rag_error or 'RAG warm-up failed'})")
+    chatbot = app_state.get_chatbot()
+
+    questions = load_questions(args)
+    todo = [
+        q for q in questions
+        if args.force or response_cache.get_cached_response(active["name"], active["version"], q) is None
+    ]
+    print(f"Collection {active['name']}@{active['version']}: {len(questions)} questions, "
+          f"{len(questions) - len(todo)} already cached, {len(todo)} to run")
+
+    latencies, failures = [], {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        futures = {pool.submit(answer, chatbot, q): q for q in todo}
+        for done, future in enumerate(as_completed(futures), 1):
+            question = futures[future]
+            try:
+                response, seconds = future.result()
+            except Exception as e:
+                failures[question] = f"{type(e).__name__}: {e}"
+                print(f"[{done}/{len(todo)}] FAILED {question!r}: {failures[question]}")
+                continue
+            response_cache.store_response(active["name"], active["version"], question, response, ttl=args.ttl)
+            latencies.append(seconds)
+            print(f"[{done}/{len(todo)}] {seconds:6.2f}s {question}")
+    elapsed = time.perf_counter() - start
+
+    values = sorted(latencies)
+    summary = {
+        "collection": active["name"],
+        "version": active["version"],
+        "questions": len(questions),
+        "skipped": len(questions) - len(todo),
+        "answered": len(latencies),
+        "failed": len(failures),
+        "failures": failures,
+        "elapsed_seconds": round(elapsed, 3),
+        "questions_per_second": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "p50_seconds": round(percentile(values, 50), 3),
+        "p95_seconds": round(percentile(values, 95), 3),
+    }
+    print(
+        f"Answered {summary['answered']}, failed {summary['failed']}, skipped {summary['skipped']} "
+        f"in {summary['elapsed_seconds']:.1f}s ({summary['questions_per_second']:.2f} q/s, "
+        f"p50 {summary['p50_seconds']:.2f}s, p95 {summary['p95_seconds']:.2f}s)"
+    )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    if failures:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Embedding backend benchmark and parity check: PyTorch (huggingface) vs the
+int8 ONNX export (onnx).
+
+Each backend runs in its own child process, so its memory is measured in
+isolation. It embeds the document's chunks in batches (ingestion) and the
+labeled questions one at a time (queries). Reported per backend:
+
+- model load time, and process RSS after loading and at peak
+- ingestion throughput (chunks/s) and single-query latency p50/p95
+
+Parity compares the ONNX vectors with the PyTorch ones:
+
+- cosine similarity per text (mean and minimum)
+- top-k retrieval overlap per question, top-1 agreement, and recall@k on the
+  labeled set for both backends
+
+The run exits with status 1 if the minimum cosine, the mean overlap or the
+recall difference is outside its tolerance, so it can gate a switch to
+EMBEDDING_BACKEND=onnx. Run from the backend directory, after exporting the
+model (python -m rag.onnx_embeddings export), e.g.
+
+    python -m rag.bench_embeddings --k 10 --threads 4
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from rag.bench_retrieval import DEFAULT_DOCUMENT, DEFAULT_QUESTIONS, git_commit, is_relevant, percentile
+
+BACKENDS = ("huggingface", "onnx")
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def run_worker(args):
+    """Child process: load one backend, embed everything, save vectors and print stats as JSON."""
+    if args.threads:
+        os.environ["EMBEDDING_THREADS"] = str(args.threads)
+        # PyTorch reads this at import; keep the comparison at equal thread counts
+        os.environ.setdefault("OMP_NUM_THREADS", str(args.threads))
+    from rag.rag import get_embeddings, load_documents, split_documents
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = [q["question"] for q in json.load(f)["questions"]]
+    texts = [doc.page_content for doc in split_documents(load_documents(args.document))]
+
+    baseline_rss = rss_bytes()
+    start = time.perf_counter()
+    embeddings = get_embeddings(args.worker)
+    embeddings.embed_query("warm up")
+    load_seconds = time.perf_counter() - start
+    loaded_rss = rss_bytes()
+
+    start = time.perf_counter()
+    for _ in range(args.repeats):
+        doc_vectors = embeddings.embed_documents(texts)
+    ingest_seconds = (time.perf_counter() - start) / args.repeats
+
+    latencies = []
+    for _ in range(args.repeats):
+        query_vectors = []
+        for question in questions:
+            start = time.perf_counter()
+            query_vectors.append(embeddings.embed_query(question))
+            latencies.append(time.perf_counter() - start)
+
+    np.savez(args.vectors_out, docs=np.asarray(doc_vectors, dtype=np.float32), queries=np.asarray(query_vectors, dtype=np.float32))
+    print(json.dumps({
+        "backend": args.worker,
+        "load_seconds": round(load_seconds, 3),
+        "rss_after_load_bytes": loaded_rss,
+        "model_rss_bytes": loaded_rss - baseline_rss,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "chunks": len(texts),
+        "ingest_chunks_per_second": round(len(texts) / ingest_seconds, 2),
+        "query_latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+        },
+        "queries_per_second": round(len(latencies) / sum(latencies), 2),
+    }))
+
+def run_backend(backend: str, args, work_dir: str):
+    vectors_path = os.path.join(work_dir, f"{backend}.npz")
+    command = [
+        sys.executable, "-m", "rag.bench_embeddings", "--worker", backend, "--vectors-out", vectors_path,
+        "--document", args.document, "--questions", args.questions, "--repeats", str(args.repeats),
+        "--threads", str(args.threads),
+    ]
+    output = subprocess.check_output(command, text=True)
+    stats = json.loads(output.strip().splitlines()[-1])
+    with np.load(vectors_path) as data:
+        return stats, data["docs"], data["queries"]
+
+def top_k(doc_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    scores = query_vectors @ doc_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def row_cosines(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+def parity(reference, candidate, texts, questions, k):
+    ref_docs, ref_queries = reference
+    docs, queries = candidate
+    cosines = np.concatenate([row_cosines(ref_docs, docs), row_cosines(ref_queries, queries)])
+    ref_rank = top_k(ref_docs, ref_queries, k)
+    rank = top_k(docs, queries, k)
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(ref_rank, rank)]
+
+    def recall(ranking):
+        hits = sum(
+            1 for row, question in zip(ranking, questions)
+            if any(is_relevant(texts[i], question["answer_snippets"]) for i in row)
+        )
+        return hits / len(questions)
+
+    return {
+        "cosine_mean": round(float(cosines.mean()), 5),
+        "cosine_min": round(float(cosines.min()), 5),
+        "overlap_at_k_mean": round(float(np.mean(overlap)), 4),
+        "top1_agreement": round(float(np.mean(ref_rank[:, 0] == rank[:, 0])), 4),
+        "recall_at_k_reference": round(recall(ref_rank), 4),
+        "recall_at_k_candidate": round(recall(rank), 4),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the PyTorch and ONNX embedding backends.")
+    parser.add_argument("--document", default=DEFAULT_DOCUMENT)
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS, help="Labeled question set (JSON)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=3, help="Passes over the chunks and questions")
+    parser.add_argument("--threads", type=int, default=0, help="Threads per backend (0 = library default)")
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Lowest acceptable per-text cosine")
+    parser.add_argument("--min-overlap", type=float, default=0.9, help="Lowest acceptable mean top-k overlap")
+    parser.add_argument("--max-recall-drop", type=float, default=0.02, help="Largest acceptable recall@k loss")
+    parser.add_argument("--output", help="JSON results path (default: embedding_benchmark_<commit>.json)")
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--vectors-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    from rag.rag import load_documents, split_documents
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = json.load(f)["questions"]
+    texts = [doc.page_content for doc in split_documents(load_documents(args.document))]
+    k = min(args.k, len(texts))
+
+    results, vectors = [], {}
+    with tempfile.TemporaryDirectory(prefix="bench_embeddings_") as work_dir:
+        for backend in BACKENDS:
+            stats, docs, queries = run_backend(backend, args, work_dir)
+            results.append(stats)
+            vectors[backend] = (docs, queries)
+    report_parity = parity(vectors["huggingface"], vectors["onnx"], texts, questions, k)
+
+    for result in results:
+        print(
+            f"{result['backend']:<12} load={result['load_seconds']:.2f}s "
+            f"rss={result['rss_after_load_bytes'] / 2**20:.0f}MiB (model {result['model_rss_bytes'] / 2**20:.0f}MiB, "
+            f"peak {result['peak_rss_bytes'] / 2**20:.0f}MiB) ingest={result['ingest_chunks_per_second']:.1f} chunks/s "
+            f"query p50={result['query_latency_ms']['p50']:.2f}ms p95={result['query_latency_ms']['p95']:.2f}ms"
+        )
+    print(
+        f"parity       cosine mean={report_parity['cosine_mean']:.4f} min={report_parity['cosine_min']:.4f} "
+        f"overlap@{k}={report_parity['overlap_at_k_mean']:.3f} top1={report_parity['top1_agreement']:.3f} "
+        f"recall@{k} {report_parity['recall_at_k_reference']:.3f} -> {report_parity['recall_at_k_candidate']:.3f}"
+    )
+
+    failures = []
+    if report_parity["cosine_min"] < args.min_cosine:
+        failures.append(f"minimum cosine {report_parity['cosine_min']} < {args.min_cosine}")
+    if report_parity["overlap_at_k_mean"] < args.min_overlap:
+        failures.append(f"mean top-{k} overlap {report_parity['overlap_at_k_mean']} < {args.min_overlap}")
+    if report_parity["recall_at_k_reference"] - report_parity["recall_at_k_candidate"] > args.max_recall_drop:
+        failures.append(f"recall@{k} dropped by more than {args.max_recall_drop}")
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "document": os.path.basename(args.document),
+        "questions": os.path.basename(args.questions),
+        "chunks": len(texts),
+        "k": k,
+        "threads": args.threads,
+        "results": results,
+        "parity": report_parity,
+        "parity_failures": failures,
+    }
+    output = args.output or f"embedding_benchmark_{commit}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+    if failures:
+        print("Parity check FAILED: " + "; ".join(failures))
+        raise SystemExit(1)
+    print("Parity check passed")
+
+if __name__ == "__main__":
+    main()
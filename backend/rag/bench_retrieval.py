@@ -0,0 +1,206 @@
+"""
+Retrieval benchmark: sweep chunking, k and HNSW settings over a labeled question set.
+
+For every combination of chunk size, overlap and HNSW parameters the document
+is split and indexed into a throwaway Chroma directory. Each labeled question
+is then run once at the largest k, and every smaller k is scored by
+truncating that ranking. Reported per configuration:
+
+- ingestion time (split, embed + index) and on-disk index size
+- query latency (embedding + search, and search alone), p50/p95
+- recall@k (share of questions with a relevant chunk in the top k) and MRR
+- prompt cost: characters / estimated tokens of the k chunks, both raw and
+  after context assembly (rag/context.py), with recall measured on the
+  assembled context as well
+
+Run from the backend directory, e.g.
+
+    python -m rag.bench_retrieval --chunk-sizes 500,1000 --overlaps 0,200 --ks 3,5,10
+
+Results are written as JSON (with the git commit) so runs can be compared
+across commits.
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+from rag.context import assemble_context
+from rag.rag import load_documents, split_documents, create_vector_store, get_embeddings, EMBEDDING_MODEL_NAME
+
+DEFAULT_QUESTIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval", "hp_victus_faq_questions.json")
+DEFAULT_DOCUMENT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Document.pdf")
+
+def int_list(value: str):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def is_relevant(text: str, snippets) -> bool:
+    return any(snippet in text for snippet in snippets)
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def score_rankings(rankings, questions, k: int, max_chars: int) -> dict:
+    """recall@k, MRR@k and prompt size for the top-k of each question's ranking, raw and assembled."""
+    hits = 0
+    assembled_hits = 0
+    reciprocal_ranks = []
+    prompt_chars = []
+    assembled_chars = []
+    for ranking, question in zip(rankings, questions):
+        top = [doc.page_content for doc in ranking[:k]]
+        prompt_chars.append(sum(len(text) for text in top))
+        rank = next((i + 1 for i, text in enumerate(top) if is_relevant(text, question["answer_snippets"])), None)
+        if rank is not None:
+            hits += 1
+            reciprocal_ranks.append(1 / rank)
+        else:
+            reciprocal_ranks.append(0.0)
+
+        assembled = assemble_context(ranking[:k], max_chars=max_chars)
+        assembled_chars.append(sum(len(text) for text in assembled))
+        if any(is_relevant(text, question["answer_snippets"]) for text in assembled):
+            assembled_hits += 1
+    mean_chars = statistics.mean(prompt_chars)
+    mean_assembled = statistics.mean(assembled_chars)
+    return {
+        "k": k,
+        "recall_at_k": round(hits / len(questions), 4),
+        "mrr": round(statistics.mean(reciprocal_ranks), 4),
+        "prompt_chars_mean": round(mean_chars, 1),
+        # Same chars/4 estimate the fake LLM uses
+        "prompt_tokens_mean": round(mean_chars / 4, 1),
+        "assembled_recall_at_k": round(assembled_hits / len(questions), 4),
+        "assembled_chars_mean": round(mean_assembled, 1),
+        "assembled_tokens_mean": round(mean_assembled / 4, 1),
+    }
+
+def run_config(documents, questions, chunk_size, chunk_overlap, ks, hnsw: dict, work_dir: str, max_chars: int) -> dict:
+    import chromadb
+
+    path = os.path.join(work_dir, uuid.uuid4().hex)
+    client = chromadb.PersistentClient(path=path)
+    try:
+        start = time.perf_counter()
+        splits = split_documents(documents, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        split_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectorstore = create_vector_store(splits, collection_name="benchmark", client=client, collection_metadata=hnsw)
+        index_seconds = time.perf_counter() - start
+
+        embeddings = get_embeddings()
+        max_k = min(max(ks), len(splits))
+        rankings, query_latencies, search_latencies = [], [], []
+        for question in questions:
+            start = time.perf_counter()
+            vector = embeddings.embed_query(question["question"])
+            search_start = time.perf_counter()
+            docs = vectorstore.similarity_search_by_vector(vector, k=max_k)
+            end = time.perf_counter()
+            query_latencies.append(end - start)
+            search_latencies.append(end - search_start)
+            rankings.append(docs)
+
+        return {
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "hnsw": hnsw,
+            "chunks": len(splits),
+            "ingestion": {
+                "split_seconds": round(split_seconds, 4),
+                "embed_and_index_seconds": round(index_seconds, 4),
+            },
+            "index_size_bytes": directory_size(path),
+            "query_latency_ms": {
+                "p50": round(percentile(query_latencies, 50) * 1000, 3),
+                "p95": round(percentile(query_latencies, 95) * 1000, 3),
+                "search_only_p50": round(percentile(search_latencies, 50) * 1000, 3),
+                "search_only_p95": round(percentile(search_latencies, 95) * 1000, 3),
+            },
+            "by_k": [score_rankings(rankings, questions, k, max_chars) for k in ks],
+        }
+    finally:
+        del client
+        shutil.rmtree(path, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency and recall across chunking, k and HNSW settings.")
+    parser.add_argument("--document", default=DEFAULT_DOCUMENT)
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS, help="Labeled question set (JSON)")
+    parser.add_argument("--chunk-sizes", type=int_list, default=[500, 1000, 1500])
+    parser.add_argument("--overlaps", type=int_list, default=[0, 100, 200])
+    parser.add_argument("--ks", type=int_list, default=[1, 3, 5, 10])
+    parser.add_argument("--hnsw-m", type=int_list, default=[16])
+    parser.add_argument("--hnsw-construction-ef", type=int_list, default=[100])
+    parser.add_argument("--hnsw-search-ef", type=int_list, default=[10, 100])
+    parser.add_argument("--context-max-chars", type=int, default=6000, help="Character budget for the assembled context")
+    parser.add_argument("--output", help="JSON results path (default: retrieval_benchmark_<commit>.json)")
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = json.load(f)["questions"]
+    documents = load_documents(args.document)
+    # Load the embedding model up front so it is not counted as ingestion time
+    get_embeddings().embed_query("warm up")
+
+    commit = git_commit()
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="bench_retrieval_")
+    try:
+        grid = itertools.product(args.chunk_sizes, args.overlaps, args.hnsw_m, args.hnsw_construction_ef, args.hnsw_search_ef)
+        for chunk_size, overlap, m, construction_ef, search_ef in grid:
+            if overlap >= chunk_size:
+                continue
+            hnsw = {"hnsw:M": m, "hnsw:construction_ef": construction_ef, "hnsw:search_ef": search_ef}
+            result = run_config(documents, questions, chunk_size, overlap, args.ks, hnsw, work_dir, args.context_max_chars)
+            results.append(result)
+            best = result["by_k"][-1]
+            print(
+                f"chunk={chunk_size:<5} overlap={overlap:<4} M={m:<3} ef_c={construction_ef:<4} ef_s={search_ef:<4} "
+                f"chunks={result['chunks']:<4} index={result['ingestion']['embed_and_index_seconds']:.2f}s "
+                f"q_p50={result['query_latency_ms']['p50']:.1f}ms "
+                f"recall@{best['k']}={best['recall_at_k']:.2f} mrr={best['mrr']:.2f} tokens={best['prompt_tokens_mean']:.0f} "
+                f"assembled_recall={best['assembled_recall_at_k']:.2f} assembled_tokens={best['assembled_tokens_mean']:.0f}"
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "document": os.path.basename(args.document),
+        "questions": os.path.basename(args.questions),
+        "question_count": len(questions),
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "results": results,
+    }
+    output = args.output or f"retrieval_benchmark_{commit}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} configurations to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Vector store benchmark: Chroma vs the in-process NumPy index (float32 and int8).
+
+The document is split and embedded once; every store is built from the same
+embeddings in a throwaway directory, so only indexing and search are
+compared. Reported per store:
+
+- build time, on-disk size and load (open) time
+- single-query search latency p50/p95 (query embedding excluded)
+- batch search time for all labeled questions at once
+- recall@k against the labeled question set, and overlap of the top-k with
+  the exact float32 ranking
+
+Run from the backend directory, e.g.
+
+    python -m rag.bench_vector_store --k 10 --repeats 20
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+from rag.bench_retrieval import DEFAULT_DOCUMENT, DEFAULT_QUESTIONS, directory_size, git_commit, is_relevant, percentile
+from rag.numpy_store import NumpyVectorStore
+from rag.rag import EMBEDDING_MODEL_NAME, get_embeddings, load_documents, split_documents
+
+def build_chroma(path, texts, vectors, metadatas):
+    import chromadb
+    from langchain_community.vectorstores import Chroma
+
+    client = chromadb.PersistentClient(path=path)
+    collection = client.create_collection("benchmark", metadata={"hnsw:space": "cosine"})
+    collection.add(ids=[str(uuid.uuid4()) for _ in texts], embeddings=vectors, documents=texts, metadatas=metadatas)
+    return Chroma(client=client, collection_name="benchmark", embedding_function=get_embeddings())
+
+def open_chroma(path):
+    import chromadb
+    from langchain_community.vectorstores import Chroma
+
+    return Chroma(client=chromadb.PersistentClient(path=path), collection_name="benchmark", embedding_function=get_embeddings())
+
+def batch_search(store, query_vectors, k):
+    if isinstance(store, NumpyVectorStore):
+        return store.similarity_search_by_vectors(query_vectors, k)
+    # Chroma's client takes all query embeddings in one call
+    result = store._collection.query(query_embeddings=query_vectors, n_results=k, include=["documents"])
+    return result["documents"]
+
+def run_store(name, build, reopen, texts, vectors, metadatas, questions, query_vectors, k, repeats, work_dir, exact=None):
+    path = os.path.join(work_dir, name)
+    start = time.perf_counter()
+    build(path, texts, vectors, metadatas)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store = reopen(path)
+    load_seconds = time.perf_counter() - start
+
+    latencies = []
+    rankings = []
+    for _ in range(repeats):
+        rankings = []
+        for vector in query_vectors:
+            start = time.perf_counter()
+            docs = store.similarity_search_by_vector(vector, k=k)
+            latencies.append(time.perf_counter() - start)
+            rankings.append([doc.page_content for doc in docs])
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        batch_search(store, query_vectors, k)
+    batch_seconds = (time.perf_counter() - start) / repeats
+
+    hits = sum(
+        1 for ranking, question in zip(rankings, questions)
+        if any(is_relevant(text, question["answer_snippets"]) for text in ranking)
+    )
+    result = {
+        "store": name,
+        "build_seconds": round(build_seconds, 4),
+        "load_seconds": round(load_seconds, 4),
+        "size_bytes": directory_size(path),
+        "search_latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+        },
+        "batch_search_ms": round(batch_seconds * 1000, 3),
+        "recall_at_k": round(hits / len(questions), 4),
+    }
+    if exact is not None:
+        overlap = [len(set(a) & set(b)) / max(1, len(b)) for a, b in zip(rankings, exact)]
+        result["overlap_with_exact"] = round(sum(overlap) / len(overlap), 4)
+    return result, rankings
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Chroma with the NumPy vector index on the bundled document.")
+    parser.add_argument("--document", default=DEFAULT_DOCUMENT)
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS, help="Labeled question set (JSON)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=10, help="Passes over the question set")
+    parser.add_argument("--output", help="JSON results path (default: vector_store_benchmark_<commit>.json)")
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = json.load(f)["questions"]
+    splits = split_documents(load_documents(args.document), chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    texts = [doc.page_content for doc in splits]
+    metadatas = [doc.metadata for doc in splits]
+    embeddings = get_embeddings()
+    vectors = embeddings.embed_documents(texts)
+    query_vectors = embeddings.embed_documents([q["question"] for q in questions])
+    k = min(args.k, len(texts))
+
+    def numpy_builder(quantization):
+        def build(path, texts, vectors, metadatas):
+            NumpyVectorStore(embeddings, path=path, quantization=quantization).add_embeddings(texts, vectors, metadatas)
+        return build
+
+    def numpy_open(path):
+        return NumpyVectorStore.load(path, embeddings)
+
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="bench_vector_store_")
+    try:
+        common = (texts, vectors, metadatas, questions, query_vectors, k, args.repeats, work_dir)
+        exact_result, exact = run_store("numpy_float32", numpy_builder("float32"), numpy_open, *common)
+        results.append(exact_result)
+        results.append(run_store("numpy_int8", numpy_builder("int8"), numpy_open, *common, exact=exact)[0])
+        results.append(run_store("chroma", build_chroma, open_chroma, *common, exact=exact)[0])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    for result in results:
+        print(
+            f"{result['store']:<14} build={result['build_seconds']:.3f}s load={result['load_seconds'] * 1000:.1f}ms "
+            f"size={result['size_bytes'] / 1024:.0f}KiB p50={result['search_latency_ms']['p50']:.3f}ms "
+            f"p95={result['search_latency_ms']['p95']:.3f}ms batch={result['batch_search_ms']:.2f}ms "
+            f"recall@{k}={result['recall_at_k']:.2f} overlap={result.get('overlap_with_exact', 1.0):.2f}"
+        )
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "document": os.path.basename(args.document),
+        "questions": os.path.basename(args.questions),
+        "chunks": len(texts),
+        "k": k,
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "results": results,
+    }
+    output = args.output or f"vector_store_benchmark_{commit}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} stores to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Context assembly: turn a ranked list of retrieved chunks into the text that
+goes into the prompt.
+
+Chunks come from split_documents with a 200-character overlap, so neighbours
+retrieved together repeat text, and FAQ entries that are paraphrases of each
+other pad the prompt with near-copies. assemble_context:
+
+1. merges chunks that are contiguous or overlapping in the same source page
+   (using the splitter's start_index metadata) into one segment,
+2. drops segments that are near-duplicates of a more relevant one
+   (MinHash estimate of word-shingle Jaccard similarity),
+3. orders the remaining segments by their best retrieval rank, and
+4. stops once the character budget is used up.
+"""
+import re
+import zlib
+
+# Mersenne prime for the (a * x + b) mod p MinHash permutations
+_PRIME = (1 << 61) - 1
+_NUM_PERM = 64
+_SHINGLE_WORDS = 3
+
+def _permutations(count: int, seed: int = 1):
+    # Fixed linear congruential sequence so signatures are stable across processes
+    params = []
+    state = seed
+    for _ in range(count):
+        state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+        a = state % (_PRIME - 1) + 1
+        state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+        b = state % _PRIME
+        params.append((a, b))
+    return params
+
+_PERMUTATIONS = _permutations(_NUM_PERM)
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < _SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + _SHINGLE_WORDS]) for i in range(len(words) - _SHINGLE_WORDS + 1)}
+
+def minhash_signature(text: str) -> tuple:
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in _shingles(text)]
+    if not hashes:
+        return ()
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+def estimated_similarity(sig_a: tuple, sig_b: tuple) -> float:
+    if not sig_a or not sig_b:
+        return 0.0
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+class _Segment:
+    def __init__(self, text: str, start: int, rank: int):
+        self.text = text
+        self.start = start
+        self.rank = rank
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.text)
+
+def merge_contiguous(docs) -> list:
+    """
+    Merge chunks of the same source page whose character ranges touch or
+    overlap. Each merged segment keeps the best (lowest) rank of its chunks.
+    Chunks without start_index are kept as they are.
+    """
+    groups = {}
+    loose = []
+    for rank, doc in enumerate(docs):
+        metadata = doc.metadata or {}
+        start = metadata.get("start_index")
+        if start is None or start < 0:
+            loose.append(_Segment(doc.page_content, 0, rank))
+            continue
+        key = (metadata.get("source"), metadata.get("page"))
+        groups.setdefault(key, []).append(_Segment(doc.page_content, start, rank))
+
+    segments = []
+    for chunks in groups.values():
+        chunks.sort(key=lambda c: c.start)
+        current = chunks[0]
+        for chunk in chunks[1:]:
+            if chunk.start <= current.end:
+                # Append only the part of the next chunk not already covered
+                if chunk.end > current.end:
+                    current.text += chunk.text[current.end - chunk.start:]
+                current.rank = min(current.rank, chunk.rank)
+            else:
+                segments.append(current)
+                current = chunk
+        segments.append(current)
+    return segments + loose
+
+def assemble_context(docs, max_chars: int = 6000, dedupe_threshold: float = 0.8) -> list:
+    """
+    Merged, deduplicated, relevance-ordered chunk texts fitting in max_chars.
+    docs must be in retrieval order (most relevant first).
+    """
+    segments = sorted(merge_contiguous(docs), key=lambda s: s.rank)
+    kept_signatures = []
+    context = []
+    used = 0
+    for segment in segments:
+        signature = minhash_signature(segment.text)
+        if any(estimated_similarity(signature, kept) >= dedupe_threshold for kept in kept_signatures):
+            continue
+        remaining = max_chars - used
+        if len(segment.text) > remaining:
+            # Always include something: truncate the most relevant segment if it alone is too long
+            if not context:
+                context.append(segment.text[:remaining])
+                break
+            # A smaller, less relevant segment may still fit in what is left
+            continue
+        kept_signatures.append(signature)
+        context.append(segment.text)
+        used += len(segment.text)
+    return context
@@ -0,0 +1,98 @@
+"""
+FAQ question index: answer verbatim or near-verbatim FAQ questions directly.
+
+At ingestion, FAQ-style documents ("1. Question?" / "Q: Question?" lines,
+each followed by its answer) are split into question/answer pairs. The
+questions are embedded into their own collection (<collection>__faq) with
+the answer and its source stored as metadata. At chat time a query whose
+best match scores at least the threshold is answered with the stored
+answer and a citation, without retrieval, web search or an LLM call.
+"""
+import logging
+import os
+import re
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# A line that is a question: optional "12." / "12)" / "Q:" prefix, ends in "?"
+QUESTION_LINE = re.compile(r"^\s*(?:(?:Q(?:uestion)?\s*[:.]|\d{1,3}\s*[.)])\s*)?(?P<question>\S.{3,}\?)\s*$", re.IGNORECASE)
+ANSWER_PREFIX = re.compile(r"^\s*A(?:nswer)?\s*[:.]\s*", re.IGNORECASE)
+# Fewer pairs than this and the document is not treated as an FAQ
+MIN_FAQ_PAIRS = 3
+
+def faq_collection_name(collection_name: str) -> str:
+    from rag.rag import suffixed_collection_name
+    # Long collection names are shortened so the suffixed name still fits Chroma's limit
+    return suffixed_collection_name(collection_name, "__faq")
+
+def extract_faq_pairs(documents) -> list:
+    """
+    Question/answer pairs found in the documents, in order. Answers run until
+    the next question line and may span pages; each pair keeps the source and
+    page of its question.
+    """
+    pairs = []
+    current = None
+    for doc in documents:
+        metadata = doc.metadata or {}
+        for line in doc.page_content.splitlines():
+            match = QUESTION_LINE.match(line)
+            if match:
+                if current and current["answer"]:
+                    pairs.append(current)
+                current = {
+                    "question": match.group("question").strip(),
+                    "answer": [],
+                    "source": metadata.get("source", ""),
+                    "page": metadata.get("page", 0),
+                }
+            elif current is not None and line.strip():
+                current["answer"].append(ANSWER_PREFIX.sub("", line.strip()) if not current["answer"] else line.strip())
+    if current and current["answer"]:
+        pairs.append(current)
+    for pair in pairs:
+        pair["answer"] = "\n".join(pair["answer"])
+    return pairs if len(pairs) >= MIN_FAQ_PAIRS else []
+
+def build_faq_index(documents, collection_name: str):
+    """
+    Index the document's FAQ questions in the <collection>__faq collection,
+    replacing any previous one. Returns the vector store, or None if the
+    document has no FAQ structure.
+    """
+    from rag.rag import create_vector_store, delete_vector_store
+
+    pairs = extract_faq_pairs(documents)
+    name = faq_collection_name(collection_name)
+    delete_vector_store(name)
+    if not pairs:
+        return None
+    questions = [
+        Document(
+            page_content=pair["question"],
+            metadata={"answer": pair["answer"], "source": pair["source"], "page": pair["page"], "faq_index": i},
+        )
+        for i, pair in enumerate(pairs)
+    ]
+    vectorstore = create_vector_store(questions, collection_name=name)
+    logger.info("Indexed FAQ questions", extra={"collection": name, "questions": len(questions)})
+    return vectorstore
+
+def load_faq_index(collection_name: str):
+    from rag.rag import load_vector_store
+    return load_vector_store(faq_collection_name(collection_name))
+
+def match_faq(faq_index, query: str, threshold: float):
+    """The best matching FAQ entry as (Document, score) if it scores at least threshold, else None."""
+    hits = faq_index.similarity_search_with_relevance_scores(query, k=1)
+    if hits and hits[0][1] >= threshold:
+        return hits[0]
+    return None
+
+def format_faq_answer(doc: Document) -> str:
+    metadata = doc.metadata
+    source = os.path.basename(metadata.get("source") or "") or "knowledge base"
+    # PDF page metadata is 0-based
+    return f"{metadata['answer']}\n\nSource: {source}, page {int(metadata.get('page', 0)) + 1} (FAQ: \"{doc.page_content}\")"
@@ -0,0 +1,207 @@
+"""
+Exact in-process vector index for small (FAQ-sized) collections.
+
+Embeddings are L2-normalized and kept as one float32 matrix, or as int8 with
+a float32 scale per row, next to a parallel list of documents. A query is a
+single matrix-vector product followed by a partial sort, so results are
+exact and there is no client round trip, SQLite layer or HNSW graph.
+
+Each collection is persisted as a directory of .npy files plus a JSON file
+for texts and metadata; the matrices are opened with mmap_mode="r", so
+loading is zero-copy and pages are shared between worker processes.
+"""
+import json
+import os
+import threading
+import uuid
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+QUANTIZATIONS = ("float32", "int8")
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def _quantize(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Symmetric per-row int8: row ~= codes * scale
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(matrix / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def _atomic_save(path: str, array: np.ndarray):
+    tmp = f"{path}.tmp.npy"
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+class NumpyVectorStore(VectorStore):
+    """LangChain vector store doing exact cosine top-k over a (memory-mapped) NumPy matrix."""
+
+    def __init__(self, embedding: Embeddings, path: Optional[str] = None, quantization: str = "float32"):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self._embedding = embedding
+        self.path = path
+        self.quantization = quantization
+        self._matrix = None  # (n, dim) float32 or int8
+        self._scales = None  # (n,) float32, int8 only
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[dict] = []
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # Persistence
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return os.path.exists(os.path.join(path, "index.json"))
+
+    @classmethod
+    def load(cls, path: str, embedding: Embeddings) -> "NumpyVectorStore":
+        """Open a persisted collection; the matrices are memory-mapped, not read."""
+        with open(os.path.join(path, "index.json"), encoding="utf-8") as f:
+            index = json.load(f)
+        store = cls(embedding, path=path, quantization=index["quantization"])
+        store._ids = index["ids"]
+        store._texts = index["texts"]
+        store._metadatas = index["metadatas"]
+        if store._ids:
+            store._matrix = np.load(os.path.join(path, "matrix.npy"), mmap_mode="r")
+            if store.quantization == "int8":
+                store._scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+        return store
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        if self._matrix is not None:
+            _atomic_save(os.path.join(self.path, "matrix.npy"), np.asarray(self._matrix))
+            if self._scales is not None:
+                _atomic_save(os.path.join(self.path, "scales.npy"), np.asarray(self._scales))
+        index = {
+            "quantization": self.quantization,
+            "dimension": int(self._matrix.shape[1]) if self._matrix is not None else 0,
+            "ids": self._ids,
+            "texts": self._texts,
+            "metadatas": self._metadatas,
+        }
+        tmp = os.path.join(self.path, "index.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        # index.json is written last, so a reader never sees ids without their rows
+        os.replace(tmp, os.path.join(self.path, "index.json"))
+
+    # Writes
+
+    def add_embeddings(self, texts: List[str], embeddings, metadatas: Optional[List[dict]] = None,
+                       ids: Optional[List[str]] = None) -> List[str]:
+        """Add precomputed embeddings (one row per text)."""
+        if not texts:
+            return []
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        metadatas = [dict(m or {}) for m in metadatas] if metadatas else [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        with self._lock:
+            if self.quantization == "int8":
+                codes, scales = _quantize(vectors)
+                self._matrix = codes if self._matrix is None else np.concatenate([self._matrix, codes])
+                self._scales = scales if self._scales is None else np.concatenate([self._scales, scales])
+            else:
+                self._matrix = vectors if self._matrix is None else np.concatenate([self._matrix, vectors])
+            self._ids += ids
+            self._texts += list(texts)
+            self._metadatas += metadatas
+            self.save()
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None,
+                  **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(texts, self._embedding.embed_documents(texts), metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        drop = set(ids)
+        with self._lock:
+            keep = [i for i, doc_id in enumerate(self._ids) if doc_id not in drop]
+            if len(keep) == len(self._ids):
+                return False
+            self._matrix = np.asarray(self._matrix)[keep] if keep else None
+            if self._scales is not None:
+                self._scales = np.asarray(self._scales)[keep] if keep else None
+            self._ids = [self._ids[i] for i in keep]
+            self._texts = [self._texts[i] for i in keep]
+            self._metadatas = [self._metadatas[i] for i in keep]
+            self.save()
+        return True
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, path: Optional[str] = None, quantization: str = "float32",
+                   **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding, path=path, quantization=quantization)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    # Search
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every row against each query: shape (n_queries, n)."""
+        with self._lock:
+            matrix, scales = self._matrix, self._scales
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        if matrix is None:
+            return np.empty((len(queries), 0), dtype=np.float32)
+        if scales is not None:
+            return (queries @ matrix.T) * scales
+        return queries @ matrix.T
+
+    def _top_k(self, scores: np.ndarray, k: int) -> List[Tuple[Document, float]]:
+        k = min(k, scores.shape[0])
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (Document(id=self._ids[i], page_content=self._texts[i], metadata=self._metadatas[i]), float(scores[i]))
+            for i in top
+        ]
+
+    def similarity_search_with_score_by_vectors(self, embeddings, k: int = 4) -> List[List[Tuple[Document, float]]]:
+        """Batch search: one matrix product for all query vectors."""
+        return [self._top_k(row, k) for row in self._scores(embeddings)]
+
+    def similarity_search_by_vectors(self, embeddings, k: int = 4) -> List[List[Document]]:
+        return [[doc for doc, _ in hits] for hits in self.similarity_search_with_score_by_vectors(embeddings, k)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vectors([embedding], k)[0]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vectors([self._embedding.embed_query(query)], k)[0]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def batch_similarity_search(self, queries: List[str], k: int = 4) -> List[List[Document]]:
+        return self.similarity_search_by_vectors(self._embedding.embed_documents(queries), k)
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities, as Chroma's cosine relevance is, so
+        # thresholds mean the same on both backends; clamp int8 rounding overshoot
+        return lambda score: min(1.0, max(0.0, score))
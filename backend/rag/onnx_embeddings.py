@@ -0,0 +1,131 @@
+"""
+CPU embeddings from an int8-quantized ONNX export of the sentence-transformers
+model, run with onnxruntime instead of PyTorch.
+
+The export reproduces what SentenceTransformer.encode does for
+all-MiniLM-L6-v2: WordPiece tokens truncated to 256, the transformer, mean
+pooling over the attention mask and L2 normalization. Vectors stay close
+enough to the PyTorch ones that collections embedded with either backend can
+be queried with the other; rag/bench_embeddings.py checks that.
+
+Create the export once (needs torch and transformers, which
+sentence-transformers already installs), from the backend directory:
+
+    python -m rag.onnx_embeddings export --output ./onnx_models/all-MiniLM-L6-v2
+
+then run the server with EMBEDDING_BACKEND=onnx.
+"""
+import argparse
+import os
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+# all-MiniLM-L6-v2's max_seq_length
+MAX_LENGTH = 256
+
+class OnnxEmbeddings(Embeddings):
+    """LangChain embeddings backed by an onnxruntime session."""
+
+    def __init__(self, model_dir: str, model_file: str = INT8_FILE, threads: int = 0, batch_size: int = 32,
+                 max_length: int = MAX_LENGTH):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, model_file)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"No ONNX model at {model_path}; run `python -m rag.onnx_embeddings export` first")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+        self.batch_size = batch_size
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + self.batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self.session.run(None, feeds)[0]
+            # Mean pooling over real tokens, then L2 normalization, as sentence-transformers does
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            batches.append(pooled / np.clip(norms, 1e-12, None))
+        if not batches:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(batches).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+def export(output_dir: str, model_name: str, quantize: bool = True):
+    """Export the Hugging Face model and its tokenizer to ONNX, plus a dynamically int8-quantized copy."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    hub_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(hub_name)
+    # Writes tokenizer.json for the fast tokenizers library used at runtime
+    tokenizer.save_pretrained(output_dir)
+    model = AutoModel.from_pretrained(hub_name).eval()
+
+    sample = tokenizer(["An example sentence to trace the model with."], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    fp32_path = os.path.join(output_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state", "pooler_output"],
+            dynamic_axes={
+                **{name: {0: "batch", 1: "sequence"} for name in input_names},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+                "pooler_output": {0: "batch"},
+            },
+            opset_version=14,
+        )
+    written = [fp32_path]
+    if quantize:
+        int8_path = os.path.join(output_dir, INT8_FILE)
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        written.append(int8_path)
+    return written
+
+def main():
+    from rag.rag import EMBEDDING_MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Export the embedding model to (int8-quantized) ONNX.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Export and quantize the model")
+    export_parser.add_argument("--output", default=os.getenv("EMBEDDING_ONNX_PATH", f"./onnx_models/{EMBEDDING_MODEL_NAME}"))
+    export_parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    export_parser.add_argument("--no-quantize", action="store_true", help="Only write the float32 model")
+    args = parser.parse_args()
+
+    for path in export(args.output, args.model, quantize=not args.no_quantize):
+        print(f"Wrote {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,37 @@
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-import chromadb
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from functools import lru_cache
+import hashlib
+import json
+import logging
 import os
+import re
+import uuid
+
+# langchain, chromadb and sentence-transformers are slow to import and the
+# embedding model is large, so everything heavy is imported and built on first
+# use inside the functions below.
+
+CHROMA_PATH = "./chroma_db"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Collection metadata keys Chroma reads its HNSW index settings from
+HNSW_KEYS = ("hnsw:space", "hnsw:M", "hnsw:construction_ef", "hnsw:search_ef", "hnsw:batch_size", "hnsw:sync_threshold")
+# Chroma's defaults, used for reporting and memory estimates when a key is unset
+HNSW_DEFAULTS = {"hnsw:space": "l2", "hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 10,
+                 "hnsw:batch_size": 100, "hnsw:sync_threshold": 1000}
+# Chroma collection names are 3-63 characters
+CHROMA_NAME_MAX_LENGTH = 63
+# Collection name -> Chroma collection currently holding its index, for
+# collections rebuilt by reindex_collection. Kept next to the Chroma data so it
+# persists whatever the state backend.
+INDEX_ALIASES_FILE = "index_aliases.json"
+# Suffix of the versioned Chroma collections reindex_collection builds
+INDEX_VERSION_SUFFIX = re.compile(r"__r[0-9a-f]{8}$")
+
+logger = logging.getLogger(__name__)
 
 def load_documents(file_path: str):
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader
+
     _, file_extension = os.path.splitext(file_path)
     if file_extension.lower() == ".pdf":
         loader = PyPDFLoader(file_path)
@@ -16,40 +42,408 @@ def load_documents(file_path: str):
     documents = loader.load()
     return documents
 
-def split_documents(documents):
+def split_documents(documents, chunk_size: int = 1000, chunk_overlap: int = 200):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
         add_start_index=True,
     )
     splits = text_splitter.split_documents(documents)
     return splits
 
-def create_vector_store(splits, collection_name: str):
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    
-    client = chromadb.PersistentClient(path="./chroma_db")
-    
+@lru_cache(maxsize=None)
+def get_embeddings(backend: str = None):
+    # Loading the model is expensive; share one instance across all collections
+    import config
+
+    backend = backend or config.EMBEDDING_BACKEND
+    if backend == "onnx":
+        from rag.onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(
+            config.EMBEDDING_ONNX_PATH,
+            model_file=config.EMBEDDING_ONNX_FILE,
+            threads=config.EMBEDDING_THREADS,
+            batch_size=config.EMBEDDING_BATCH_SIZE,
+        )
+    if backend == "huggingface":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+@lru_cache(maxsize=None)
+def get_chroma_client():
+    import chromadb
+    return chromadb.PersistentClient(path=CHROMA_PATH)
+
+def suffixed_collection_name(collection_name: str, suffix: str) -> str:
+    """
+    collection_name + suffix, shortened to fit Chroma's name limit: a base
+    that is too long is cut and disambiguated with a hash of the full name.
+    """
+    name = f"{collection_name}{suffix}"
+    if len(name) <= CHROMA_NAME_MAX_LENGTH:
+        return name
+    digest = hashlib.sha1(collection_name.encode("utf-8")).hexdigest()[:8]
+    return f"{collection_name[:CHROMA_NAME_MAX_LENGTH - len(suffix) - len(digest) - 1]}-{digest}{suffix}"
+
+def _index_aliases() -> dict:
+    try:
+        with open(os.path.join(CHROMA_PATH, INDEX_ALIASES_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _set_index_alias(collection_name: str, index_name: str = None):
+    aliases = _index_aliases()
+    if index_name is None:
+        if aliases.pop(collection_name, None) is None:
+            return
+    else:
+        aliases[collection_name] = index_name
+    os.makedirs(CHROMA_PATH, exist_ok=True)
+    path = os.path.join(CHROMA_PATH, INDEX_ALIASES_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(aliases, f)
+    os.replace(tmp_path, path)
+
+def chroma_index_name(collection_name: str) -> str:
+    """The Chroma collection holding a collection's index (itself unless it was reindexed)."""
+    return _index_aliases().get(collection_name, collection_name)
+
+def _numpy_index_path(collection_name: str) -> str:
+    import config
+    return os.path.join(config.NUMPY_INDEX_PATH, collection_name)
+
+def _create_numpy_store(splits, collection_name: str):
+    import shutil
+
+    import config
+    from rag.numpy_store import NumpyVectorStore
+
+    path = _numpy_index_path(collection_name)
+    # Like Chroma's get-or-create, but a rebuild replaces the previous contents
+    shutil.rmtree(path, ignore_errors=True)
+    vectorstore = NumpyVectorStore.from_documents(splits, get_embeddings(), path=path, quantization=config.VECTOR_QUANTIZATION)
+    logger.info("Documents added to NumPy index", extra={"collection": collection_name, "chunks": len(splits)})
+    return vectorstore
+
+def create_vector_store(splits, collection_name: str, client=None, collection_metadata: dict = None):
+    import config
+
+    # client / collection_metadata only apply to Chroma
+    if config.VECTOR_BACKEND == "numpy" and client is None:
+        return _create_numpy_store(splits, collection_name)
+
+    from langchain_community.vectorstores import Chroma
+
+    embeddings = get_embeddings()
+
+    # An explicit client is a separate store, which index aliases don't cover
+    if client is None:
+        client = get_chroma_client()
+        collection_name = chroma_index_name(collection_name)
+    # Per-collection metadata (e.g. HNSW parameters) is merged over the configured defaults
+    metadata = {"hnsw:space": "cosine", **config.HNSW_SETTINGS, **(collection_metadata or {})}
+
     # Always create or get the collection and add documents
     vectorstore = Chroma.from_documents(
         documents=splits,
         embedding=embeddings,
         client=client,
         collection_name=collection_name,
-        collection_metadata={"hnsw:space": "cosine"}, # Explicitly setting HNSW space
+        collection_metadata=metadata, # Explicitly setting HNSW space
+    )
+
+    logger.info("Documents added to Chroma collection", extra={"collection": collection_name, "chunks": len(splits)})
+
+    return vectorstore
+
+def load_vector_store(collection_name: str):
+    """Open an existing, non-empty collection without re-embedding. Returns None if there is none."""
+    import config
+
+    if config.VECTOR_BACKEND == "numpy":
+        from rag.numpy_store import NumpyVectorStore
+        path = _numpy_index_path(collection_name)
+        if not NumpyVectorStore.exists(path):
+            return None
+        vectorstore = NumpyVectorStore.load(path, get_embeddings())
+        return vectorstore if len(vectorstore) else None
+
+    from langchain_community.vectorstores import Chroma
+
+    client = get_chroma_client()
+    index_name = chroma_index_name(collection_name)
+    existing = {c if isinstance(c, str) else c.name for c in client.list_collections()}
+    if index_name not in existing:
+        return None
+    vectorstore = Chroma(
+        client=client,
+        collection_name=index_name,
+        embedding_function=get_embeddings(),
     )
-    
-    print(f"Documents added to Chroma collection: {collection_name}")
-    
+    if vectorstore._collection.count() == 0:
+        return None
     return vectorstore
 
+def delete_vector_store(collection_name: str):
+    """Remove a collection and its index if it exists."""
+    import config
+
+    if config.VECTOR_BACKEND == "numpy":
+        import shutil
+        shutil.rmtree(_numpy_index_path(collection_name), ignore_errors=True)
+        return
+    client = get_chroma_client()
+    existing = {c if isinstance(c, str) else c.name for c in client.list_collections()}
+    for name in {collection_name, chroma_index_name(collection_name)} & existing:
+        client.delete_collection(name)
+    _set_index_alias(collection_name, None)
+
+def list_vector_stores() -> list:
+    """
+    Names of every collection in the configured vector backend, FAQ indexes
+    included. Reindexed Chroma collections are listed under their own name.
+    """
+    import config
+
+    if config.VECTOR_BACKEND == "numpy":
+        from rag.numpy_store import NumpyVectorStore
+        root = config.NUMPY_INDEX_PATH
+        if not os.path.isdir(root):
+            return []
+        return sorted(name for name in os.listdir(root) if NumpyVectorStore.exists(os.path.join(root, name)))
+    indexed_as = {index_name: name for name, index_name in _index_aliases().items()}
+    names = set()
+    for collection in get_chroma_client().list_collections():
+        name = collection if isinstance(collection, str) else collection.name
+        if name in indexed_as:
+            names.add(indexed_as[name])
+        elif not INDEX_VERSION_SUFFIX.search(name):
+            # Versioned indexes no alias points at are half-built or awaiting deletion
+            names.add(name)
+    return sorted(names)
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            total += os.path.getsize(os.path.join(dirpath, name))
+    return total
+
+def vector_store_usage(collection_name: str, client_path: str = CHROMA_PATH) -> dict:
+    """
+    Chunk count and bytes on disk of a collection. For Chroma this is the
+    collection's HNSW segment directory; its rows in the shared chroma.sqlite3
+    are not attributed per collection.
+    """
+    import config
+
+    if config.VECTOR_BACKEND == "numpy":
+        path = _numpy_index_path(collection_name)
+        with open(os.path.join(path, "index.json"), encoding="utf-8") as f:
+            chunks = len(json.load(f)["ids"])
+        return {"chunks": chunks, "bytes_on_disk": _dir_bytes(path)}
+    collection = get_chroma_client().get_collection(chroma_index_name(collection_name))
+    segment_dir = _vector_segment_dir(collection, client_path)
+    return {
+        "chunks": collection.count(),
+        "bytes_on_disk": _dir_bytes(segment_dir) if segment_dir and os.path.isdir(segment_dir) else 0,
+    }
+
+def compact_vector_stores(client_path: str = CHROMA_PATH) -> dict:
+    """
+    Reclaim disk space left behind by deleted collections. For Chroma this
+    removes HNSW segment directories no collection refers to and VACUUMs
+    chroma.sqlite3, which needs exclusive access: run it with the server
+    stopped. For the numpy backend it removes leftover temp files.
+    Returns the number of bytes freed.
+    """
+    import config
+    import shutil
+
+    if config.VECTOR_BACKEND == "numpy":
+        freed = 0
+        for dirpath, _, filenames in os.walk(config.NUMPY_INDEX_PATH):
+            for name in filenames:
+                if ".tmp" in name:
+                    path = os.path.join(dirpath, name)
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+        return {"bytes_freed": freed}
+
+    import sqlite3
+
+    db_path = os.path.join(client_path, "chroma.sqlite3")
+    if not os.path.exists(db_path):
+        return {"bytes_freed": 0}
+    before = _dir_bytes(client_path)
+    with sqlite3.connect(db_path) as conn:
+        segment_ids = {row[0] for row in conn.execute("SELECT id FROM segments")}
+    orphans = [
+        name for name in os.listdir(client_path)
+        if os.path.isdir(os.path.join(client_path, name)) and name not in segment_ids
+    ]
+    for name in orphans:
+        shutil.rmtree(os.path.join(client_path, name), ignore_errors=True)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    freed = before - _dir_bytes(client_path)
+    logger.info("Compacted Chroma store", extra={"orphan_segments": len(orphans), "bytes_freed": freed})
+    return {"orphan_segments": len(orphans), "bytes_freed": freed}
+
 def process_document_for_rag(file_path: str, collection_name: str):
     documents = load_documents(file_path)
     splits = split_documents(documents)
     vectorstore = create_vector_store(splits, collection_name)
-    print(f"Processed document {file_path} and added to vector store.")
+    logger.info("Processed document and added to vector store", extra={"file_path": file_path, "collection": collection_name})
     return vectorstore.as_retriever()
 
 
 def get_retriever(vectorstore, k: int = 10):
-    return vectorstore.as_retriever(search_kwargs={"k": k})
\ No newline at end of file
+    return vectorstore.as_retriever(search_kwargs={"k": k})
+
+def batch_retrieve(vectorstore, queries: list, k: int = 10) -> list:
+    """
+    Top-k documents for each of many queries. The queries are embedded in one
+    batch and searched together: one matrix product on the numpy backend, one
+    collection query on Chroma.
+    """
+    if not queries:
+        return []
+    vectors = vectorstore.embeddings.embed_documents(list(queries))
+    if hasattr(vectorstore, "similarity_search_by_vectors"):
+        return vectorstore.similarity_search_by_vectors(vectors, k)
+    from langchain_core.documents import Document
+
+    result = vectorstore._collection.query(query_embeddings=vectors, n_results=k, include=["documents", "metadatas"])
+    return [
+        [Document(id=doc_id, page_content=text, metadata=metadata or {}) for doc_id, text, metadata in zip(ids, texts, metadatas)]
+        for ids, texts, metadatas in zip(result["ids"], result["documents"], result["metadatas"])
+    ]
+
+
+def _get_chroma_collection(collection_name: str, client=None):
+    if client is None:
+        return get_chroma_client().get_collection(chroma_index_name(collection_name))
+    return client.get_collection(collection_name)
+
+def _hnsw_settings(collection) -> dict:
+    metadata = collection.metadata or {}
+    settings = {key: metadata.get(key, HNSW_DEFAULTS[key]) for key in HNSW_KEYS}
+    # chromadb >= 1.0 keeps search_ef in the collection configuration, where set_search_ef changes it
+    configuration = getattr(collection, "configuration", None)
+    hnsw = configuration.get("hnsw") if isinstance(configuration, dict) else None
+    if hnsw and hnsw.get("ef_search") is not None:
+        settings["hnsw:search_ef"] = hnsw["ef_search"]
+    return settings
+
+def get_hnsw_settings(collection_name: str, client=None) -> dict:
+    """Effective HNSW settings of a collection (its metadata and configuration over Chroma's defaults)."""
+    return _hnsw_settings(_get_chroma_collection(collection_name, client))
+
+def set_search_ef(collection_name: str, search_ef: int, client=None):
+    """
+    Change a collection's query-time search_ef in place (no rebuild). The other
+    HNSW settings only take effect through reindex_collection.
+    """
+    collection = _get_chroma_collection(collection_name, client)
+    try:
+        # Only the configuration: modify(metadata=...) replaces the whole metadata, hnsw:space included
+        collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+    except TypeError:
+        raise ValueError("Changing search_ef in place needs chromadb >= 1.0; use reindex_collection instead.")
+
+def _vector_segment_dir(collection, client_path: str):
+    import sqlite3
+
+    db_path = os.path.join(client_path, "chroma.sqlite3")
+    if not os.path.exists(db_path):
+        return None
+    with sqlite3.connect(db_path) as conn:
+        row = conn.execute(
+            "SELECT id FROM segments WHERE collection = ? AND scope = 'VECTOR'", (str(collection.id),)
+        ).fetchone()
+    return os.path.join(client_path, row[0]) if row else None
+
+def collection_index_stats(collection_name: str, client=None, client_path: str = CHROMA_PATH) -> dict:
+    """
+    Element count, dimension, on-disk HNSW index size and an estimate of the
+    index's resident memory for a collection.
+    """
+    collection = _get_chroma_collection(collection_name, client)
+    settings = _hnsw_settings(collection)
+    count = collection.count()
+    sample = collection.get(limit=1, include=["embeddings"])
+    embeddings = sample.get("embeddings")
+    dimension = len(embeddings[0]) if embeddings is not None and len(embeddings) else 0
+
+    index_bytes = 0
+    segment_dir = _vector_segment_dir(collection, client_path)
+    if segment_dir and os.path.isdir(segment_dir):
+        for name in os.listdir(segment_dir):
+            index_bytes += os.path.getsize(os.path.join(segment_dir, name))
+
+    # hnswlib level 0 stores, per element, the float32 vector, up to 2*M
+    # neighbour ids, a link count and an 8-byte label; upper levels add ~1/M of that.
+    m = settings["hnsw:M"]
+    per_element = dimension * 4 + 2 * m * 4 + 4 + 8
+    estimated_memory = int(count * per_element * (1 + 1 / m))
+    return {
+        "collection": collection_name,
+        "count": count,
+        "dimension": dimension,
+        "hnsw": settings,
+        "index_bytes_on_disk": index_bytes,
+        "estimated_memory_bytes": estimated_memory,
+    }
+
+def reindex_collection(collection_name: str, settings: dict, batch_size: int = 1000) -> str:
+    """
+    Rebuild a collection's HNSW index with new settings. Stored embeddings are
+    copied into a new, versioned Chroma collection (nothing is re-embedded).
+    Only once it is complete is the collection switched over to it, so the
+    current index keeps serving throughout and stays in place if the copy
+    fails. Returns the name of the replaced index, for drop_chroma_index once
+    running workers have reopened the collection.
+    """
+    client = get_chroma_client()
+    previous = chroma_index_name(collection_name)
+    old = client.get_collection(previous)
+    metadata = {**(old.metadata or {}), "hnsw:search_ef": _hnsw_settings(old)["hnsw:search_ef"], **settings}
+    metadata.setdefault("hnsw:space", "cosine")
+
+    index_name = suffixed_collection_name(collection_name, f"__r{uuid.uuid4().hex[:8]}")
+    new = client.create_collection(index_name, metadata=metadata)
+    try:
+        total = old.count()
+        for offset in range(0, total, batch_size):
+            batch = old.get(limit=batch_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+            new.add(
+                ids=batch["ids"],
+                embeddings=batch["embeddings"],
+                documents=batch["documents"],
+                metadatas=batch["metadatas"],
+            )
+    except BaseException:
+        client.delete_collection(index_name)
+        raise
+
+    _set_index_alias(collection_name, index_name)
+    logger.info("Reindexed Chroma collection", extra={"collection": collection_name, "index": index_name, "chunks": total, "hnsw": settings})
+    return previous
+
+def drop_chroma_index(index_name: str):
+    """Delete a Chroma collection replaced by reindex_collection, unless it is in use again."""
+    if index_name in _index_aliases().values():
+        return
+    client = get_chroma_client()
+    existing = {c if isinstance(c, str) else c.name for c in client.list_collections()}
+    if index_name in existing:
+        client.delete_collection(index_name)
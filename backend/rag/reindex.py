@@ -0,0 +1,96 @@
+"""
+Inspect and tune the HNSW index of a Chroma collection.
+
+Run from the backend directory:
+
+    python -m rag.reindex show hp_victus_faq
+    python -m rag.reindex reindex hp_victus_faq --m 32 --construction-ef 200 --search-ef 64
+    python -m rag.reindex set-search-ef hp_victus_faq 128
+
+`show` prints the collection's HNSW settings, element count, on-disk index
+size and estimated index memory. `reindex` rebuilds the index with new
+settings from the stored embeddings into a new Chroma collection, switches
+the collection over to it and deletes the old index after --grace seconds.
+`set-search-ef` changes search_ef in place (chromadb >= 1.0).
+
+If the collection is the active one, its registry version is bumped so
+running workers reopen it. That only reaches the server when it uses a
+shared state backend (STATE_BACKEND=sqlite, as under gunicorn); with the
+in-memory backend restart the server instead.
+"""
+import argparse
+import hashlib
+import json
+import time
+import uuid
+
+from rag.rag import chroma_index_name, collection_index_stats, drop_chroma_index, reindex_collection, set_search_ef
+
+def _announce(collection_name: str, change: str):
+    """
+    Bump the active collection's version so workers reopen it. change must be
+    unique to this change (the new index's name, or a nonce): workers only
+    reopen when the version differs from the one they have.
+    """
+    import app_state
+
+    active = app_state.get_active_collection()
+    if not active or active["name"] != collection_name:
+        return False
+    suffix = hashlib.sha1(change.encode("utf-8")).hexdigest()[:8]
+    version = f"{active['version'].split('+', 1)[0]}+{suffix}"
+    app_state.get_state_backend().set(app_state.COLLECTIONS_NAMESPACE, "active", {"name": collection_name, "version": version})
+    print(f"Active collection version is now {version}")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and tune the HNSW index of a Chroma collection.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    show = subparsers.add_parser("show", help="Print HNSW settings, index size and estimated memory")
+    show.add_argument("collection")
+
+    reindex = subparsers.add_parser("reindex", help="Rebuild the index with new HNSW settings")
+    reindex.add_argument("collection")
+    reindex.add_argument("--m", type=int, help="hnsw:M, graph degree")
+    reindex.add_argument("--construction-ef", type=int, help="hnsw:construction_ef")
+    reindex.add_argument("--search-ef", type=int, help="hnsw:search_ef")
+    reindex.add_argument("--batch-size", type=int, help="hnsw:batch_size")
+    reindex.add_argument("--sync-threshold", type=int, help="hnsw:sync_threshold")
+    reindex.add_argument("--grace", type=float, default=30,
+                         help="Seconds workers get to reopen an active collection before its old index is deleted")
+
+    search_ef = subparsers.add_parser("set-search-ef", help="Change search_ef without rebuilding")
+    search_ef.add_argument("collection")
+    search_ef.add_argument("search_ef", type=int)
+
+    args = parser.parse_args()
+
+    if args.command == "reindex":
+        settings = {
+            key: value
+            for key, value in (
+                ("hnsw:M", args.m),
+                ("hnsw:construction_ef", args.construction_ef),
+                ("hnsw:search_ef", args.search_ef),
+                ("hnsw:batch_size", args.batch_size),
+                ("hnsw:sync_threshold", args.sync_threshold),
+            )
+            if value is not None
+        }
+        if not settings:
+            parser.error("reindex needs at least one HNSW setting")
+        previous = reindex_collection(args.collection, settings)
+        # Versioned per new index, so even a rerun with the same settings makes workers switch
+        if _announce(args.collection, chroma_index_name(args.collection)) and args.grace > 0:
+            print(f"Deleting the previous index {previous} in {args.grace:g}s")
+            time.sleep(args.grace)
+        drop_chroma_index(previous)
+    elif args.command == "set-search-ef":
+        set_search_ef(args.collection, args.search_ef)
+        _announce(args.collection, uuid.uuid4().hex)
+
+    print(json.dumps(collection_index_stats(args.collection), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# Per-user token-bucket rate limits and quotas.
+#
+# Each budget is a token bucket per authenticated user: it holds up to
+# `capacity` tokens and refills continuously over `period` seconds. Buckets
+# live in the shared state backend, so with STATE_BACKEND=memory they are
+# in-process (a dict lookup and a few float operations per check) and with
+# STATE_BACKEND=sqlite every worker on the host draws from the same buckets.
+#
+# Budgets:
+# - requests: /chat calls per minute (a /chat/batch call counts as one)
+# - llm_tokens: LLM tokens per day, checked before the graph runs and charged
+#   with the turn's actual usage afterwards (so a turn may overdraw it)
+# - uploads: /upload_document calls per hour
+#
+# Responses carry RateLimit-Limit / RateLimit-Remaining / RateLimit-Reset
+# headers for the endpoint's budget, and 429s add Retry-After.
+import math
+import time
+
+from fastapi import Depends, HTTPException, Response, status
+
+import config
+from auth import get_current_active_user
+from metrics import RATE_LIMITED
+from shared_state import get_state_backend
+
+NAMESPACE = "rate_limits"
+
+class TokenBucket:
+    def __init__(self, name: str, capacity: float, period: float):
+        self.name = name
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+
+    def _take(self, cost: float, allow_debt: bool, now: float):
+        def fn(state):
+            tokens, updated_at = state if state else (self.capacity, now)
+            tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate)
+            allowed = tokens >= cost
+            if allowed or allow_debt:
+                tokens -= cost
+            return [tokens, now], (allowed, tokens)
+        return fn
+
+    def consume(self, user_id: str, cost: float = 1, allow_debt: bool = False):
+        """Take cost tokens from the user's bucket. Returns (allowed, tokens left)."""
+        now = time.time()
+        return get_state_backend().update(NAMESPACE, f"{self.name}:{user_id}", self._take(cost, allow_debt, now), ttl=self._ttl)
+
+    def _ttl(self, state) -> float:
+        # Idle buckets expire once they would have refilled completely; an
+        # overdrawn bucket takes longer than one period, so its debt is kept
+        return max(1.0, (self.capacity - state[0]) / self.rate)
+
+    def peek(self, user_id: str) -> float:
+        """Tokens currently in the user's bucket, refill included. Read-only."""
+        state = get_state_backend().get(NAMESPACE, f"{self.name}:{user_id}")
+        if not state:
+            return self.capacity
+        tokens, updated_at = state
+        return min(self.capacity, tokens + max(0.0, time.time() - updated_at) * self.rate)
+
+    def headers(self, tokens: float, cost: float = 1) -> dict:
+        remaining = max(0, math.floor(tokens))
+        reset = math.ceil(max(0.0, self.capacity - tokens) / self.rate)
+        headers = {
+            "RateLimit-Limit": str(int(self.capacity)),
+            "RateLimit-Remaining": str(remaining),
+            "RateLimit-Reset": str(reset),
+        }
+        if tokens < cost:
+            headers["Retry-After"] = str(math.ceil((cost - tokens) / self.rate))
+        return headers
+
+requests_bucket = TokenBucket("requests", config.RATE_LIMIT_REQUESTS_PER_MINUTE, 60)
+llm_tokens_bucket = TokenBucket("llm_tokens", config.RATE_LIMIT_LLM_TOKENS_PER_DAY, 86400)
+uploads_bucket = TokenBucket("uploads", config.RATE_LIMIT_UPLOADS_PER_HOUR, 3600)
+
+def _enforce(bucket: TokenBucket, user_id: str, response: Response, cost: float = 1):
+    allowed, tokens = bucket.consume(user_id, cost)
+    headers = bucket.headers(tokens, cost=0 if allowed else cost)
+    if not allowed:
+        RATE_LIMITED.labels(bucket.name).inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit exceeded ({bucket.name}); retry in {headers['Retry-After']}s",
+            headers=headers,
+        )
+    response.headers.update(headers)
+
+async def limit_chat(response: Response, current_user = Depends(get_current_active_user)):
+    """Dependency for /chat: one request from the per-minute budget, and a non-empty daily token quota."""
+    if not config.RATE_LIMIT_ENABLED:
+        return
+    user_id = str(current_user.id)
+    # Peek at the token quota first so a user out of tokens doesn't also spend a request
+    tokens = llm_tokens_bucket.peek(user_id)
+    if tokens <= 0:
+        RATE_LIMITED.labels(llm_tokens_bucket.name).inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Daily LLM token quota exhausted",
+            headers=llm_tokens_bucket.headers(tokens, cost=1),
+        )
+    _enforce(requests_bucket, user_id, response)
+
+async def limit_upload(response: Response, current_user = Depends(get_current_active_user)):
+    """Dependency for /upload_document: one upload from the per-hour budget."""
+    if not config.RATE_LIMIT_ENABLED:
+        return
+    _enforce(uploads_bucket, str(current_user.id), response)
+
+def has_llm_tokens(user_id: str) -> bool:
+    """True unless the user's daily token quota is used up (does not consume any)."""
+    if not config.RATE_LIMIT_ENABLED:
+        return True
+    return llm_tokens_bucket.peek(str(user_id)) > 0
+
+def charge_llm_tokens(user_id: str, tokens: int):
+    """Charge a finished turn's LLM usage to the user's daily quota (may go negative)."""
+    if config.RATE_LIMIT_ENABLED and tokens > 0:
+        llm_tokens_bucket.consume(str(user_id), cost=tokens, allow_debt=True)
@@ -0,0 +1,269 @@
+# Retries, deadlines, circuit breaking and concurrency caps for upstream calls.
+#
+# GuardedRunnable wraps any LangChain runnable (a chat model, a model with
+# tools bound, a search tool). Every invoke gets an overall deadline, retries
+# 429/5xx/timeout errors with exponential backoff and full jitter, fails fast
+# while the upstream's circuit breaker is open, and waits for a slot under
+# the upstream's concurrency cap.
+#
+# A request-wide deadline can also be carried in the RunnableConfig as
+# config["configurable"]["deadline"] (a time.time() timestamp); calls then
+# stop at whichever of the two deadlines comes first. hedged() sends a
+# duplicate call when the first runs past the upstream's recent p95 latency.
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+
+from langchain_core.runnables import Runnable
+
+from metrics import UPSTREAM_CALLS, UPSTREAM_CIRCUIT_OPEN, UPSTREAM_HEDGES, UPSTREAM_RETRIES
+
+class UpstreamError(Exception):
+    pass
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+class UpstreamTimeoutError(UpstreamError, TimeoutError):
+    pass
+
+class ConcurrencyLimitError(UpstreamError):
+    pass
+
+class DeadlineExceededError(UpstreamTimeoutError):
+    """The request's overall deadline ran out, rather than the upstream's own timeout."""
+
+def request_deadline(config):
+    """The request-wide deadline (time.time() timestamp) carried in a RunnableConfig, or None."""
+    return ((config or {}).get("configurable") or {}).get("deadline")
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_NAMES = {
+    "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "InternalServerError",
+    "TooManyRequests", "RateLimitError", "ConnectError", "ReadTimeout", "ConnectTimeout",
+}
+
+def status_code_of(exc: Exception):
+    for attr in ("status_code", "code", "http_status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+def is_retryable(exc: Exception) -> bool:
+    """429s, 5xx, timeouts and connection errors are worth retrying; anything else is not."""
+    if isinstance(exc, (UpstreamTimeoutError, TimeoutError, ConnectionError)):
+        return True
+    if status_code_of(exc) in RETRYABLE_STATUS:
+        return True
+    return type(exc).__name__ in RETRYABLE_NAMES
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for
+    reset_timeout seconds, then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+        UPSTREAM_CIRCUIT_OPEN.labels(self.name).set(0)
+
+    def release_trial(self):
+        """End a call that was let through without recording an outcome, so a half-open trial can be retried."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                opened = True
+            else:
+                opened = False
+        if opened:
+            UPSTREAM_CIRCUIT_OPEN.labels(self.name).set(1)
+
+class LatencyTracker:
+    """Latencies of an upstream's most recent successful calls."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float, min_samples: int = 1):
+        """The pct-th percentile latency, or None with fewer than min_samples samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+class UpstreamPolicy:
+    """Resilience settings and shared state (breaker, concurrency cap) for one upstream."""
+
+    def __init__(self, name: str, timeout: float, max_retries: int, backoff_base: float, backoff_max: float,
+                 max_concurrency: int, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.latency = LatencyTracker()
+
+    def backoff(self, attempt: int) -> float:
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+# Calls run on this pool so a hung upstream call can be abandoned at its
+# deadline instead of holding the request's worker thread indefinitely.
+_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="upstream")
+
+class GuardedRunnable(Runnable):
+    """Runnable wrapper applying an UpstreamPolicy to every invoke."""
+
+    def __init__(self, inner, policy: UpstreamPolicy):
+        self.inner = inner
+        self.policy = policy
+
+    def invoke(self, input, config=None, **kwargs):
+        policy = self.policy
+        deadline = time.monotonic() + policy.timeout
+        # A tighter request deadline cuts the call short without counting against the upstream
+        cut_short = False
+        request_end = request_deadline(config)
+        if request_end is not None:
+            remaining = request_end - time.time()
+            if remaining <= 0:
+                UPSTREAM_CALLS.labels(policy.name, "deadline").inc()
+                raise DeadlineExceededError(f"Request deadline passed before the {policy.name} call")
+            if time.monotonic() + remaining < deadline:
+                deadline = time.monotonic() + remaining
+                cut_short = True
+        attempt = 0
+        while True:
+            if not policy.breaker.allow():
+                UPSTREAM_CALLS.labels(policy.name, "circuit_open").inc()
+                raise CircuitOpenError(f"{policy.name} circuit is open; failing fast")
+            started = time.monotonic()
+            try:
+                result = self._call_once(input, config, deadline, **kwargs)
+            except ConcurrencyLimitError:
+                # Never reached the upstream: no outcome to record
+                policy.breaker.release_trial()
+                UPSTREAM_CALLS.labels(policy.name, "rejected").inc()
+                raise
+            except Exception as e:
+                if cut_short and isinstance(e, UpstreamTimeoutError):
+                    # Not the upstream's fault either way; let the next call be the trial
+                    policy.breaker.release_trial()
+                    UPSTREAM_CALLS.labels(policy.name, "deadline").inc()
+                    raise DeadlineExceededError(f"{policy.name} call cut off by the request deadline") from e
+                retryable = is_retryable(e)
+                if retryable:
+                    policy.breaker.record_failure()
+                else:
+                    # The upstream answered; a bad request is not an outage
+                    policy.breaker.record_success()
+                UPSTREAM_CALLS.labels(policy.name, "error").inc()
+                delay = policy.backoff(attempt)
+                if not retryable or attempt >= policy.max_retries or time.monotonic() + delay >= deadline:
+                    raise
+                attempt += 1
+                UPSTREAM_RETRIES.labels(policy.name).inc()
+                time.sleep(delay)
+                continue
+            policy.latency.record(time.monotonic() - started)
+            policy.breaker.record_success()
+            UPSTREAM_CALLS.labels(policy.name, "ok").inc()
+            return result
+
+    def _call_once(self, input, config, deadline, **kwargs):
+        policy = self.policy
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not policy.semaphore.acquire(timeout=remaining):
+            raise ConcurrencyLimitError(f"No {policy.name} capacity available before the deadline")
+        try:
+            future = _executor.submit(contextvars.copy_context().run, self.inner.invoke, input, config, **kwargs)
+        except Exception:
+            policy.semaphore.release()
+            raise
+        # The slot is released when the call really finishes, even if we stop waiting
+        future.add_done_callback(lambda _: policy.semaphore.release())
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            raise UpstreamTimeoutError(f"{policy.name} call did not finish before its deadline")
+
+    # Keep the chat-model conveniences used by callers; the result shares this policy.
+    def bind_tools(self, tools, **kwargs):
+        return GuardedRunnable(self.inner.bind_tools(tools, **kwargs), self.policy)
+
+    def with_structured_output(self, schema, **kwargs):
+        return GuardedRunnable(self.inner.with_structured_output(schema, **kwargs), self.policy)
+
+# Hedged attempts run here; each is itself a GuardedRunnable.invoke waiting on _executor
+_hedge_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="hedge")
+
+def hedged(runnable: GuardedRunnable, input, config=None, percentile: float = 95, min_samples: int = 20):
+    """
+    Invoke a guarded runnable; if it hasn't answered within the upstream's
+    recent p<percentile> latency, send one duplicate and return whichever
+    succeeds first. Without min_samples recent latencies it is a plain invoke.
+    Both attempts count against the upstream's concurrency cap.
+    """
+    policy = runnable.policy
+    hedge_after = policy.latency.percentile(percentile, min_samples)
+    if hedge_after is None:
+        return runnable.invoke(input, config)
+    first = _hedge_executor.submit(contextvars.copy_context().run, runnable.invoke, input, config)
+    done, _ = wait([first], timeout=hedge_after)
+    if done:
+        return first.result()
+    UPSTREAM_HEDGES.labels(policy.name, "sent").inc()
+    second = _hedge_executor.submit(contextvars.copy_context().run, runnable.invoke, input, config)
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is second:
+                    UPSTREAM_HEDGES.labels(policy.name, "won").inc()
+                return future.result()
+            error = future.exception()
+    raise error
@@ -0,0 +1,26 @@
+# Cache of chatbot answers keyed by collection version and normalized query.
+#
+# Entries live in the shared state backend so every worker sees them. Keys
+# include the collection version, so re-indexing a document naturally
+# invalidates answers computed against the old index.
+import re
+
+import config
+from shared_state import get_state_backend
+
+NAMESPACE = "response_cache"
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip(" ?!.")
+
+def cache_key(collection_name: str, version: str, query: str) -> str:
+    return f"{collection_name}@{version}:{normalize_query(query)}"
+
+def get_cached_response(collection_name: str, version: str, query: str):
+    return get_state_backend().get(NAMESPACE, cache_key(collection_name, version, query))
+
+def store_response(collection_name: str, version: str, query: str, response: str, ttl: float = None):
+    ttl = config.RESPONSE_CACHE_TTL if ttl is None else ttl
+    get_state_backend().set(NAMESPACE, cache_key(collection_name, version, query), response, ttl=ttl or None)
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+import collection_lifecycle
+import config
+from auth import get_current_active_user
+
+router = APIRouter(tags=["collections"])
+
+@router.get("")
+async def list_collections(current_user = Depends(get_current_active_user)):
+    """
+    Every collection with its chunk count, size on disk and usage counts.
+    Upload filenames and the owner are only shown for the caller's own
+    collections, or to the operators in USAGE_ADMIN_USERNAMES.
+    """
+    # Opens the vector store and walks its files; keep it off the event loop
+    collections = await run_in_threadpool(collection_lifecycle.list_collections)
+    user_id = str(current_user.id)
+    is_admin = current_user.username in config.USAGE_ADMIN_USERNAMES
+    for collection in collections:
+        collection["owned"] = collection["owner"] == user_id
+        if not (is_admin or collection["owned"]):
+            del collection["uploads"], collection["owner"]
+    return {"collections": collections}
+
+@router.delete("/{collection_name}")
+async def delete_collection(collection_name: str, current_user = Depends(get_current_active_user)):
+    """Delete a collection the current user uploaded, with its FAQ index and upload files."""
+    refs = collection_lifecycle.get_refs(collection_name)
+    if refs is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Collection not found")
+    if refs.get("owner") != str(current_user.id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only the user who uploaded a collection can delete it")
+    try:
+        return await run_in_threadpool(collection_lifecycle.delete_collection, collection_name)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
@@ -0,0 +1,136 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+import base64
+import hashlib
+
+from database import ChatSession, ChatMessage, get_db
+from schema import ChatSessionResponse, ChatMessageResponse, ChatSessionPage, ChatMessagePage
+from auth import get_current_active_user
+
+router = APIRouter(tags=["history"])
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(timestamp: datetime, row_id: UUID) -> str:
+    """Encode a (timestamp, id) keyset position as an opaque cursor string."""
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    """Decode a cursor produced by encode_cursor back into (timestamp, id)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), UUID(row_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def page_etag(rows, timestamp_attr: str, next_cursor: Optional[str]) -> str:
+    """Weak ETag over the ids and timestamps of a page, so unchanged pages can return 304."""
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update(f"{row.id}:{getattr(row, timestamp_attr).isoformat()};".encode())
+    digest.update((next_cursor or "").encode())
+    return f'W/"{digest.hexdigest()}"'
+
+def not_modified(request: Request, response: Response, etag: str) -> bool:
+    """Set the ETag header and report whether the client's If-None-Match already matches it."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+def keyset_page(query, timestamp_col, id_col, before: Optional[str], limit: int):
+    """Fetch one newest-first page using keyset pagination on (timestamp, id)."""
+    if before:
+        cursor_ts, cursor_id = decode_cursor(before)
+        query = query.filter(tuple_(timestamp_col, id_col) < tuple_(cursor_ts, cursor_id))
+    # Fetch one extra row to know whether an older page exists without a COUNT query
+    rows = query.order_by(timestamp_col.desc(), id_col.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, timestamp_col.key), last.id)
+    return rows, next_cursor
+
+@router.get("/sessions", response_model=ChatSessionPage)
+async def list_chat_sessions(
+    request: Request,
+    response: Response,
+    before: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """List the current user's chat sessions, most recently updated first."""
+    query = db.query(ChatSession).filter(ChatSession.user_id == current_user.id)
+    rows, next_cursor = keyset_page(query, ChatSession.last_updated, ChatSession.id, before, limit)
+
+    if not_modified(request, response, page_etag(rows, "last_updated", next_cursor)):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(response.headers))
+
+    sessions = [
+        ChatSessionResponse(
+            id=row.id,
+            user_id=row.user_id,
+            session_name=row.session_name,
+            created_at=row.created_at,
+            last_updated=row.last_updated
+        )
+        for row in rows
+    ]
+    return ChatSessionPage(sessions=sessions, next_cursor=next_cursor)
+
+@router.get("/sessions/{chat_session_id}/messages", response_model=ChatMessagePage)
+async def list_chat_messages(
+    chat_session_id: UUID,
+    request: Request,
+    response: Response,
+    before: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Return one page of a session's history.
+
+    Pages are walked backwards in time: the first request returns the newest
+    turns, and next_cursor fetches older ones. Messages inside a page are in
+    chronological order so clients can prepend a page as-is.
+    """
+    chat_session = db.query(ChatSession).filter(
+        ChatSession.id == chat_session_id,
+        ChatSession.user_id == current_user.id
+    ).first()
+    if not chat_session:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found")
+
+    query = db.query(ChatMessage).filter(ChatMessage.chat_session_id == chat_session_id)
+    rows, next_cursor = keyset_page(query, ChatMessage.timestamp, ChatMessage.id, before, limit)
+
+    if not_modified(request, response, page_etag(rows, "timestamp", next_cursor)):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(response.headers))
+
+    # Each stored row holds one turn (query + response); expand it into chat messages
+    messages = []
+    for row in reversed(rows):
+        if row.user_query:
+            messages.append(ChatMessageResponse(
+                id=row.id, chat_session_id=row.chat_session_id,
+                content=row.user_query, is_user=True, timestamp=row.timestamp
+            ))
+        if row.llm_resp:
+            messages.append(ChatMessageResponse(
+                id=row.id, chat_session_id=row.chat_session_id,
+                content=row.llm_resp, is_user=False, timestamp=row.timestamp
+            ))
+    return ChatMessagePage(messages=messages, next_cursor=next_cursor)
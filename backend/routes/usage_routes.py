@@ -0,0 +1,99 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+
+import config
+from database import TurnMetrics, User, get_db
+from auth import get_current_active_user
+
+router = APIRouter(tags=["usage"])
+
+MAX_DAYS = 366
+
+def require_usage_admin(current_user = Depends(get_current_active_user)):
+    """Usage across all users is only for the operators listed in USAGE_ADMIN_USERNAMES."""
+    if current_user.username not in config.USAGE_ADMIN_USERNAMES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to view usage of other users")
+    return current_user
+
+def _aggregates():
+    """Columns summarizing a group of turns."""
+    return [
+        func.count(TurnMetrics.id).label("turns"),
+        func.coalesce(func.sum(TurnMetrics.prompt_tokens), 0).label("prompt_tokens"),
+        func.coalesce(func.sum(TurnMetrics.completion_tokens), 0).label("completion_tokens"),
+        func.coalesce(func.sum(TurnMetrics.web_searches), 0).label("web_searches"),
+        func.coalesce(func.sum(case((TurnMetrics.cache != "miss", 1), else_=0)), 0).label("cache_hits"),
+        func.coalesce(func.sum(case((TurnMetrics.status != "ok", 1), else_=0)), 0).label("errors"),
+        func.avg(TurnMetrics.total_ms).label("avg_total_ms"),
+        func.max(TurnMetrics.total_ms).label("max_total_ms"),
+        func.avg(TurnMetrics.retrieval_ms).label("avg_retrieval_ms"),
+    ]
+
+def _rows(query, key: str) -> list:
+    results = []
+    for row in query.all():
+        item = dict(row._mapping)
+        item[key] = str(item[key]) if item[key] is not None else None
+        for field in ("avg_total_ms", "max_total_ms", "avg_retrieval_ms"):
+            if item[field] is not None:
+                item[field] = round(float(item[field]), 1)
+        results.append(item)
+    return results
+
+def _since(days: int) -> datetime:
+    return datetime.now() - timedelta(days=days)
+
+@router.get("/me")
+async def my_usage(days: int = Query(30, ge=1, le=MAX_DAYS), db: Session = Depends(get_db),
+                   current_user = Depends(get_current_active_user)):
+    """The current user's turns, tokens, searches and latency per day."""
+    day = func.date(TurnMetrics.created_at).label("day")
+    query = (
+        db.query(day, *_aggregates())
+        .filter(TurnMetrics.user_id == current_user.id, TurnMetrics.created_at >= _since(days))
+        .group_by(day)
+        .order_by(day.desc())
+    )
+    return {"days": _rows(query, "day")}
+
+@router.get("/by-user")
+async def usage_by_user(days: int = Query(30, ge=1, le=MAX_DAYS), limit: int = Query(50, ge=1, le=1000),
+                        db: Session = Depends(get_db), admin = Depends(require_usage_admin)):
+    """Most expensive users by total tokens."""
+    total_tokens = func.coalesce(func.sum(TurnMetrics.prompt_tokens + TurnMetrics.completion_tokens), 0)
+    query = (
+        db.query(TurnMetrics.user_id, User.username, *_aggregates())
+        .outerjoin(User, User.id == TurnMetrics.user_id)
+        .filter(TurnMetrics.created_at >= _since(days))
+        .group_by(TurnMetrics.user_id, User.username)
+        .order_by(total_tokens.desc())
+        .limit(limit)
+    )
+    return {"users": _rows(query, "user_id")}
+
+@router.get("/by-day")
+async def usage_by_day(days: int = Query(30, ge=1, le=MAX_DAYS), db: Session = Depends(get_db),
+                       admin = Depends(require_usage_admin)):
+    """All users' turns, tokens, searches and latency per day."""
+    day = func.date(TurnMetrics.created_at).label("day")
+    query = (
+        db.query(day, *_aggregates())
+        .filter(TurnMetrics.created_at >= _since(days))
+        .group_by(day)
+        .order_by(day.desc())
+    )
+    return {"days": _rows(query, "day")}
+
+@router.get("/by-collection")
+async def usage_by_collection(days: int = Query(30, ge=1, le=MAX_DAYS), db: Session = Depends(get_db),
+                              admin = Depends(require_usage_admin)):
+    """Turns, tokens, searches and latency per collection."""
+    query = (
+        db.query(TurnMetrics.collection, *_aggregates())
+        .filter(TurnMetrics.created_at >= _since(days))
+        .group_by(TurnMetrics.collection)
+        .order_by(func.count(TurnMetrics.id).desc())
+    )
+    return {"collections": _rows(query, "collection")}
@@ -1,6 +1,4 @@
 from pydantic import BaseModel, Field, EmailStr
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.store.memory import InMemoryStore
 from typing import Optional, List
 from uuid import UUID
 from datetime import datetime
@@ -59,8 +57,22 @@ class ChatMessageResponse(BaseModel):
     is_user: bool
     timestamp: datetime
 
+# Paginated history responses. next_cursor is opaque to clients and is passed
+# back as ?before=... to fetch the next (older) page; None means no more pages.
+class ChatSessionPage(BaseModel):
+    sessions: List[ChatSessionResponse]
+    next_cursor: Optional[str] = None
+
+class ChatMessagePage(BaseModel):
+    messages: List[ChatMessageResponse]
+    next_cursor: Optional[str] = None
+
+# Both memories come from the configured shared state backend (in-memory for a
+# single worker, SQLite files when several workers must see the same state).
 def get_across_thread_memory():
-    return InMemoryStore()
+    from shared_state import get_state_backend
+    return get_state_backend().get_store()
 
 def get_within_thread_memory():
-    return MemorySaver()
\ No newline at end of file
+    from shared_state import get_state_backend
+    return get_state_backend().get_checkpointer()
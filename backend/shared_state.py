@@ -0,0 +1,227 @@
+# Pluggable backend for state that must be shared between worker processes.
+#
+# Single-process deployments use the in-memory backend (the previous
+# behaviour). With more than one uvicorn/gunicorn worker, set
+# STATE_BACKEND=sqlite so conversation checkpoints, user memory, the active
+# collection registry and the response cache live in files under STATE_DIR
+# that every worker on the host sees. Other backends (e.g. Redis or Postgres)
+# can be added by implementing StateBackend.
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+import config
+
+class StateBackend:
+    """Namespaced key/value store plus the LangGraph checkpointer and store."""
+
+    def get(self, namespace: str, key: str, default=None):
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, value, ttl: float = None):
+        raise NotImplementedError
+
+    def set_if_absent(self, namespace: str, key: str, value, ttl: float = None) -> bool:
+        """Atomically set key unless it exists (and has not expired). Returns True if set."""
+        raise NotImplementedError
+
+    def update(self, namespace: str, key: str, fn, ttl: float = None):
+        """
+        Atomically read-modify-write a key. fn(current value or None) returns
+        (new value, result); the new value is stored and result returned.
+        ttl may also be a function of the new value returning the TTL.
+        """
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str):
+        raise NotImplementedError
+
+    def items(self, namespace: str) -> dict:
+        raise NotImplementedError
+
+    def get_checkpointer(self):
+        """LangGraph checkpointer for within-thread conversation state."""
+        raise NotImplementedError
+
+    def get_store(self):
+        """LangGraph store for across-thread user memory."""
+        raise NotImplementedError
+
+class InMemoryStateBackend(StateBackend):
+    """Process-local state. Only correct with a single worker."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, namespace, key):
+        entry = self._data.get((namespace, key))
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[(namespace, key)]
+            return None
+        return entry
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            entry = self._live(namespace, key)
+        return default if entry is None else entry[0]
+
+    def set(self, namespace, key, value, ttl=None):
+        with self._lock:
+            self._data[(namespace, key)] = (value, time.time() + ttl if ttl else None)
+
+    def set_if_absent(self, namespace, key, value, ttl=None):
+        with self._lock:
+            if self._live(namespace, key) is not None:
+                return False
+            self._data[(namespace, key)] = (value, time.time() + ttl if ttl else None)
+            return True
+
+    def update(self, namespace, key, fn, ttl=None):
+        with self._lock:
+            entry = self._live(namespace, key)
+            value, result = fn(None if entry is None else entry[0])
+            if callable(ttl):
+                ttl = ttl(value)
+            self._data[(namespace, key)] = (value, time.time() + ttl if ttl else None)
+            return result
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def items(self, namespace):
+        with self._lock:
+            keys = [k for (ns, k) in self._data if ns == namespace]
+            return {k: entry[0] for k in keys if (entry := self._live(namespace, k)) is not None}
+
+    def get_checkpointer(self):
+        from langgraph.checkpoint.memory import MemorySaver
+        return MemorySaver()
+
+    def get_store(self):
+        from langgraph.store.memory import InMemoryStore
+        return InMemoryStore()
+
+class SQLiteStateBackend(StateBackend):
+    """
+    File-backed state shared by all processes on one host.
+
+    Values are stored as JSON. Each thread gets its own connection; WAL mode
+    lets readers in other workers proceed while one worker writes.
+    """
+
+    def __init__(self, state_dir: str):
+        os.makedirs(state_dir, exist_ok=True)
+        self.state_dir = state_dir
+        self.kv_path = os.path.join(state_dir, "kv.db")
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.kv_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key, default=None):
+        row = self._connect().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, namespace, key, value, ttl=None):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), time.time() + ttl if ttl else None),
+        )
+
+    def set_if_absent(self, namespace, key, value, ttl=None):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND key = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                (namespace, key, now),
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + ttl if ttl else None),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def update(self, namespace, key, fn, ttl=None):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, now),
+            ).fetchone()
+            value, result = fn(None if row is None else json.loads(row[0]))
+            if callable(ttl):
+                ttl = ttl(value)
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + ttl if ttl else None),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def delete(self, namespace, key):
+        self._connect().execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def items(self, namespace):
+        rows = self._connect().execute(
+            "SELECT key, value FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, time.time()),
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def get_checkpointer(self):
+        # Needs the langgraph-checkpoint-sqlite package
+        from langgraph.checkpoint.sqlite import SqliteSaver
+        conn = sqlite3.connect(os.path.join(self.state_dir, "checkpoints.db"), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return SqliteSaver(conn)
+
+    def get_store(self):
+        from langgraph.store.sqlite import SqliteStore
+        conn = sqlite3.connect(os.path.join(self.state_dir, "store.db"), check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        store = SqliteStore(conn)
+        store.setup()
+        return store
+
+@lru_cache(maxsize=None)
+def get_state_backend() -> StateBackend:
+    """Return the configured backend (one instance per process)."""
+    if config.STATE_BACKEND == "sqlite":
+        return SQLiteStateBackend(config.STATE_DIR)
+    if config.STATE_BACKEND == "memory":
+        return InMemoryStateBackend()
+    raise ValueError(f"Unknown STATE_BACKEND: {config.STATE_BACKEND}")
@@ -0,0 +1,57 @@
+# Single-flight: concurrent identical calls share one execution.
+#
+# The first caller for a key (the leader) runs the work; callers arriving
+# with the same key while it is in flight (followers) await the leader's
+# result, or its exception, instead of starting their own run. If the leader
+# is cancelled (its client went away), waiting followers retry and one of them
+# becomes the new leader. Nothing is kept once the leader finishes, so this is
+# not a cache. Coalescing is per worker process.
+import asyncio
+
+from metrics import CHAT_COALESCED
+
+def _cancelling() -> bool:
+    """Whether the current task itself is being cancelled (Task.cancelling needs Python 3.11)."""
+    cancelling = getattr(asyncio.current_task(), "cancelling", None)
+    return bool(cancelling and cancelling())
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn, scope: str = "default"):
+        """
+        Await fn() once per key at a time. Returns (result, shared), where
+        shared is True for followers that received another caller's result.
+        """
+        while (future := self._calls.get(key)) is not None:
+            CHAT_COALESCED.labels(scope).inc()
+            try:
+                # Shield so a follower giving up does not cancel the leader's run
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                # Only the leader was cancelled: run the work in its place
+                if not future.cancelled() or _cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark it retrieved; with no followers nobody else will
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
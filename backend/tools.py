@@ -2,8 +2,7 @@
 import os
 from dotenv import load_dotenv
 
-# Import Tavily search tool
-from langchain_tavily import TavilySearch
+import config
 
 # Define a function to get the Tavily search tool
 def get_tavily_tool():
@@ -12,5 +11,22 @@ def get_tavily_tool():
     load_dotenv()
     # Ensure TAVILY_API_KEY is set in environment variables
     os.environ["TAVILY_API_KEY"] = os.getenv("TAVILY_API_KEY")
+    # Import Tavily search tool lazily, on first use
+    from langchain_tavily import TavilySearch
     # Return a TavilySearchResults instance with a maximum of 5 results
-    return TavilySearch(max_results=5)
\ No newline at end of file
+    return TavilySearch(max_results=5)
+
+def get_search_tool():
+    """Return the web search tool for the configured provider (SEARCH_PROVIDER)."""
+    if config.SEARCH_PROVIDER == "fake":
+        from fakes import FakeSearchTool
+        return FakeSearchTool(
+            max_results=5,
+            latency_median_ms=config.FAKE_SEARCH_LATENCY_MEDIAN_MS,
+            latency_p95_ms=config.FAKE_SEARCH_LATENCY_P95_MS,
+            error_rate=config.FAKE_SEARCH_ERROR_RATE,
+            seed=config.FAKE_SEED,
+        )
+    if config.SEARCH_PROVIDER == "tavily":
+        return get_tavily_tool()
+    raise ValueError(f"Unknown SEARCH_PROVIDER: {config.SEARCH_PROVIDER}")
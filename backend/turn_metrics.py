@@ -0,0 +1,184 @@
+# Per-turn token and latency accounting, persisted to the turn_metrics table.
+#
+# record_turn() opens a record for one chat turn in a context variable; the
+# LLM layer, retrieval and web search add to it as they run (the dict is
+# mutated in place, so threadpool and graph executor context copies see the
+# same record). When the turn ends the record is queued, and a background
+# thread writes queued records in batches of up to TURN_METRICS_BATCH_SIZE
+# rows, at least every TURN_METRICS_FLUSH_SECONDS. The request path never
+# waits on the database; if the queue is full, records are dropped and
+# counted rather than slowing chat down.
+import logging
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+import config
+from metrics import TURN_METRICS_DROPPED
+
+logger = logging.getLogger(__name__)
+
+_current_turn: ContextVar[dict] = ContextVar("current_turn", default=None)
+
+def current_turn():
+    """The record of the turn being answered in this context, or None."""
+    return _current_turn.get()
+
+def add(field: str, amount: float):
+    """Add to a numeric field of the current turn's record, if there is one."""
+    turn = _current_turn.get()
+    if turn is not None:
+        turn[field] = (turn.get(field) or 0) + amount
+
+def set_field(field: str, value):
+    """Set a field of the current turn's record, if there is one."""
+    turn = _current_turn.get()
+    if turn is not None:
+        turn[field] = value
+
+def add_llm_call(step: str, model: str, prompt_tokens: int, completion_tokens: int, seconds: float):
+    turn = _current_turn.get()
+    if turn is None:
+        return
+    turn["llm_calls"].append({
+        "step": step, "model": model,
+        "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+        "ms": round(seconds * 1000, 1),
+    })
+    turn["prompt_tokens"] += prompt_tokens
+    turn["completion_tokens"] += completion_tokens
+    if step == "answer":
+        turn["model"] = model
+
+@contextmanager
+def record_turn(user_id, chat_session_id: str = None, endpoint: str = "chat", collection: dict = None):
+    """
+    Account one chat turn. Set turn["cache"] inside the block when the answer
+    did not come from a graph run; the record is queued when the block exits.
+    """
+    turn = {
+        "id": uuid.uuid4(),
+        "user_id": uuid.UUID(str(user_id)),
+        "chat_session_id": chat_session_id,
+        "collection": collection["name"] if collection else None,
+        "collection_version": collection["version"] if collection else None,
+        "endpoint": endpoint,
+        "cache": "miss",
+        "status": "ok",
+        "model": None,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "llm_calls": [],
+        "web_searches": 0,
+        "retrieval_ms": None,
+        "created_at": datetime.now(),
+    }
+    token = _current_turn.set(turn)
+    start = time.perf_counter()
+    try:
+        yield turn
+    except BaseException:
+        turn["status"] = "error"
+        raise
+    finally:
+        _current_turn.reset(token)
+        turn["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if config.TURN_METRICS_ENABLED:
+            get_writer().submit(turn)
+
+class TurnMetricsWriter:
+    """Background thread inserting queued turn records in batches."""
+
+    def __init__(self, session_factory, batch_size: int, flush_seconds: float, max_queue: int):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue(maxsize=max_queue)
+        # Held while a batch is being written, so flush() can wait for it
+        self._writing = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="turn-metrics-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, turn: dict):
+        try:
+            self._queue.put_nowait(turn)
+        except queue.Full:
+            TURN_METRICS_DROPPED.inc()
+
+    def _take_batch(self) -> list:
+        batch = []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Flush request: write what we have now
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                with self._writing:
+                    self._write(batch)
+
+    def _write(self, batch: list):
+        from sqlalchemy import insert
+        from database import TurnMetrics
+
+        db = self.session_factory()
+        try:
+            db.execute(insert(TurnMetrics), batch)
+            db.commit()
+        except Exception:
+            db.rollback()
+            TURN_METRICS_DROPPED.inc(len(batch))
+            logger.exception("Failed to write turn metrics", extra={"rows": len(batch)})
+        finally:
+            db.close()
+
+    def flush(self, timeout: float = 5.0):
+        """Write everything queued so far (used at shutdown)."""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if self._writing.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self._writing.release()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer() -> TurnMetricsWriter:
+    """The process-wide writer, started on first use (so after a gunicorn fork)."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                from database import chat_db_instance
+                _writer = TurnMetricsWriter(
+                    chat_db_instance.SessionLocal,
+                    batch_size=config.TURN_METRICS_BATCH_SIZE,
+                    flush_seconds=config.TURN_METRICS_FLUSH_SECONDS,
+                    max_queue=config.TURN_METRICS_MAX_QUEUE,
+                )
+    return _writer
+
+def flush():
+    """Write queued records now, if the writer was ever started."""
+    if _writer is not None:
+        _writer.flush()
@@ -0,0 +1,164 @@
+# Document uploads: streamed to disk in constant memory, hashed on the fly and
+# stored under their content digest.
+#
+# Starlette parses and spools the whole multipart body before the endpoint
+# runs, so UploadSizeLimitMiddleware caps the request body itself: a
+# Content-Length over the limit is refused before anything is read, and a
+# body that turns out larger is cut off with 413 while it is received.
+# The upload is then copied in chunks to a temp file in UPLOAD_DIR while its
+# SHA-256 is computed, rejected with 413 as soon as it exceeds
+# UPLOAD_MAX_BYTES, then atomically renamed to <sha256><ext>. The client's
+# filename is only used to derive a sanitized collection name, never as a
+# path. A digest that was already ingested maps straight back to its
+# collection, so duplicate uploads skip parsing and embedding.
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+
+import config
+from shared_state import get_state_backend
+
+logger = logging.getLogger(__name__)
+
+# Digest -> {"collection", "filename"} for every ingested upload
+UPLOADS_NAMESPACE = "uploads"
+# File types load_documents can parse
+ALLOWED_EXTENSIONS = {".pdf", ".txt"}
+# Room for multipart boundaries and part headers on top of UPLOAD_MAX_BYTES
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+@dataclass
+class StoredUpload:
+    path: str
+    digest: str
+    size: int
+    filename: str
+    is_new: bool
+
+    @property
+    def version(self) -> str:
+        # Same short digest app_state.file_digest uses as a collection version
+        return self.digest[:16]
+
+def collection_name_for(filename: str) -> str:
+    """Collection name from an upload's filename (without extension), sanitized for Chroma."""
+    base_name = os.path.basename(filename or "").split('.')[0]
+    collection_name = re.sub(r'[^a-zA-Z0-9._-]', '_', base_name)
+    # Ensure the name starts and ends with an alphanumeric character
+    collection_name = re.sub(r'^[^a-zA-Z0-9]+', '', collection_name)
+    collection_name = re.sub(r'[^a-zA-Z0-9]+$', '', collection_name)
+    from rag.rag import suffixed_collection_name
+    # Ensure it's not empty after sanitization, and within Chroma's length limit
+    return suffixed_collection_name(collection_name or "uploaded_document", "")
+
+class UploadSizeLimitMiddleware:
+    """
+    Pure ASGI middleware limiting the request body of upload endpoints to
+    max_bytes (plus multipart overhead), before the form is parsed.
+    """
+
+    def __init__(self, app, paths, max_bytes: int = None):
+        self.app = app
+        self.paths = set(paths)
+        self.max_body = (max_bytes or config.UPLOAD_MAX_BYTES) + FORM_OVERHEAD_BYTES
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body exceeds the {self.max_body - FORM_OVERHEAD_BYTES} byte upload limit"
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_body:
+                from fastapi.responses import JSONResponse
+                response = JSONResponse({"detail": detail}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # Raised inside the endpoint's form parsing, so it becomes a 413 response
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+            return message
+
+        await self.app(scope, receive_limited, send)
+
+async def store_upload(file: UploadFile, upload_dir: str = None, max_bytes: int = None) -> StoredUpload:
+    """
+    Copy a parsed upload into the content-addressed store. Raises 413 / 415
+    HTTP errors. The request body was already capped by UploadSizeLimitMiddleware.
+    """
+    upload_dir = upload_dir or config.UPLOAD_DIR
+    max_bytes = max_bytes or config.UPLOAD_MAX_BYTES
+    extension = os.path.splitext(os.path.basename(file.filename or ""))[1].lower()
+    if extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported file type '{extension}'. Allowed: {', '.join(sorted(ALLOWED_EXTENSIONS))}",
+        )
+
+    os.makedirs(upload_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            while True:
+                chunk = await file.read(config.UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File exceeds the {max_bytes} byte upload limit",
+                    )
+                digest.update(chunk)
+                await run_in_threadpool(tmp.write, chunk)
+        hex_digest = digest.hexdigest()
+        path = os.path.join(upload_dir, f"{hex_digest}{extension}")
+        is_new = not os.path.exists(path)
+        if is_new:
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return StoredUpload(path=path, digest=hex_digest, size=size, filename=file.filename, is_new=is_new)
+
+def find_ingested(upload: StoredUpload):
+    """Name of the collection this exact content was already ingested into, if it still exists."""
+    entry = get_state_backend().get(UPLOADS_NAMESPACE, upload.digest)
+    if entry is None:
+        return None
+    from rag.rag import load_vector_store
+    vectorstore = load_vector_store(entry["collection"])
+    return (entry["collection"], vectorstore) if vectorstore is not None else None
+
+def ingest_upload(upload: StoredUpload, collection_name: str):
+    """Parse, split and embed a stored upload into a collection (plus its FAQ index). Blocking."""
+    from rag.rag import create_vector_store, load_documents, split_documents
+
+    documents = load_documents(upload.path)
+    splits = split_documents(documents)
+    vectorstore = create_vector_store(splits, collection_name=collection_name)
+    if config.FAQ_INDEX_ENABLED:
+        from rag.faq import build_faq_index
+        build_faq_index(documents, collection_name)
+    get_state_backend().set(UPLOADS_NAMESPACE, upload.digest, {"collection": collection_name, "filename": upload.filename})
+    logger.info("Ingested upload", extra={"collection": collection_name, "digest": upload.digest, "bytes": upload.size})
+    return vectorstore
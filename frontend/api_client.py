@@ -0,0 +1,64 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds. Chat turns run retrieval, web search and
+# several LLM calls, so the read timeout is generous; connects should be fast.
+DEFAULT_TIMEOUT = (3.05, 30)
+CHAT_TIMEOUT = (3.05, 180)
+UPLOAD_TIMEOUT = (3.05, 600)
+
+# Only idempotent methods are retried on read errors / 5xx. POSTs are retried
+# on connection errors only, where the request never reached the server.
+RETRY_POLICY = Retry(
+    total=3,
+    connect=3,
+    read=2,
+    status=2,
+    backoff_factor=0.5,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+@st.cache_resource
+def get_http_session():
+    """One pooled keep-alive session shared by every Streamlit script run and user."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=RETRY_POLICY)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return session
+
+@st.cache_resource
+def get_background_executor():
+    """Small thread pool for fire-and-forget calls that must not block rendering."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="api-background")
+
+def get(url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    return get_http_session().get(url, timeout=timeout, **kwargs)
+
+def post(url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    return get_http_session().post(url, timeout=timeout, **kwargs)
+
+def _log_background_result(future):
+    try:
+        response = future.result()
+        if response.status_code >= 400:
+            logger.warning("Background request to %s failed: %s %s", response.url, response.status_code, response.text[:200])
+    except requests.exceptions.RequestException as e:
+        logger.warning("Background request failed: %s", e)
+
+def post_in_background(url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """Send a POST without waiting for the response. Failures are logged, not raised."""
+    future = get_background_executor().submit(post, url, timeout=timeout, **kwargs)
+    future.add_done_callback(_log_background_result)
+    return future
@@ -12,12 +12,17 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # Import authentication functions
 from auth import is_authenticated, get_auth_header
 from pages.auth_pages import show_login_page, show_register_page, show_logout_button
+from history import fetch_sessions, fetch_messages, to_chat_messages
+import api_client
 
 # FastAPI endpoint
 FASTAPI_URL = "http://localhost:8000/chat"
 UPLOAD_URL = "http://localhost:8000/upload_document"
 SAVE_MESSAGE_URL = "http://localhost:8000/save_chat_message" # New endpoint for saving messages
 
+# Messages rendered at once; "Show earlier messages" widens the window by this much
+TRANSCRIPT_WINDOW = int(os.getenv("TRANSCRIPT_WINDOW", "30"))
+
 def apply_custom_styles():
     st.markdown("""
     <style>
@@ -78,35 +83,117 @@ def apply_custom_styles():
 #         else:
 #             st.warning("Please upload a file first.")
 
+# A fragment, so picking and processing a file reruns only this form, not the transcript
+@st.fragment
+def upload_form():
+    uploaded_file = st.file_uploader("Upload a document for RAG", type=["pdf", "txt"], key="file_uploader")
+
+    if uploaded_file is not None:
+        st.session_state["uploaded_file"] = uploaded_file
+        st.info(f"File '{uploaded_file.name}' uploaded. Click 'Process Document' to add it to RAG.")
+
+    if st.button("Process Document :rocket:", key="process_button"):
+        if "uploaded_file" in st.session_state and st.session_state["uploaded_file"] is not None:
+            file_to_process = st.session_state["uploaded_file"]
+            st.write("Processing document...")
+            files = {"file": (file_to_process.name, file_to_process.getvalue(), file_to_process.type)}
+            headers = get_auth_header()
+            try:
+                response = api_client.post(UPLOAD_URL, files=files, headers=headers, timeout=api_client.UPLOAD_TIMEOUT)
+                response.raise_for_status()
+                st.success("Document processed successfully!")
+                st.session_state["uploaded_file"] = None
+            except requests.exceptions.RequestException as e:
+                st.error(f"Error uploading file: {e}")
+        else:
+            st.warning("Please upload a file first.")
+
 def file_uploader_section():
     with st.sidebar:
         st.header("Document Upload :page_facing_up:")
-        uploaded_file = st.file_uploader("Upload a document for RAG", type=["pdf", "txt"], key="file_uploader")
-
-        if uploaded_file is not None:
-            st.session_state["uploaded_file"] = uploaded_file
-            st.info(f"File '{uploaded_file.name}' uploaded. Click 'Process Document' to add it to RAG.")
-
-        if st.button("Process Document :rocket:", key="process_button"):
-            if "uploaded_file" in st.session_state and st.session_state["uploaded_file"] is not None:
-                file_to_process = st.session_state["uploaded_file"]
-                st.write("Processing document...")
-                files = {"file": (file_to_process.name, file_to_process.getvalue(), file_to_process.type)}
-                headers = get_auth_header()
-                try:
-                    response = requests.post(UPLOAD_URL, files=files, headers=headers)
-                    response.raise_for_status()
-                    st.success("Document processed successfully!")
-                    st.session_state["uploaded_file"] = None
-                except requests.exceptions.RequestException as e:
-                    st.error(f"Error uploading file: {e}")
-            else:
-                st.warning("Please upload a file first.")
+        # Fragments can't write to the sidebar themselves; call it inside the sidebar context
+        upload_form()
+
 
 
+def load_session_history(chat_session_id):
+    """Load only the newest page of a session; older pages are fetched on demand."""
+    st.session_state.messages = []
+    st.session_state.history_cursor = None
+    st.session_state.history_loaded_for = chat_session_id
+    st.session_state.transcript_window = TRANSCRIPT_WINDOW
+    try:
+        page = fetch_messages(chat_session_id)
+    except requests.exceptions.RequestException:
+        # New sessions have no stored history yet
+        return
+    st.session_state.messages = to_chat_messages(page)
+    st.session_state.history_cursor = page["next_cursor"]
+
+def load_earlier_messages():
+    """Prepend the next older page of the current session's history."""
+    try:
+        page = fetch_messages(st.session_state.chat_session_id, before=st.session_state.history_cursor)
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error loading earlier messages: {e}")
+        return
+    earlier = to_chat_messages(page)
+    st.session_state.messages = earlier + st.session_state.messages
+    st.session_state.history_cursor = page["next_cursor"]
+    return len(earlier)
+
+def show_earlier_messages():
+    """Widen the transcript window, fetching older history once everything loaded is shown."""
+    hidden = len(st.session_state.messages) - st.session_state.transcript_window
+    if hidden <= 0 and st.session_state.get("history_cursor"):
+        hidden = load_earlier_messages() or 0
+    st.session_state.transcript_window += min(max(hidden, 0), TRANSCRIPT_WINDOW)
+
+def render_message(message):
+    # Keyed by message id, so older messages keep their elements when the window shifts
+    with st.container(key=f"chat_message_{message['id']}"):
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+def new_message(role, content):
+    return {"id": str(uuid.uuid4()), "role": role, "content": content}
+
+def chat_history_section():
+    with st.sidebar:
+        st.header("Chat History :scroll:")
+        if st.button("New Chat", key="new_chat_button"):
+            st.session_state.chat_session_id = str(uuid.uuid4())
+            st.rerun()
+        try:
+            sessions = fetch_sessions()["sessions"]
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error loading chat sessions: {e}")
+            return
+        if not sessions:
+            st.caption("No previous chats yet.")
+            return
+        labels = {s["id"]: f"{s['session_name']} ({s['last_updated'][:16].replace('T', ' ')})" for s in sessions}
+        session_ids = list(labels)
+        current = st.session_state.chat_session_id
+        selected = st.selectbox(
+            "Previous chats",
+            session_ids,
+            index=session_ids.index(current) if current in session_ids else None,
+            format_func=labels.get,
+            key="previous_chat_select"
+        )
+        if selected and selected != current:
+            st.session_state.chat_session_id = selected
+            st.rerun()
 
 def chat_interface_section():
     st.header("Chat with your documents :speech_balloon:")
+    chat_transcript()
+
+# The transcript is a fragment: sending a message or showing earlier ones reruns
+# only this function, and only the last transcript_window messages are drawn.
+@st.fragment
+def chat_transcript():
     if "messages" not in st.session_state:
         st.session_state.messages = []
     
@@ -114,37 +201,47 @@ def chat_interface_section():
     if "chat_session_id" not in st.session_state:
         st.session_state.chat_session_id = str(uuid.uuid4())
 
-    for i, message in enumerate(st.session_state.messages):
-        with st.container(key=f"chat_message_container_{i}"):
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
+    # Load the newest page of history when the session changes
+    if st.session_state.get("history_loaded_for") != st.session_state.chat_session_id:
+        load_session_history(st.session_state.chat_session_id)
+
+    st.session_state.setdefault("transcript_window", TRANSCRIPT_WINDOW)
+    if len(st.session_state.messages) > st.session_state.transcript_window or st.session_state.get("history_cursor"):
+        if st.button("Show earlier messages", key="load_earlier_button"):
+            show_earlier_messages()
+
+    for message in st.session_state.messages[-st.session_state.transcript_window:]:
+        render_message(message)
 
     if prompt := st.chat_input("What is up?"):
-        st.chat_message("user").markdown(prompt)
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        user_message = new_message("user", prompt)
+        render_message(user_message)
+        st.session_state.messages.append(user_message)
 
         headers = {"Authorization": f"Bearer {st.session_state.access_token}"} if st.session_state.get("access_token") else {}
         user_id = st.session_state.user_id # Assuming user_id is stored in session_state after login
 
         try:
             # Send user query to the chat endpoint
-            response = requests.post(
+            response = api_client.post(
                 FASTAPI_URL,
                 json={
                     "user_id": user_id,
                     "chat_session_id": st.session_state.chat_session_id,
                     "content": prompt
                 },
-                headers=headers
+                headers=headers,
+                timeout=api_client.CHAT_TIMEOUT
             )
             response.raise_for_status()
             chatbot_response_data = response.json()
             chatbot_response = chatbot_response_data["response"]
             returned_chat_session_id = chatbot_response_data["chat_session_id"]
 
-            # Save user message and LLM response to the database in a single entry
+            # Save user message and LLM response to the database in a single entry.
+            # This runs in the background so the answer renders without waiting on the save.
             chatbot_response_str = "".join(chatbot_response) if isinstance(chatbot_response, list) else chatbot_response
-            requests.post(
+            api_client.post_in_background(
                 SAVE_MESSAGE_URL,
                 json={
                     "chat_session_id": returned_chat_session_id,
@@ -158,9 +255,9 @@ def chat_interface_section():
         except requests.exceptions.RequestException as e:
             chatbot_response = f"Error: Could not connect to the chatbot backend. Is it running? ({e})"
 
-        with st.chat_message("assistant"):
-            st.markdown(chatbot_response)
-        st.session_state.messages.append({"role": "assistant", "content": chatbot_response})
+        assistant_message = new_message("assistant", chatbot_response)
+        render_message(assistant_message)
+        st.session_state.messages.append(assistant_message)
 
         # Remove the separate LLM response saving block
         # try:
@@ -215,6 +312,7 @@ def show_chat_interface():
     
     # Show file uploader in sidebar
     file_uploader_section()
+    chat_history_section()
     st.markdown("---")
     chat_interface_section()
 
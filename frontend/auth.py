@@ -2,6 +2,8 @@ import streamlit as st
 import requests
 import json
 
+import api_client
+
 # FastAPI authentication endpoints
 AUTH_BASE_URL = "http://localhost:8000/auth"
 REGISTER_URL = f"{AUTH_BASE_URL}/register"
@@ -10,7 +12,7 @@ LOGIN_URL = f"{AUTH_BASE_URL}/token"
 def register_user(username, email, password):
     """Register a new user and return the response."""
     try:
-        response = requests.post(
+        response = api_client.post(
             REGISTER_URL,
             json={"username": username, "email": email, "password": password}
         )
@@ -22,7 +24,7 @@ def login_user(username, password):
     """Login a user and return the access token."""
     try:
         # OAuth2 expects form data, not JSON
-        response = requests.post(
+        response = api_client.post(
             LOGIN_URL,
             data={"username": username, "password": password}
         )
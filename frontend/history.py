@@ -0,0 +1,51 @@
+import streamlit as st
+
+from auth import get_auth_header
+import api_client
+
+# FastAPI chat history endpoints
+HISTORY_BASE_URL = "http://localhost:8000/history"
+SESSIONS_URL = f"{HISTORY_BASE_URL}/sessions"
+
+HISTORY_PAGE_SIZE = 20
+
+def _get_page(url, params):
+    """GET a history page, revalidating with If-None-Match against the cached copy."""
+    cache = st.session_state.setdefault("history_etag_cache", {})
+    cache_key = (url, tuple(sorted(params.items())))
+    headers = get_auth_header()
+    cached = cache.get(cache_key)
+    if cached:
+        headers["If-None-Match"] = cached["etag"]
+
+    response = api_client.get(url, params=params, headers=headers)
+    if response.status_code == 304 and cached:
+        return cached["data"]
+    response.raise_for_status()
+    data = response.json()
+    if response.headers.get("ETag"):
+        cache[cache_key] = {"etag": response.headers["ETag"], "data": data}
+    return data
+
+def fetch_sessions(before=None, limit=HISTORY_PAGE_SIZE):
+    """Fetch one page of the user's chat sessions, newest first."""
+    params = {"limit": limit}
+    if before:
+        params["before"] = before
+    return _get_page(SESSIONS_URL, params)
+
+def fetch_messages(chat_session_id, before=None, limit=HISTORY_PAGE_SIZE):
+    """Fetch one page of a session's messages. Pass next_cursor as before to go further back."""
+    params = {"limit": limit}
+    if before:
+        params["before"] = before
+    return _get_page(f"{SESSIONS_URL}/{chat_session_id}/messages", params)
+
+def to_chat_messages(page):
+    """Convert an API message page into the {"id", "role", "content"} dicts used by the chat UI."""
+    messages = []
+    for message in page["messages"]:
+        role = "user" if message["is_user"] else "assistant"
+        # A stored row holds both the query and the answer, so the role completes the id
+        messages.append({"id": f"{message['id']}-{role}", "role": role, "content": message["content"]})
+    return messages
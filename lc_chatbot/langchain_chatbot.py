@@ -1,33 +1,88 @@
 # Import necessary libraries and modules
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
 from langchain import hub
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.memory import ConversationBufferWindowMemory
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_google_genai import ChatGoogleGenerativeAI
 import os
 from dotenv import load_dotenv
+# Shared client registry from the backend (on the path, like rag.rag in lc_main.py)
+from llm import get_llm
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Conversation memories kept per (user, thread); the least recently used are
+# evicted beyond LC_MAX_THREADS, and any idle for LC_THREAD_IDLE_SECONDS.
+LC_MAX_THREADS = int(os.getenv("LC_MAX_THREADS", "1000"))
+LC_THREAD_IDLE_SECONDS = float(os.getenv("LC_THREAD_IDLE_SECONDS", "3600"))
+# Budgets for one ReAct loop: steps, and wall-clock seconds.
+LC_AGENT_MAX_ITERATIONS = int(os.getenv("LC_AGENT_MAX_ITERATIONS", "5"))
+LC_AGENT_MAX_EXECUTION_SECONDS = float(os.getenv("LC_AGENT_MAX_EXECUTION_SECONDS", "60"))
+LC_AGENT_VERBOSE = os.getenv("LC_AGENT_VERBOSE", "false").strip().lower() in ("1", "true", "yes", "on")
+
+class ThreadMemories:
+    """
+    Bounded map of conversation memories with LRU and idle eviction. Each
+    memory comes with a lock that serializes the turns of its thread.
+    """
+
+    def __init__(self, max_threads: int, idle_seconds: float, window: int = 5):
+        self.max_threads = max_threads
+        self.idle_seconds = idle_seconds
+        self.window = window
+        self._memories = OrderedDict()  # key -> (memory, lock, last_used)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._memories.pop(key, None)
+            if entry:
+                memory, lock = entry[0], entry[1]
+            else:
+                memory = ConversationBufferWindowMemory(k=self.window, memory_key="chat_history", return_messages=True)
+                lock = asyncio.Lock()
+            self._memories[key] = (memory, lock, now)
+            # Oldest entries are at the front
+            while self._memories:
+                oldest_key, (_, _, last_used) = next(iter(self._memories.items()))
+                if len(self._memories) > self.max_threads or now - last_used > self.idle_seconds:
+                    self._memories.pop(oldest_key)
+                else:
+                    break
+            return memory, lock
+
+    def __len__(self):
+        return len(self._memories)
+
 # Define the Chatbot class
-class Chatbot: 
+class Chatbot:
     def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(model="gemini-pro", api_key=os.getenv("GOOGLE_API_KEY"))
+        # Reuses the registry's pooled client and its timeout / retry / circuit breaker policy
+        self.llm = get_llm(model_name="gemini-pro")
+        self.rag_tool = StructuredTool.from_function(
+            func=self.rag_search,
+            name="rag_tool",
+            description="A tool to perform RAG (Retrieval Augmented Generation). Use this tool to answer questions from uploaded documents.",
+        )
         self.tools = []
-        self.prompt = None
         self.agent_executor = None
-        self.memory = ConversationBufferWindowMemory(
-            k=5, memory_key="chat_history", return_messages=True
-        )
+        self.memories = ThreadMemories(LC_MAX_THREADS, LC_THREAD_IDLE_SECONDS)
+        # Agent executors are stateless apart from their tools, so one is built per tool set and reused
+        self._executors = {}
+        self._executors_lock = threading.Lock()
         self.retriever = None
         # Set up the agent after initialization
         self.setup_agent()
 
-    @tool
-    def rag_tool(self, query: str) -> str:
+    def rag_search(self, query: str) -> str:
         """
         A tool to perform RAG (Retrieval Augmented Generation).
         Use this tool to answer questions from uploaded documents.
@@ -44,8 +99,18 @@ class Chatbot:
         return "\n\n".join([doc.page_content for doc in docs])
 
     def setup_agent(self):
+        # Reuse the executor already built for this tool set, if any
+        key = tuple(t.name for t in self.tools)
+        with self._executors_lock:
+            executor = self._executors.get(key)
+            if executor is None:
+                executor = self._build_executor(self.tools)
+                self._executors[key] = executor
+        self.agent_executor = executor
+
+    def _build_executor(self, tools):
         # Define the agent prompt with system message, chat history, human input, and agent scratchpad
-        self.prompt = ChatPromptTemplate.from_messages(
+        prompt = ChatPromptTemplate.from_messages(
             [
                 ("system", "You are a helpful assistant."),
                 MessagesPlaceholder(variable_name="chat_history"),
@@ -57,15 +122,17 @@ class Chatbot:
         )
 
         # Create the agent using the language model, tools, and prompt
-        self.agent = create_react_agent(self.llm, self.tools, self.prompt)
-
-        # Create the agent executor to run the agent
-        self.agent_executor = AgentExecutor(
-            agent=self.agent,
-            tools=self.tools,
-            prompt=self.prompt,
-            verbose=True,
-            memory=self.memory,
+        agent = create_react_agent(self.llm, tools, prompt)
+
+        # Create the agent executor to run the agent. Memory is per thread and
+        # passed in on each call, so the executor can be shared.
+        return AgentExecutor(
+            agent=agent,
+            tools=tools,
+            verbose=LC_AGENT_VERBOSE,
+            max_iterations=LC_AGENT_MAX_ITERATIONS,
+            max_execution_time=LC_AGENT_MAX_EXECUTION_SECONDS,
+            early_stopping_method="force",
             handle_parsing_errors=False,  # Robust error handling (temporarily disabled for debugging)
         )
 
@@ -73,18 +140,38 @@ class Chatbot:
         # Set the retriever for RAG
         self.retriever = retriever
         # Register tools: RAG (Retrieval Augmented Generation) and Tavily search
-        self.tools = [self.rag_tool, TavilySearchResults(max_results=1)]
-        # Re-set up the agent with the new tools
+        if not self.tools:
+            self.tools = [self.rag_tool, TavilySearchResults(max_results=1)]
         self.setup_agent()
 
-    def invoke(self, message: str, thread_id: str, user_id: str):
-        # Invoke the agent executor with the user's message
-        response = self.agent_executor.invoke({"input": message})
+    @staticmethod
+    def _prepare(memory, message: str):
+        history = memory.load_memory_variables({})["chat_history"]
+        return {"input": message, "chat_history": history}
+
+    @staticmethod
+    def _finish(memory, message: str, response: dict):
         # Return the output from the agent, prioritizing 'output' over 'output_text'
-        return response.get("output") or response.get("output_text")
+        output = response.get("output") or response.get("output_text")
+        memory.save_context({"input": message}, {"output": output})
+        return output
+
+    def invoke(self, message: str, thread_id: str, user_id: str):
+        # Invoke the agent executor with the user's message and this thread's history
+        # (not serialized per thread; the service uses ainvoke)
+        memory, _ = self.memories.get((str(user_id), thread_id))
+        response = self.agent_executor.invoke(self._prepare(memory, message))
+        return self._finish(memory, message, response)
+
+    async def ainvoke(self, message: str, thread_id: str, user_id: str):
+        memory, lock = self.memories.get((str(user_id), thread_id))
+        # Turns of one thread run one at a time, so each sees the previous one's history
+        async with lock:
+            response = await self.agent_executor.ainvoke(self._prepare(memory, message))
+            return self._finish(memory, message, response)
 
 
 # Main execution block
 if __name__ == "__main__":
     # Create a Chatbot instance
-    chatbot = Chatbot()
\ No newline at end of file
+    chatbot = Chatbot()
@@ -8,7 +8,10 @@ import re
 # Import the os module for interacting with the operating system, like path manipulation.
 import os
 # Import RAG (Retrieval-Augmented Generation) related functions for document processing.
-from rag.rag import process_document_for_rag, create_vector_store, get_retriever
+from rag.rag import get_retriever
+# Streamed, content-addressed upload storage shared with the main backend.
+import uploads
+from fastapi.concurrency import run_in_threadpool
 # Import Annotated for type hinting with metadata and APIKeyHeader for security.
 from typing import Annotated
 from fastapi.security import APIKeyHeader
@@ -77,28 +80,21 @@ class Message(BaseModel):
 # Define a POST endpoint for chat interactions.
 @app.post("/chat")
 async def chat(message: Message, token: Annotated[str, Depends(verify_token)]):
-    response = chatbot.invoke(message.content, message.thread_id, message.user_id)
+    response = await chatbot.ainvoke(message.content, message.thread_id, message.user_id)
     return {"response": response}
 
 # Define a POST endpoint for uploading documents for RAG processing.
 @app.post("/upload_document")
 async def upload_document(token: Annotated[str, Depends(verify_token)], file: UploadFile = File(...)):
-    upload_dir = "./backend/rag/uploaded_documents"
-    os.makedirs(upload_dir, exist_ok=True)
-
-    file_path = os.path.join(upload_dir, file.filename)
-    with open(file_path, "wb") as buffer:
-        buffer.write(await file.read())
-    
-    # Use filename (without extension) as collection name
-    collection_name = file.filename.split('.')[0]
-    process_document_for_rag(file_path, collection_name=collection_name)
-    
-    # Import RAG utility functions here to avoid circular dependencies
-    from rag.rag import load_documents, split_documents
-    documents = load_documents(file_path)
-    splits = split_documents(documents)
-    vectorstore = create_vector_store(splits, collection_name=collection_name)
+    # Stream the upload to disk in chunks, hashed on the way, with a size limit
+    upload = await uploads.store_upload(file)
+
+    # Reuse the collection if this exact content was ingested before
+    existing = await run_in_threadpool(uploads.find_ingested, upload)
+    if existing is not None:
+        vectorstore = existing[1]
+    else:
+        vectorstore = await run_in_threadpool(uploads.ingest_upload, upload, uploads.collection_name_for(file.filename))
     retriever = get_retriever(vectorstore)
     chatbot.set_retriever(retriever)
 